@@ -11,9 +11,10 @@ class UserAdmin(BaseUserAdmin):
     inlines = (CustomerInline,)  # necessary to see a profile model in the admin panel under MyCustomUser
     form = CustomUserChangeForm
     add_form = CustomUserCreationForm
-    prepopulated_fields = {"slug": ("name", "surname", "random_identifier")}
+    prepopulated_fields = {"slug": ("name", "surname")}
     list_display = ("email", "date_of_birth", "is_admin", "id", "random_identifier")
     read_only_fields = ("slug",)
+    readonly_fields = ("random_identifier",)  # assigned in save()
     list_filter = ("is_admin",)
     fieldsets = (
         (
@@ -37,7 +38,6 @@ class UserAdmin(BaseUserAdmin):
                     "name",
                     "surname",
                     "slug",
-                    "random_identifier",
                 ),
             },
         ),
@@ -0,0 +1,180 @@
+"""
+token authentication without a query per request
+
+- token key -> identity of the user [id, is_active, is_staff, is_admin, is_superuser, id and status of the profile
+  read by the permissions, querysets and throttles] in a per process LRU with a short ttl, in front of the redis
+  cache [longer ttl] shared by all processes; misses -> one query as before. No user instances or password hashes
+  are cached
+- every request gets a user built from the identity, its other fields are deferred [loaded on first access]
+- entries are dropped on token deletion and on every save of the user [deactivation too] or of its profile, right away
+  and once more after commit; bulk updates call invalidate_users themselves
+- other processes notice through redis, their local copies live TOKEN_CACHE_LOCAL_TTL seconds at most
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from .models import MyCustomUser
+
+
+class LocalTTLCache:
+    """LRU of key -> value [immutable, e.g. the identity tuples below]"""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires, value), least recently used first
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+        return entry[1]
+
+    def set(self, key, value):
+        entry = (time.monotonic() + self.ttl, value)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+local_cache = LocalTTLCache(settings.TOKEN_CACHE_LOCAL_SIZE, settings.TOKEN_CACHE_LOCAL_TTL)
+
+
+def _cache_key(key):
+    # tokens are credentials -> only their hash is stored in redis
+    # v2: identities with is_superuser [tuples of the previous shape are not read]
+    return "auth:token:v2:" + hashlib.sha256(key.encode()).hexdigest()
+
+
+# (user id, is_active, is_staff, is_admin, is_superuser, profile id, profile status) -> the cached identity of a token
+IDENTITY = (
+    "user_id",
+    "user__is_active",
+    "user__is_staff",
+    "user__is_admin",
+    "user__is_superuser",
+    "user__customerprofile__id",
+    "user__customerprofile__status",
+)
+
+
+def get_user(key):
+    """user of the token [local cache -> redis -> database], None if there is no such token"""
+    identity = local_cache.get(key)
+    if identity is None:
+        identity = cache.get(_cache_key(key))
+        if identity is None:
+            identity = Token.objects.filter(key=key).values_list(*IDENTITY).first()
+            if identity is None:
+                return None
+            cache.set(_cache_key(key), identity, settings.TOKEN_CACHE_TTL)
+        local_cache.set(key, identity)
+    return build_user(identity)
+
+
+def build_user(identity):
+    """
+    new user instance with the fields of the identity, the others are deferred as with .only()
+    -> its customerprofile comes with id and status, None for users without profile [admins]
+    """
+    user_id, is_active, is_staff, is_admin, is_superuser, profile_id, profile_status = identity
+    user = _from_db(
+        MyCustomUser,
+        id=user_id,
+        is_active=is_active,
+        is_staff=is_staff,
+        is_admin=is_admin,
+        is_superuser=is_superuser,
+    )
+
+    related = MyCustomUser.customerprofile.related
+    profile = None
+    if profile_id is not None:
+        profile = _from_db(related.related_model, id=profile_id, user_id=user_id, status=profile_status)
+        related.field.set_cached_value(profile, user)
+    related.set_cached_value(user, profile)
+    return user
+
+
+def _from_db(model, **values):
+    fields = [field.attname for field in model._meta.concrete_fields if field.attname in values]
+    return model.from_db(DEFAULT_DB_ALIAS, fields, [values[field] for field in fields])
+
+
+def invalidate(keys):
+    keys = list(keys)
+    for key in keys:
+        local_cache.delete(key)
+    cache.delete_many([_cache_key(key) for key in keys])
+
+
+def invalidate_users(user_ids):
+    """
+    drops the cached tokens of the users right away and once more after commit
+    -> a request reading the rows before the commit does not keep the old state cached
+    """
+    user_ids = [id for id in user_ids if id is not None]
+    if user_ids:
+        keys = list(Token.objects.filter(user_id__in=user_ids).values_list("key", flat=True))
+        invalidate(keys)
+        transaction.on_commit(partial(invalidate, keys))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication [same header, same errors] reading users through the token cache"""
+
+    def authenticate_credentials(self, key):
+        user = get_user(key)
+        if user is None:
+            raise exceptions.AuthenticationFailed(_("Invalid token."))
+
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(_("User inactive or deleted."))
+
+        # request.auth stays a Token as with TokenAuthentication [not saved, nothing queried]
+        return (user, Token(key=key, user=user))
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    key = instance.key  # pk [= key] of a deleted instance is set to None
+    invalidate([key])
+    transaction.on_commit(partial(invalidate, [key]))
+
+
+@receiver(post_save, sender=MyCustomUser)
+def invalidate_saved_user(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_users([instance.id])
@@ -1,9 +1,11 @@
 import logging
-from datetime import datetime
 from functools import wraps as functool_wraps
 
 from .tasks import send_email_notification
 
+# queue backed [LOGGING in settings] -> records written to accounts/user_creation.log by a background thread
+logger = logging.getLogger("accounts.user_creation")
+
 
 def communicate_user_creation(for_user=False, log=False):
     def actual_decorator(func):
@@ -11,21 +13,23 @@ def communicate_user_creation(for_user=False, log=False):
 
         @functool_wraps(func)
         def wrapper(self, *args, **kwargs):
+            f = func(self, *args, **kwargs)
             if for_user:
-                f = func(self, *args, **kwargs)
                 name = kwargs.get("name")
                 surname = kwargs.get("surname")
                 email = kwargs.get("email")
 
                 send_email_notification.delay(name, surname, email)
             if log:
-                email = kwargs.get("email")
-                logging.basicConfig(filename="accounts/user_creation.log", level=logging.INFO, force=True)
-                logging.info(
-                    f"A user with emai; {email} has been created on {datetime.strftime(datetime.now(),'%y %b %d')}"
-                )
+                log_user_creation(f)
             return f
 
         return wrapper
 
     return actual_decorator
+
+
+def log_user_creation(user):
+    """one json line per user [core_project.audit.JSONFormatter] -> can be counted per day, email domain, user type"""
+    data = {"user": user.id, "email": user.email, "email_domain": user.email.rpartition("@")[2], "staff": user.is_staff}
+    logger.info("user_created", extra={"data": data})
@@ -0,0 +1,41 @@
+"""
+random_identifier of MyCustomUser -> id of the user [sequence] run through a feistel permutation
+
+- the permutation is a bijection on 32 bit numbers -> unique without lookups or retries
+- consecutive ids give unrelated identifiers -> the slug does not reveal the id or the registration order
+- shifted above the smallint range drawn at random before [create_random_identifier] -> no clashes with older users
+"""
+from django.db import connection
+
+# identifiers of older users are 1..32766
+OFFSET = 32767
+MAX_ID = 2**32 - 1
+# fixed on purpose: other keys would permute into identifiers that are already taken
+ROUND_KEYS = (0x5A3C, 0x1F7B, 0xC4E9, 0x8D21)
+
+
+def _round(half, key):
+    return ((half * 0x9E37 + key) ^ (half >> 5)) & 0xFFFF
+
+
+def permute(number):
+    """feistel network on two 16 bit halves"""
+    left, right = number >> 16, number & 0xFFFF
+    for key in ROUND_KEYS:
+        left, right = right, left ^ _round(right, key)
+    return (left << 16) | right
+
+
+def from_id(user_id):
+    if not 0 < user_id <= MAX_ID:
+        raise ValueError(f"user id {user_id} out of the identifier range")
+    return OFFSET + permute(user_id)
+
+
+def next_ids(table, count=1):
+    """`count` values of the id sequence of `table` in one query -> pks [and identifiers] known before the INSERT"""
+    if count < 1:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT nextval(pg_get_serial_sequence(%s, 'id')) FROM generate_series(1, %s)", [table, count])
+        return [row[0] for row in cursor.fetchall()]
@@ -0,0 +1,102 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import IntegrityError, connection, transaction
+from django.template.defaultfilters import slugify
+
+from accounts.models import MyCustomUser, create_random_identifier
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def new_user(i):
+    # no password hashing -> would hide everything else
+    return MyCustomUser(email=f"benchmark{i}@example.com", name="bench", surname=f"mark{i}", password="!")
+
+
+def register_previous(i):
+    """previous scheme: random smallint, UniqueTogetherValidator query, retried when the INSERT still collides"""
+    retries = 0
+    while True:
+        user = new_user(i)
+        user.random_identifier = create_random_identifier()
+        if MyCustomUser.objects.filter(
+            name=user.name, surname=user.surname, random_identifier=user.random_identifier
+        ).exists():
+            retries += 1
+            continue
+        user.slug = slugify(f"{user.full_name} {user.random_identifier}")
+        try:
+            with transaction.atomic():
+                user.save_base(force_insert=True)  # save() would assign the new identifier
+            return retries
+        except IntegrityError:
+            retries += 1
+
+
+class Command(BaseCommand):
+    help = (
+        "Registers users [rolled back afterwards]: random smallint identifier with a uniqueness query and retries "
+        "[before] vs the identifier derived from the id sequence, one by one and with bulk_create [after]"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--registrations", type=int, default=20_000, help="users registered one by one")
+        parser.add_argument("--users", type=int, default=1_000_000, help="users registered with bulk_create")
+        parser.add_argument("--batch-size", type=int, default=10_000)
+
+    def handle(self, *args, **options):
+        random.seed(42)
+        self.stdout.write(f"{'mode':>22} {'users':>8} {'retries':>8} {'queries':>8} {'time':>8} {'users/s':>9}")
+
+        count = options["registrations"]
+        with transaction.atomic():
+            free = 32766 - MyCustomUser.objects.filter(random_identifier__lte=32766).count()
+            if count > free:
+                self.stdout.write(f"previous scheme: room for {free} more users, {count} requested")
+            queries = QueryCounter()
+            with connection.execute_wrapper(queries):
+                started = time.perf_counter()
+                retries = sum(register_previous(i) for i in range(min(count, free)))
+                elapsed = time.perf_counter() - started
+            self._report("smallint + retries", min(count, free), retries, queries.count, elapsed)
+            transaction.set_rollback(True)
+
+        with transaction.atomic():
+            queries = QueryCounter()
+            with connection.execute_wrapper(queries):
+                started = time.perf_counter()
+                for i in range(count):
+                    new_user(i).save()
+                elapsed = time.perf_counter() - started
+            self._report("sequence, save()", count, 0, queries.count, elapsed)
+            transaction.set_rollback(True)
+
+        count = options["users"]
+        with transaction.atomic():
+            queries = QueryCounter()
+            with connection.execute_wrapper(queries):
+                started = time.perf_counter()
+                for first in range(0, count, options["batch_size"]):
+                    MyCustomUser.objects.bulk_create(
+                        (new_user(i) for i in range(first, min(first + options["batch_size"], count))),
+                        batch_size=options["batch_size"],
+                    )
+                elapsed = time.perf_counter() - started
+            unique = MyCustomUser.objects.values("random_identifier").distinct().count()
+            self._report("sequence, bulk_create", count, 0, queries.count, elapsed)
+            self.stdout.write(f"distinct identifiers: {unique} of {MyCustomUser.objects.count()} users")
+            transaction.set_rollback(True)
+
+    def _report(self, mode, count, retries, queries, elapsed):
+        self.stdout.write(
+            f"{mode:>22} {count:>8} {retries:>8} {queries:>8} {elapsed:>7.2f}s {count / elapsed if elapsed else 0:>9.0f}"
+        )
@@ -0,0 +1,62 @@
+import logging
+import os
+import tempfile
+import time
+from datetime import datetime
+from unittest import mock
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from accounts.models import MyCustomUser
+
+
+def log_with_basic_config(user):
+    """previous behaviour: root handlers torn down and a file opened again for every registration"""
+    logging.basicConfig(filename=log_with_basic_config.filename, level=logging.INFO, force=True)
+    logging.info(f"A user with emai; {user.email} has been created on {datetime.strftime(datetime.now(),'%y %b %d')}")
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures create_user throughput [rolled back afterwards] with logging.basicConfig per user [before] "
+        "and with the queue backed user creation logger [after]"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        root = logging.getLogger()
+        root_handlers, root_level = list(root.handlers), root.level
+
+        self.stdout.write(f"{'mode':>22} {'users':>7} {'time':>8} {'users/s':>9} {'per user':>10}")
+        with tempfile.TemporaryDirectory() as directory:
+            log_with_basic_config.filename = os.path.join(directory, "user_creation.log")
+            try:
+                with mock.patch("accounts.decorators.log_user_creation", log_with_basic_config):
+                    self._measure("basicConfig per user", options["users"])
+            finally:
+                for handler in root.handlers:
+                    handler.close()
+                root.handlers, root.level = root_handlers, root_level
+
+        self._measure("queue backed logger", options["users"])
+
+    def _measure(self, mode, count):
+        with transaction.atomic():
+            started = time.perf_counter()
+            for i in range(count):
+                # no password -> hashing would hide everything else
+                MyCustomUser.objects.create_user(
+                    email=f"benchmark{i}@example.com",
+                    name="bench",
+                    surname="mark",
+                    password=None,
+                )
+            elapsed = time.perf_counter() - started
+            transaction.set_rollback(True)
+
+        self.stdout.write(
+            f"{mode:>22} {count:>7} {elapsed:>7.2f}s {count / elapsed:>9.0f} {elapsed / count * 1000:>8.2f}ms"
+        )
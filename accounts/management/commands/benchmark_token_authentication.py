@@ -0,0 +1,79 @@
+import itertools
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.views import APIView
+
+from accounts import authentication
+from accounts.models import MyCustomUser
+from bookings.models import CustomerProfile
+
+ENDPOINTS = ("bookings:opinions", "bookings:suggestions", "bookings:reservations")
+
+
+class Command(BaseCommand):
+    help = (
+        "Queries per authenticated request of the list endpoints [users rolled back afterwards]: TokenAuthentication "
+        "[before] vs CachedTokenAuthentication with empty and warm caches [after]"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100)
+        parser.add_argument("--requests", type=int, default=300, help="per endpoint and mode")
+
+    def handle(self, *args, **options):
+        client = Client(HTTP_HOST=settings.ALLOWED_HOSTS[0])
+        with transaction.atomic():
+            keys = self._seed(options["users"])
+            authentication.invalidate(keys)
+
+            self.stdout.write(f"{'endpoint':>22} {'mode':>18} {'queries':>8} {'token/profile':>14} {'per request':>12}")
+            for endpoint in ENDPOINTS:
+                url = reverse(endpoint)
+                with mock.patch.object(APIView, "authentication_classes", [TokenAuthentication]):
+                    self._measure(client, url, keys, options["requests"], endpoint, "TokenAuthentication")
+                # one request per user -> every request misses both caches
+                self._measure(client, url, keys, len(keys), endpoint, "cached, cold")
+                self._measure(client, url, keys, options["requests"], endpoint, "cached, warm")
+                authentication.invalidate(keys)
+
+            transaction.set_rollback(True)
+
+    def _seed(self, count):
+        users = MyCustomUser.objects.bulk_create(
+            MyCustomUser(email=f"benchmark{i}@example.com", name="bench", surname=f"mark{i}") for i in range(count)
+        )
+        # bulk_create sends no signals -> profiles and tokens created here
+        CustomerProfile.objects.bulk_create(
+            CustomerProfile(user=user, first_name=user.name, surname=user.surname) for user in users
+        )
+        tokens = Token.objects.bulk_create(Token(key=Token.generate_key(), user=user) for user in users)
+        return [token.key for token in tokens]
+
+    def _measure(self, client, url, keys, count, endpoint, mode):
+        auth_queries = 0
+        elapsed = 0.0
+        with CaptureQueriesContext(connection) as queries:
+            for key in itertools.islice(itertools.cycle(keys), count):
+                before = len(queries)
+                started = time.perf_counter()
+                response = client.get(url, HTTP_AUTHORIZATION=f"Token {key}")
+                elapsed += time.perf_counter() - started
+                assert response.status_code == 200, response.status_code
+                auth_queries += sum(
+                    "authtoken_token" in query["sql"] or "bookings_customerprofile" in query["sql"]
+                    for query in queries.captured_queries[before:]
+                )
+
+        self.stdout.write(
+            f"{endpoint:>22} {mode:>18} {len(queries) / count:>8.2f} {auth_queries / count:>14.2f} "
+            f"{elapsed / count * 1000:>10.2f}ms"
+        )
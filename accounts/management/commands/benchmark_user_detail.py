@@ -0,0 +1,72 @@
+import random
+import time
+
+from bookings.utils.loadtest import percentile
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+from django.test.utils import CaptureQueriesContext
+
+from accounts import slugs
+from accounts.models import MyCustomUser
+
+
+def previous_lookup(slug):
+    """previous UserDetail.get_object -> case insensitive match on name and surname"""
+    name, surname, identifier = slug.split("-")
+    return MyCustomUser.objects.get(
+        Q(name__iexact=name), Q(surname__iexact=surname), Q(random_identifier=int(identifier))
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Seeds users [rolled back afterwards] and compares the previous name/surname lookup of UserDetail with the "
+        "slug column and with a warm slug -> id cache in front of the primary key [every lookup a hit]"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1_000_000)
+        parser.add_argument("--lookups", type=int, default=2000)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        with transaction.atomic():
+            seeded = self._seed(options["users"])
+            sample = [rng.choice(seeded) for _ in range(options["lookups"])]
+
+            self.stdout.write(f"{'lookup':>16} {'p50':>9} {'p99':>9} {'queries':>8}")
+            self._measure("name/surname", previous_lookup, sample)
+            self._measure("slug column", slugs.get_user, sample)
+            # a cache of ids still loads the user -> one indexed query either way
+            ids = dict(MyCustomUser.objects.filter(slug__in=set(sample)).values_list("slug", "id"))
+            self._measure("slug -> id cache", lambda slug: MyCustomUser.objects.filter(pk=ids[slug]).first(), sample)
+
+            transaction.set_rollback(True)
+
+    def _seed(self, count):
+        users = [
+            MyCustomUser(email=f"benchmark{i}@example.com", name=f"name{i % 1000}", surname=f"surname{i // 1000}")
+            for i in range(count)
+        ]
+        # bulk_create -> identifiers and slugs from the id sequence, no profiles/tokens; only users are looked up here
+        MyCustomUser.objects.bulk_create(users, batch_size=10_000)
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {MyCustomUser._meta.db_table}")
+
+        self.stdout.write(f"seeded {len(users)} users")
+        return [user.slug for user in users]
+
+    def _measure(self, label, lookup, sample):
+        timings = []
+        with CaptureQueriesContext(connection) as queries:
+            for slug in sample:
+                started = time.perf_counter()
+                lookup(slug)
+                timings.append(time.perf_counter() - started)
+
+        self.stdout.write(
+            f"{label:>16} {percentile(timings, 50) * 1000:>7.2f}ms {percentile(timings, 99) * 1000:>7.2f}ms "
+            f"{len(queries) / len(sample):>8.1f}"
+        )
@@ -0,0 +1,29 @@
+# Generated by Django 4.1 on 2026-10-16 23:41
+
+from django.db import migrations, models
+from django.template.defaultfilters import slugify
+
+
+def fill_missing_slugs(apps, schema_editor):
+    # identifiers of existing users are kept -> their slugs stay valid, only users without one get it
+    MyCustomUser = apps.get_model("accounts", "MyCustomUser")
+    users = list(MyCustomUser.objects.filter(slug__isnull=True))
+    for user in users:
+        user.slug = slugify(f"{user.name} {user.surname} {user.random_identifier}")
+    MyCustomUser.objects.bulk_update(users, ["slug"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="mycustomuser",
+            name="random_identifier",
+            field=models.BigIntegerField(blank=True, editable=False, unique=True),
+        ),
+        migrations.RunPython(fill_missing_slugs, migrations.RunPython.noop),
+    ]
@@ -1,14 +1,16 @@
 import random
 
+from core_project.snapshots import LoadedValues
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.db import models
 from django.template.defaultfilters import slugify
 from django.urls import reverse
 
-from . import decorators
+from . import decorators, identifiers
 
 
 def create_random_identifier():
+    # previous default of random_identifier, still referenced by the initial migration
     random_identifier = random.randint(1, 32766)
     return random_identifier
 
@@ -66,8 +68,21 @@ class MyUserManager(BaseUserManager):
         user.save()
         return user
 
+    def bulk_create(self, objs, *args, **kwargs):
+        """
+        - bulk_create skips save() -> ids of new users fetched in one query, identifiers and slugs built from them
+        - no signals/decorators either: no profiles, tokens or emails for these users
+        """
+        objs = list(objs)
+        new_users = [user for user in objs if user.pk is None]
+        for user, user_id in zip(new_users, identifiers.next_ids(self.model._meta.db_table, len(new_users))):
+            user.pk = user_id
+        for user in objs:
+            user.set_identity()
+        return super().bulk_create(objs, *args, **kwargs)
+
 
-class MyCustomUser(AbstractBaseUser, PermissionsMixin):
+class MyCustomUser(LoadedValues, AbstractBaseUser, PermissionsMixin):
     """
     - Linked to the Customer profile model in bookings.
     """
@@ -75,8 +90,8 @@ class MyCustomUser(AbstractBaseUser, PermissionsMixin):
     class Meta:
         verbose_name_plural = "Users"
 
-    # to make slug less revealing (than ID) + could not make use of ID as there was no way to add it to the form (admin)
-    random_identifier = models.SmallIntegerField(default=create_random_identifier, unique=True)
+    # to make slug less revealing (than ID) -> permuted ID [identifiers], assigned in save()
+    random_identifier = models.BigIntegerField(unique=True, blank=True, editable=False)
     email = models.EmailField(verbose_name="email address", max_length=40, unique=True)
     name = models.CharField(max_length=20)
     surname = models.CharField(max_length=20)
@@ -106,9 +121,19 @@ class MyCustomUser(AbstractBaseUser, PermissionsMixin):
         return reverse("accounts:user_detail", kwargs={"slug": self.slug})
 
     def save(self, *args, **kwargs):
+        if self._state.adding and self.pk is None:
+            # id taken from the sequence upfront -> identifier known in the INSERT, no retries on collisions
+            self.pk = identifiers.next_ids(self._meta.db_table)[0]
+            kwargs["force_insert"] = True  # pk is set -> django would try an UPDATE first
+        self.set_identity()
+
+        return super().save(*args, **kwargs)
+
+    def set_identity(self):
+        if self.random_identifier is None:
+            self.random_identifier = identifiers.from_id(self.pk)
+
         pre_slug = self.full_name + " " + str(self.random_identifier)
         # creating slug when new new user is created and updates the slug when existing user's name/surname are changed
         if not self.slug or pre_slug != self.slug:
             self.slug = slugify(pre_slug)
-
-        return super().save(*args, **kwargs)
@@ -6,7 +6,7 @@ from django.contrib.auth.models import AnonymousUser
 from rest_framework import serializers
 from rest_framework.validators import UniqueValidator
 
-from .models import MyCustomUser, create_random_identifier
+from .models import MyCustomUser
 
 
 class RetrieveTokenSerializer(serializers.Serializer):
@@ -45,23 +45,10 @@ class MyCustomUserSerializer(serializers.Serializer):
     city = serializers.CharField(max_length=25, required=False)
     password = serializers.CharField(write_only=True, required=True)
     password2 = serializers.CharField(write_only=True, required=True)
-    random_identifier = serializers.IntegerField(default=create_random_identifier, read_only=True)
+    random_identifier = serializers.IntegerField(read_only=True)
     customerprofile = serializers.HyperlinkedRelatedField(read_only=True, view_name="bookings:single_customer")
     url = serializers.HyperlinkedIdentityField(read_only=True, view_name="accounts:user_detail", lookup_field="slug")
 
-    class Meta:
-        # very unlikely to happen
-        # combination of these fields is used as a slug in url
-        # encouraging the user to create account with the same data in few mins
-        # random identifeir will change then
-        validators = [
-            serializers.UniqueTogetherValidator(
-                queryset=MyCustomUser.objects.all(),
-                fields=["name", "surname", "random_identifier"],
-                message="Please try again in few mins",
-            )
-        ]
-
     # to allow dj-rest-registration -> otherwise error with arguments
     def save(self, *args, **kwargs):
 
@@ -4,7 +4,6 @@ from datetime import date
 from celery import shared_task
 from celery.utils.log import get_task_logger
 from django.conf import settings
-from django.core.mail import send_mail
 
 logger = get_task_logger(__name__)
 
@@ -18,12 +17,10 @@ def send_email_notification(*args, **kwargs):
     email: {email}
     """
 
-    send_mail(
-        subject=subject,
-        message=message,
-        from_email=settings.EMAIL_HOST_USER,
-        recipient_list=[settings.NOTIFICATION_EMAIL],
-        fail_silently=False,
-    )
+    # imported here -> accounts.models imports this module [decorators] and bookings models need accounts.models
+    from bookings import outbox
+
+    # sent by bookings flush_outgoing_emails_task together with other messages
+    outbox.enqueue(subject, message, to=[settings.NOTIFICATION_EMAIL])
 
     logger.info(f"{send_email_notification.__name__} just ran")
@@ -1,13 +1,18 @@
 import itertools
+import logging
 from datetime import date
 
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
 from rest_framework.authtoken.models import Token
 from rest_framework.reverse import reverse
 from rest_framework.test import APIClient, APIRequestFactory, APITestCase
 
+from . import authentication, identifiers, slugs
 from .models import MyCustomUser
 from .serializers import MyCustomUserSerializer
 from .views_api import UsersListCreate
@@ -38,6 +43,39 @@ class MyCustomUserTest(TestCase):
         # checking property output - > Name Surname
         self.assertEqual(testuser.full_name, "testname testsurname")
 
+    def test_user_creation_logged_as_structured_record(self):
+        root_handlers = list(logging.getLogger().handlers)
+        with self.assertLogs("accounts.user_creation") as logs:
+            testuser = MyCustomUser.objects.create_user(
+                email="test@gmail.com", name="testname", surname="testsurname", password=None
+            )
+
+        [record] = logs.records
+        self.assertEqual(record.getMessage(), "user_created")
+        self.assertEqual(
+            record.data, {"user": testuser.id, "email": "test@gmail.com", "email_domain": "gmail.com", "staff": False}
+        )
+        # logging configured once at startup -> root handlers are not replaced by every registration
+        self.assertEqual(logging.getLogger().handlers, root_handlers)
+
+    def test_random_identifier_from_id(self):
+        """identifier derived from the id -> unique, above the previous smallint range, also for bulk_create"""
+        testuser = MyCustomUser.objects.create_user(
+            email="test@gmail.com", name="testname", surname="testsurname", password=None
+        )
+        self.assertEqual(testuser.random_identifier, identifiers.from_id(testuser.id))
+        self.assertGreater(testuser.random_identifier, 32766)
+        self.assertEqual(testuser.slug, f"testname-testsurname-{testuser.random_identifier}")
+
+        with self.assertNumQueries(2):  # ids + INSERT
+            bulk = MyCustomUser.objects.bulk_create(
+                MyCustomUser(email=f"bulk{i}@gmail.com", name="bulk", surname="user") for i in range(50)
+            )
+        self.assertEqual(len({user.random_identifier for user in bulk}), 50)
+        for user in MyCustomUser.objects.filter(email__startswith="bulk"):
+            self.assertEqual(user.random_identifier, identifiers.from_id(user.id))
+            self.assertEqual(user.slug, f"bulk-user-{user.random_identifier}")
+
     def test_superuser_creation(self):
 
         testuser = MyCustomUser.objects.create_superuser(
@@ -246,6 +284,32 @@ class MyCustomUserTestAPI(APITestCase):
 
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
 
+    def test_user_detail_slug_lookup(self):
+        """slug column; hyphenated names, legacy slugs, renamed and unknown users"""
+        self.client.force_authenticate(self.admin_user)
+        hyphenated = MyCustomUser.objects.create_user(
+            email="h@gmail.com", name="Anna-Maria", surname="Kowalska-Nowak", password=None
+        )
+        url = reverse("accounts:user_detail", kwargs={"slug": hyphenated.slug})
+        with self.assertNumQueries(1):
+            self.assertEqual(slugs.get_user(hyphenated.slug), hyphenated)
+        self.assertEqual(self.client.get(url).data["email"], "h@gmail.com")
+
+        # legacy slug [column empty] -> found by identifier and stored
+        MyCustomUser.objects.filter(id=hyphenated.id).update(slug=None)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+        self.assertTrue(MyCustomUser.objects.filter(slug=hyphenated.slug).exists())
+
+        # renamed -> the old slug is not a valid legacy slug either
+        old_url = reverse("accounts:user_detail", kwargs={"slug": self.testuser.slug})
+        self.assertEqual(self.client.get(old_url).status_code, status.HTTP_200_OK)
+        self.testuser.name = "renamed"
+        self.testuser.save()
+        self.assertEqual(self.client.get(old_url).status_code, status.HTTP_404_NOT_FOUND)
+
+        url = reverse("accounts:user_detail", kwargs={"slug": "nobody-at-all-99999"})
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+
     def test_users_list_post_get_delete(self):
         self.client.force_authenticate(self.admin_user)
         data = {
@@ -348,6 +412,54 @@ class MyCustomUserTestAPI(APITestCase):
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    def test_token_authentication_cached(self):
+        """token -> user [+ profile] read once; dropped on profile change, deactivation and token deletion"""
+        token = Token.objects.get(user=self.testuser)
+        authentication.invalidate([token.key])
+        # redis outlives the rolled back test data
+        self.addCleanup(authentication.invalidate, [token.key])
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION="Token " + token.key)
+        url = reverse("accounts:user_detail", kwargs={"slug": self.testuser.slug})
+
+        def token_queries():
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(client.get(url).status_code, status.HTTP_200_OK)
+            return [query["sql"] for query in queries if "authtoken_token" in query["sql"]]
+
+        self.assertEqual(len(token_queries()), 1)
+        self.assertEqual(token_queries(), [])
+        # redis shared by processes -> a process with an empty local cache does not query either
+        authentication.local_cache.clear()
+        self.assertEqual(token_queries(), [])
+
+        # only the identity is cached [no user row, no password hash], users are built from it
+        profile = self.testuser.customerprofile
+        identity = (self.testuser.id, True, False, False, False, profile.id, "N")
+        self.assertEqual(cache.get(authentication._cache_key(token.key)), identity)
+        with self.assertNumQueries(0):
+            user = authentication.get_user(token.key)
+            profile_fields = (user.customerprofile.id, user.customerprofile.status)
+            user_fields = (user.id, user.is_active, user.is_staff, user.is_admin, user.is_superuser)
+            self.assertEqual((*user_fields, *profile_fields), identity)
+        self.assertIn("password", user.get_deferred_fields())
+        self.assertEqual(user.email, self.testuser.email)  # deferred -> loaded on access
+
+        profile.status = "R"
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.save()
+        self.assertEqual(authentication.get_user(token.key).customerprofile.status, "R")
+
+        self.testuser.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.testuser.save()
+        self.assertEqual(client.get(url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        key = token.key
+        with self.captureOnCommitCallbacks(execute=True):
+            token.delete()
+        self.assertIsNone(authentication.get_user(key))
+
     def test_user_registration_panel_django_rest_auth(self):
         data = {
             "email": "test_registration@gmail.com",
@@ -14,7 +14,7 @@ urlpatterns = [
     path("users/", UsersListCreate.as_view(), name="users_list"),
     path("admin_users/", AdminUsersList.as_view(), name="admin_list"),
     path("users/<slug:slug>", UserDetail.as_view(), name="user_detail"),
-    path("api-token-auth/", CustomAuthToken.as_view()),
+    path("api-token-auth/", CustomAuthToken.as_view(), name="api_token_auth"),
 ]
 
 
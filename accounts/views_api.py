@@ -4,11 +4,13 @@ from django_filters import rest_framework as filters
 from rest_framework import status
 from rest_framework.authtoken.models import Token
 from rest_framework.authtoken.views import ObtainAuthToken
+from rest_framework.exceptions import NotFound
 from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from . import filters as custom_filters
+from . import slugs
 from .models import MyCustomUser
 from .permissions import IsUserAccountOwnerOrAdmin
 from .serializers import MyCustomUserSerializer, RetrieveTokenSerializer
@@ -110,16 +112,13 @@ class UserDetail(APIView):
     serializer_class = MyCustomUserSerializer
 
     def get_object(self, slug):
-
+        """slug column [unique index], legacy slugs resolved by identifier"""
         try:
-            name, surname, identifier = slug.split("-")  # slug name-surname-identifier
-            user = MyCustomUser.objects.select_related("customerprofile").get(
-                Q(name__iexact=name), Q(surname__iexact=surname), Q(random_identifier=int(identifier))
-            )
-
+            user = slugs.get_user(slug, MyCustomUser.objects.select_related("customerprofile"))
         except ObjectDoesNotExist:
-            return Response("wrong id, user non existent")
-            # deploys method in the custom permission class: IsUserAccountOwnerOrAdmin
+            raise NotFound("wrong id, user non existent")
+
+        # deploys method in the custom permission class: IsUserAccountOwnerOrAdmin
         self.check_object_permissions(self.request, user)
         return user
 
@@ -145,9 +144,7 @@ class UserDetail(APIView):
         """
         user = self.get_object(slug)
         data = request.data
-        serializer = MyCustomUserSerializer(
-            user, data=data, partial=True, context={"obj": user.id, "request": request}
-        )
+        serializer = MyCustomUserSerializer(user, data=data, partial=True, context={"obj": user.id, "request": request})
 
         if serializer.is_valid():
             serializer.save()
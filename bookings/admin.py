@@ -1,6 +1,14 @@
 from django.contrib import admin
 
-from bookings.models import ChalletHouse, CustomerProfile, Opinion, Reservation, ReservationConfrimation, Suggestion
+from bookings.models import (
+    ChalletHouse,
+    CustomerProfile,
+    Opinion,
+    OutgoingEmail,
+    Reservation,
+    ReservationConfrimation,
+    Suggestion,
+)
 
 
 class CustomerInline(admin.StackedInline):
@@ -36,3 +44,4 @@ admin.site.register(Opinion)
 admin.site.register(Suggestion)
 admin.site.register(ChalletHouse)
 admin.site.register(ReservationConfrimation)
+admin.site.register(OutgoingEmail)
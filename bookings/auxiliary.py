@@ -1,12 +1,15 @@
-from datetime import date, timedelta
+import time
 
+from accounts import authentication
 from accounts.models import MyCustomUser
-from django.db import connection, models, reset_queries
-from django.db.models import F, Q
-from rest_framework.throttling import UserRateThrottle
+from core_project import audit
+from django.db import connection, models, transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import throttling
 
-from bookings.decorators import UpdateReservationDecorator, customer_profile_update_decorator
-from bookings.utils import my_date
+from bookings.throttling import SlidingWindowThrottleMixin
+from bookings.utils.intervals import DateIntervalSet
 
 
 def get_sentinel_user():
@@ -14,89 +17,171 @@ def get_sentinel_user():
 
 
 class ChalletSpotQuerySet(models.Manager):
-    def house_spots(self, house_number):
+    def house_availability(self, house_number):
+        """
+        returns all taken nights of the house as a DateIntervalSet -> one query, no per-day expansion
+        """
         # ignore all canceleed reservations
-        queryset = (
-            self.select_related("house").filter(Q(house=house_number) & ~Q(start_date=None)).order_by("start_date")
+        dates = (
+            self.filter(Q(house=house_number) & ~Q(start_date=None))
+            .order_by("start_date")
+            .values_list("start_date", "end_date")
         )
-        taken_spots = self._date_ranges(queryset)
-        return {house_number: taken_spots}
+        return DateIntervalSet(dates)
 
-    def _date_ranges(self, queryset):
-        all_taken_days = []
-        for reservation in queryset:
 
-            start = reservation.start_date
-            end = reservation.end_date
-            difference = end - start
-
-            days = [
-                start + timedelta(days=day)
-                for day in range(difference.days)
-                if (start + timedelta(days=day) >= date.today())
-            ]
-            all_taken_days.extend(days)
-
-        return all_taken_days
-
-
-@customer_profile_update_decorator(log=True)
-def update_customer_profile_status_hierarchy(customer_profile, hierarchy):
-    """
-    update total_visits on the customer profile, check if they should advance in ranks
-    """
-    customer_profile.total_visits = F("total_visits") + 1
-    customer_profile.save()
-    customer_profile.refresh_from_db()
-    if customer_profile.status == "S":
-        pass
-    else:
-        if customer_profile.total_visits < hierarchy["N"]:
-            # N = Default
-            pass
-        elif customer_profile.total_visits <= hierarchy["R"]:
-            customer_profile.status = "R"
-        else:
-            customer_profile.status = "S"
-    customer_profile.save()
-
-
-@UpdateReservationDecorator
-def update_reservation_customerprofile(all_current_reservations, hierarchy, end_date=None):
+def complete_past_reservations(end_date, hierarchy, batch_size=1000, dry_run=False, progress=None):
     """
-    query all current reservations [target-> end_date=today()] and check if their status is 9 or 99, (cancelled/completed)
-    -> if not change status to 99
+    set based replacement of the per reservation loop [nightly job + run_updates view], all in one transaction:
+    1. reservations which ended by end_date [not cancelled/completed] -> status 99, one UPDATE per batch
+    2. total_visits of their profiles += number of completed reservations, one UPDATE ... FROM per batch
+    3. statuses of profiles promoted with a single CASE UPDATE based on the hierarchy [N -> R -> S, never demoted]
+    - dry_run rolls everything back, report has the same numbers
+    - progress(batch, completed_so_far) called after each batch
+    - no save() -> signals are not sent, completed reservations keep their nights in the occupancy bitmaps,
+      statistics summaries are moved by the batches and the promotion [bookings/statistics.py]
+    - transitions [id + previous status] come with the updates and go to the audit log after commit
+    - users of promoted profiles are dropped from the token cache after commit [status read by the throttles]
     """
-
-    if end_date is None:
-        end_date = my_date.today()
-
-    for reservation in all_current_reservations:
-        reservation.status = 99
-        update_customer_profile_status_hierarchy(reservation.customer_profile, hierarchy)
-        reservation.save()
-
-
-class CustomUseRateThrottle(UserRateThrottle):
-    rate = "100/day"
-
-    def allow_request(self, request, view):
-
+    from bookings import response_cache, statistics
+    from bookings.models import CustomerProfile, Reservation
+
+    report = {"completed": 0, "profiles_updated": 0, "promoted": 0, "batches": 0, "dry_run": dry_run}
+    timings = {"complete": 0.0, "visits": 0.0, "promote": 0.0}
+    transitions = []  # (model, [(id, previous status)], new status) -> audit log
+    started = time.perf_counter()
+
+    pending = (
+        Reservation.objects.filter(end_date__lte=end_date)
+        .exclude(status__in=[Reservation.CANCELLED, Reservation.COMPLETED])
+        .order_by("id")
+    )
+    profile_table = CustomerProfile._meta.db_table
+    reservation_table = Reservation._meta.db_table
+
+    with transaction.atomic():
+        last_id = 0
+        while True:
+            # keyset on id -> every batch is an index range scan, already completed rows are not visited again
+            step = time.perf_counter()
+            rows = list(pending.filter(id__gt=last_id).values_list("id", "status")[:batch_size])
+            if not rows:
+                break
+            ids = [id for id, _ in rows]
+            statistics.complete_reservations(ids)  # update() sends no signals, reads the statuses before the update
+            Reservation.objects.filter(id__in=ids).update(status=Reservation.COMPLETED, updated_at=timezone.now())
+            timings["complete"] += time.perf_counter() - step
+            # previous statuses come with the ids -> the transition is logged without another query
+            if audit.enabled():
+                transitions.append(("bookings.Reservation", rows, Reservation.COMPLETED))
+
+            step = time.perf_counter()
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"""
+                    UPDATE {profile_table} AS profile
+                    SET total_visits = profile.total_visits + visits.completed
+                    FROM (
+                        SELECT customer_profile_id, COUNT(*) AS completed
+                        FROM {reservation_table}
+                        WHERE id = ANY(%s)
+                        GROUP BY customer_profile_id
+                    ) AS visits
+                    WHERE profile.id = visits.customer_profile_id
+                    """,
+                    [ids],
+                )
+                report["profiles_updated"] += cursor.rowcount
+            timings["visits"] += time.perf_counter() - step
+
+            last_id = ids[-1]
+            report["completed"] += len(ids)
+            report["batches"] += 1
+            if progress is not None:
+                progress(report["batches"], report["completed"])
+
+        step = time.perf_counter()
+        with connection.cursor() as cursor:
+            # previous status joined in -> RETURNING has both sides of the transition
+            cursor.execute(
+                f"""
+                UPDATE {profile_table} AS profile
+                SET status = CASE WHEN profile.total_visits > %(regular)s THEN %(super)s ELSE %(regular_status)s END
+                FROM {profile_table} AS previous
+                WHERE previous.id = profile.id AND (
+                    (profile.status = %(new_status)s AND profile.total_visits >= %(new)s)
+                    OR (profile.status = %(regular_status)s AND profile.total_visits > %(regular)s)
+                )
+                RETURNING profile.id, previous.status, profile.status, profile.user_id,
+                    EXTRACT(MONTH FROM profile.joined)::int
+                """,
+                {
+                    "new": hierarchy["N"],
+                    "regular": hierarchy["R"],
+                    "new_status": CustomerProfile.NEW_CUSTOMER,
+                    "regular_status": CustomerProfile.REGULAR,
+                    "super": CustomerProfile.SUPER,
+                },
+            )
+            promoted = cursor.fetchall()
+        report["promoted"] = len(promoted)
+        timings["promote"] += time.perf_counter() - step
+        if audit.enabled():
+            for status in (CustomerProfile.REGULAR, CustomerProfile.SUPER):
+                rows = [(id, previous) for id, previous, new, *_ in promoted if new == status]
+                if rows:
+                    transitions.append(("bookings.CustomerProfile", rows, status))
+
+        if dry_run:
+            transaction.set_rollback(True)
+        elif report["completed"] or report["promoted"]:
+            # update() does not send signals
+            statistics.add_customers((month, previous, new) for _, previous, new, _, month in promoted)
+            response_cache.mark_stale(Reservation)
+            response_cache.mark_stale(CustomerProfile)
+            authentication.invalidate_users(user_id for *_, user_id, _ in promoted)
+            # one record per batch and target status, written once [and only if] the transaction commits
+            for model, rows, status in transitions:
+                audit.log_on_commit(
+                    "status_transition",
+                    model=model,
+                    to=status,
+                    ids=[id for id, _ in rows],
+                    previous=[s for _, s in rows],
+                )
+
+    report["seconds"] = {stage: round(seconds, 4) for stage, seconds in timings.items()}
+    report["seconds"]["total"] = round(time.perf_counter() - started, 4)
+
+    audit.log("reservations_completed", end_date=end_date, **report)
+
+    return report
+
+
+class CustomUseRateThrottle(SlidingWindowThrottleMixin, throttling.UserRateThrottle):
+    scope = "opinions"  # 100/day [settings]
+
+    def get_cache_key(self, request, view):
+        # no key -> not throttled
         if request.user.is_anonymous or request.user.is_admin is False:
             # regular and super customers do not have any limitation
             try:
                 if request.user.customerprofile.status != "N":
-                    return True
+                    return None
             except AttributeError:
                 pass
-            return super().allow_request(request, view)
+            return super().get_cache_key(request, view)
         else:
-            return True
+            return None
 
 
-class BurstRateThrottle(UserRateThrottle):
+class BurstRateThrottle(SlidingWindowThrottleMixin, throttling.UserRateThrottle):
     scope = "burst"
 
 
-class SustainedRateThrottle(UserRateThrottle):
+class SustainedRateThrottle(SlidingWindowThrottleMixin, throttling.UserRateThrottle):
     scope = "sustained"
+
+
+class AnonRateThrottle(SlidingWindowThrottleMixin, throttling.AnonRateThrottle):
+    pass
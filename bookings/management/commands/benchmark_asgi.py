@@ -0,0 +1,85 @@
+import json
+from datetime import date, timedelta
+from pathlib import Path
+from urllib.parse import urlencode
+
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from bookings.models import ChalletHouse
+from bookings.utils.loadtest import gunicorn, load
+
+MODES = {
+    # gunicorn.conf.py settings of each setup
+    "wsgi": {"GUNICORN_APP": "core_project.wsgi:application", "GUNICORN_WORKER_CLASS": "gthread"},
+    "asgi": {"GUNICORN_APP": "core_project.asgi:application", "GUNICORN_WORKER_CLASS": "uvicorn.workers.UvicornWorker"},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Throughput of the read-mostly endpoints with a fixed number of concurrent keep-alive clients: "
+        "gunicorn serving the wsgi app with gthread workers vs the asgi app with uvicorn workers, same number of "
+        "workers, same database [generate_data], throttles lifted. The clients are threads of this process -> keep "
+        "an eye on its cpu when the numbers get close to the limit of one python process"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--modes", nargs="+", choices=list(MODES), default=list(MODES))
+        parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 64], help="clients at once")
+        parser.add_argument("--requests", type=int, default=1000, help="per endpoint and concurrency")
+        parser.add_argument("--warmup", type=int, default=20, help="per endpoint, not recorded")
+        parser.add_argument("--workers", type=int, default=2)
+        parser.add_argument("--threads", type=int, default=8, help="per gthread worker [wsgi]")
+        parser.add_argument("--port", type=int, default=8100)
+        parser.add_argument("--output", help="JSON with the results")
+
+    def handle(self, *args, **options):
+        house = ChalletHouse.objects.order_by("house_number").first()
+        if house is None:
+            raise CommandError("no houses to read, run generate_data first")
+        today = date.today()
+        availability = {"from": today.isoformat(), "to": (today + timedelta(days=90)).isoformat()}
+        paths = {
+            "api_root": reverse("api_root"),
+            "bookings:challet_houses": reverse("bookings:challet_houses"),
+            "bookings:opinions": reverse("bookings:opinions"),
+            "bookings:house_availability": f"{reverse('bookings:house_availability', args=[house.pk])}?"
+            f"{urlencode(availability)}",
+        }
+
+        results = {}
+        self.stdout.write(f"{'mode':>5} {'endpoint':>28} {'clients':>7} {'req/s':>8} {'p50':>9} {'p99':>9}  status")
+        for mode in options["modes"]:
+            env = {
+                **MODES[mode],
+                "GUNICORN_WORKERS": str(options["workers"]),
+                "GUNICORN_THREADS": str(options["threads"]),
+            }
+            with gunicorn(env, options["port"]) as port:
+                for endpoint, path in paths.items():
+                    load(port, path, 1, options["warmup"])
+                    for concurrency in options["concurrency"]:
+                        result = load(port, path, concurrency, options["requests"])
+                        results.setdefault(endpoint, {}).setdefault(str(concurrency), {})[mode] = result
+                        self.stdout.write(
+                            f"{mode:>5} {endpoint:>28} {concurrency:>7} {result['rps']:>8.0f} "
+                            f"{result['p50_ms']:>7.2f}ms {result['p99_ms']:>7.2f}ms  {result['status']}"
+                        )
+
+        if set(options["modes"]) == set(MODES):
+            self.report_speedup(results)
+        if options["output"]:
+            output = Path(options["output"])
+            output.parent.mkdir(parents=True, exist_ok=True)
+            output.write_text(json.dumps({"options": {k: options[k] for k in ("workers", "threads")}, **results}))
+            self.stdout.write(f"written to {output}")
+
+    def report_speedup(self, results):
+        self.stdout.write(f"\n{'endpoint':>28} {'clients':>7} {'wsgi req/s':>11} {'asgi req/s':>11} {'change':>7}")
+        for endpoint, levels in results.items():
+            for concurrency, modes in levels.items():
+                before, after = modes["wsgi"]["rps"], modes["asgi"]["rps"]
+                self.stdout.write(
+                    f"{endpoint:>28} {concurrency:>7} {before:>11.0f} {after:>11.0f} {(after - before) / before:>+7.0%}"
+                )
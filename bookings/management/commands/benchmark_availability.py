@@ -0,0 +1,75 @@
+import random
+import timeit
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+
+from bookings.utils.intervals import DateIntervalSet
+
+
+def expand_to_days(reservations, today):
+    """previous implementation of ChalletSpotQuerySet._date_ranges -> every taken night as a separate date"""
+    all_taken_days = []
+    for start, end in reservations:
+        all_taken_days.extend(
+            start + timedelta(days=day) for day in range((end - start).days) if start + timedelta(days=day) >= today
+        )
+    return all_taken_days
+
+
+def overlaps_in_list(taken_days, start, end):
+    """previous overlap check -> linear `day in list` for every night of the new reservation"""
+    return any(start + timedelta(days=day) in taken_days for day in range((end - start).days))
+
+
+class Command(BaseCommand):
+    help = "Compares the list expansion of reserved nights with DateIntervalSet overlap queries (no database needed)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reservations", type=int, nargs="+", default=[100, 1000, 5000])
+        parser.add_argument("--checks", type=int, default=200, help="number of overlap checks per run")
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        today = date.today()
+
+        self.stdout.write(
+            f"{'reservations':>12} {'list build':>12} {'list checks':>12} {'set build':>12} {'set checks':>12}"
+        )
+        for size in options["reservations"]:
+            reservations = self._generate_reservations(rng, today, size)
+            new_stays = [self._random_stay(rng, today, size) for _ in range(options["checks"])]
+
+            list_build = timeit.timeit(lambda: expand_to_days(reservations, today), number=1)
+            taken_days = expand_to_days(reservations, today)
+            list_checks = timeit.timeit(lambda: [overlaps_in_list(taken_days, *s) for s in new_stays], number=1)
+
+            set_build = timeit.timeit(lambda: DateIntervalSet(reservations), number=1)
+            taken_nights = DateIntervalSet(reservations)
+            set_checks = timeit.timeit(lambda: [taken_nights.overlaps(*s) for s in new_stays], number=1)
+
+            # both implementations must agree before their timings mean anything
+            assert [overlaps_in_list(taken_days, *s) for s in new_stays] == [
+                taken_nights.overlaps(*s) for s in new_stays
+            ]
+
+            self.stdout.write(
+                f"{size:>12} {list_build * 1000:>10.2f}ms {list_checks * 1000:>10.2f}ms "
+                f"{set_build * 1000:>10.2f}ms {set_checks * 1000:>10.2f}ms"
+            )
+
+    def _generate_reservations(self, rng, today, size):
+        """back to back stays of 1-14 nights with random gaps -> the same shape as a single house calendar"""
+        reservations = []
+        start = today
+        for _ in range(size):
+            start += timedelta(days=rng.randint(0, 3))
+            end = start + timedelta(days=rng.randint(1, 14))
+            reservations.append((start, end))
+            start = end
+        return reservations
+
+    def _random_stay(self, rng, today, size):
+        start = today + timedelta(days=rng.randint(0, size * 10))
+        return start, start + timedelta(days=rng.randint(1, 14))
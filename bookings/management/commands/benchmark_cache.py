@@ -0,0 +1,111 @@
+import copy
+import itertools
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from unittest import mock
+
+from accounts.models import MyCustomUser
+from core_project import metrics
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework.views import APIView
+
+from bookings.utils.seed import seed_reservations
+
+VERSION_KEYS = [f"benchmark_cache:version:{i}" for i in range(5)]
+
+
+def cache_settings(parser, max_connections):
+    caches = copy.deepcopy(settings.CACHES)
+    caches["default"]["OPTIONS"].update(parser=parser, max_connections=max_connections)
+    return caches
+
+
+class Command(BaseCommand):
+    help = (
+        "Cache operations [ops/sec, --threads sharing one pool] and cached list endpoints [requests/sec, all hits] "
+        "with the python and the hiredis parser, against the redis of settings.CACHES; seeded data is rolled back"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--ops", type=int, default=5000, help="per operation and run")
+        parser.add_argument("--threads", type=int, nargs="+", default=[1, 8])
+        parser.add_argument("--pool-sizes", type=int, nargs="+", default=[10, 50])
+        parser.add_argument("--requests", type=int, default=500, help="per endpoint and run")
+        parser.add_argument("--reservations", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic(), mock.patch.object(APIView, "get_throttles", lambda self: []):
+            admin = MyCustomUser.objects.create_superuser(
+                email="benchmark_admin@example.com", name="bench", surname="admin", password=None
+            )
+            customer = MyCustomUser.objects.create_user(
+                email="benchmark_customer@example.com", name="bench", surname="customer", password=None
+            )
+            seed_reservations(options["reservations"], [(customer.customerprofile.id, customer.id)], start=date.today())
+
+            admin_client = Client(HTTP_HOST=settings.ALLOWED_HOSTS[0])
+            admin_client.force_login(admin)
+            anonymous_client = Client(HTTP_HOST=settings.ALLOWED_HOSTS[0])
+            self.endpoints = [
+                ("bookings:reservations", admin_client),
+                ("bookings:challet_houses", anonymous_client),
+            ]
+            # a cached page of the reservation list -> typical value read by the response cache
+            self.payload = admin_client.get(reverse("bookings:reservations")).data
+
+            self.stdout.write(f"{'parser':>8} {'pool':>5} {'threads':>8} {'operation':>24} {'ops/sec':>10}")
+            for parser, pool_size in itertools.product(("python", "hiredis"), options["pool_sizes"]):
+                with override_settings(CACHES=cache_settings(parser, pool_size)):
+                    self.operations(parser, pool_size, options)
+                    self.requests(parser, pool_size, options)
+
+            cache.delete_many(VERSION_KEYS + ["benchmark_cache:payload"])
+            transaction.set_rollback(True)
+
+    def report(self, parser, pool_size, threads, name, count, seconds):
+        self.stdout.write(f"{parser:>8} {pool_size:>5} {threads:>8} {name:>24} {count / seconds:>10.0f}")
+
+    def operations(self, parser, pool_size, options):
+        cache.set("benchmark_cache:payload", self.payload)
+        cache.set_many({key: 1 for key in VERSION_KEYS}, timeout=None)
+        operations = [
+            ("get [response page]", lambda: cache.get("benchmark_cache:payload")),
+            ("set [response page]", lambda: cache.set("benchmark_cache:payload", self.payload)),
+            ("get_many [5 versions]", lambda: cache.get_many(VERSION_KEYS)),
+            ("incr x5 [5 versions]", lambda: [cache.incr(key) for key in VERSION_KEYS]),
+            ("incr_many [5 versions]", lambda: cache.incr_many(VERSION_KEYS)),
+        ]
+        for threads in options["threads"]:
+            for name, operation in operations:
+
+                def run(count):
+                    for _ in range(count):
+                        operation()
+
+                per_thread = options["ops"] // threads
+                with ThreadPoolExecutor(threads) as executor:
+                    started = time.perf_counter()
+                    list(executor.map(run, [per_thread] * threads))
+                    elapsed = time.perf_counter() - started
+                self.report(parser, pool_size, threads, name, per_thread * threads, elapsed)
+
+    def requests(self, parser, pool_size, options):
+        # test client in this thread only -> the seeded data is not visible to other connections
+        for name, client in self.endpoints:
+            url = reverse(name)
+            client.get(url)  # stored -> every request below is a hit
+            misses = metrics.cache_outcomes(name)["miss"]
+            started = time.perf_counter()
+            for _ in range(options["requests"]):
+                response = client.get(url)
+                assert response.status_code == 200, response.status_code
+            elapsed = time.perf_counter() - started
+            assert metrics.cache_outcomes(name)["miss"] == misses
+            self.report(parser, pool_size, 1, name, options["requests"], elapsed)
@@ -0,0 +1,96 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection
+from django.urls import reverse
+
+from bookings.models import ChalletHouse
+from bookings.utils.loadtest import gunicorn, load
+
+WSGI = {"GUNICORN_APP": "core_project.wsgi:application", "GUNICORN_WORKER_CLASS": "gthread"}
+
+
+def sessions():
+    """connections postgres has accepted so far [postgres 14+, None before]"""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_stat_clear_snapshot()")
+        try:
+            cursor.execute("SELECT sessions FROM pg_stat_database WHERE datname = current_database()")
+        except DatabaseError:
+            return None
+        return cursor.fetchone()[0]
+
+
+class Command(BaseCommand):
+    help = (
+        "Cost of opening a database connection per request under concurrent load: gunicorn [wsgi, gthread] with "
+        "DB_CONN_MAX_AGE=0 [a connection per request] vs persistent connections with health checks, and through "
+        "pgbouncer [--pgbouncer]. Endpoint: house detail, not cached -> queries on every request. Reports the "
+        "connections postgres accepted during each run"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 64], help="clients at once")
+        parser.add_argument("--requests", type=int, default=1000, help="per concurrency")
+        parser.add_argument("--warmup", type=int, default=20, help="not recorded")
+        parser.add_argument("--workers", type=int, default=2)
+        parser.add_argument("--threads", type=int, default=8, help="per gthread worker")
+        parser.add_argument("--port", type=int, default=8100)
+        parser.add_argument("--pgbouncer", metavar="HOST:PORT", help="pgbouncer in transaction pooling mode")
+
+    def handle(self, *args, **options):
+        house = ChalletHouse.objects.order_by("house_number").first()
+        if house is None:
+            raise CommandError("no houses to read, run generate_data first")
+        path = reverse("bookings:challet_house", args=[house.pk])
+
+        started = time.perf_counter()
+        for _ in range(20):
+            connection.close()
+            connection.ensure_connection()
+        self.stdout.write(f"opening a connection [this process]: {(time.perf_counter() - started) / 20 * 1000:.2f}ms")
+
+        modes = {
+            "per request": {"DB_CONN_MAX_AGE": "0"},
+            "persistent": {"DB_CONN_MAX_AGE": "60", "DB_CONN_HEALTH_CHECKS": "true"},
+        }
+        if options["pgbouncer"]:
+            host, _, port = options["pgbouncer"].partition(":")
+            modes["pgbouncer"] = {
+                "POSTGRES_HOST": host,
+                "POSTGRES_PORT": port or "6432",
+                "DB_PGBOUNCER": "true",
+                "DB_CONN_MAX_AGE": "0",  # the asgi setting -> a pgbouncer connection per request
+            }
+
+        results = {}
+        self.stdout.write(f"{'mode':>12} {'clients':>7} {'req/s':>8} {'p50':>9} {'p99':>9} {'connections':>11}  status")
+        for mode, env in modes.items():
+            env = {
+                **WSGI,
+                **env,
+                "GUNICORN_WORKERS": str(options["workers"]),
+                "GUNICORN_THREADS": str(options["threads"]),
+            }
+            with gunicorn(env, options["port"]) as port:
+                load(port, path, 1, options["warmup"])
+                for concurrency in options["concurrency"]:
+                    before = sessions()
+                    result = load(port, path, concurrency, options["requests"])
+                    time.sleep(1.5)  # backends report their statistics once a second
+                    after = sessions()
+                    result["connections"] = after - before if before is not None else None
+                    results.setdefault(concurrency, {})[mode] = result
+                    self.stdout.write(
+                        f"{mode:>12} {concurrency:>7} {result['rps']:>8.0f} {result['p50_ms']:>7.2f}ms "
+                        f"{result['p99_ms']:>7.2f}ms {result['connections'] if before is not None else '-':>11}  "
+                        f"{result['status']}"
+                    )
+
+        self.stdout.write(f"\n{'clients':>7} " + " ".join(f"{mode + ' req/s':>17}" for mode in modes))
+        for concurrency, by_mode in results.items():
+            baseline = by_mode["per request"]["rps"]
+            cells = [
+                f"{by_mode[mode]['rps']:>8.0f} {(by_mode[mode]['rps'] - baseline) / baseline:>+8.0%}" for mode in modes
+            ]
+            self.stdout.write(f"{concurrency:>7} " + " ".join(f"{cell:>17}" for cell in cells))
@@ -0,0 +1,81 @@
+import os
+import resource
+import time
+
+from accounts.models import MyCustomUser
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from bookings.utils.seed import seed_reservations
+from bookings.views_api import ReservationExportView
+
+
+def current_rss():
+    """resident memory of the process in bytes [linux], peak so far elsewhere"""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class Command(BaseCommand):
+    help = (
+        "Seeds reservations [rolled back afterwards] and streams them through the export endpoint, "
+        "fails if RSS grows by more than --max-rss-mb"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reservations", type=int, default=500_000)
+        parser.add_argument("--houses", type=int, default=500)
+        parser.add_argument("--max-rss-mb", type=int, default=50, help="allowed RSS growth while exporting")
+        parser.add_argument("--output", choices=["csv", "jsonl"], nargs="+", default=["csv", "jsonl"])
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            admin = self._seed(options)
+            failed = [output for output in options["output"] if not self._export(admin, output, options)]
+            transaction.set_rollback(True)
+
+        if failed:
+            raise CommandError(f"RSS ceiling of {options['max_rss_mb']}MB exceeded: {', '.join(failed)}")
+
+    def _seed(self, options):
+        started = time.perf_counter()
+        user = MyCustomUser.objects.create_user(
+            email="benchmark@example.com", name="bench", surname="mark", password=None
+        )
+        admin = MyCustomUser.objects.create_superuser(
+            email="benchmark_admin@example.com", name="bench", surname="admin", password=None
+        )
+        created = seed_reservations(
+            options["reservations"], [(user.customerprofile.id, user.id)], houses=options["houses"]
+        )
+        self.stdout.write(f"seeded {created} reservations in {time.perf_counter() - started:.1f}s")
+        return admin
+
+    def _export(self, admin, output, options):
+        request = APIRequestFactory(SERVER_NAME=settings.ALLOWED_HOSTS[0]).get(
+            "/api/bookings/reservations/export/", {"output": output}
+        )
+        force_authenticate(request, user=admin)
+
+        baseline = peak = current_rss()
+        started = time.perf_counter()
+        response = ReservationExportView.as_view()(request)
+        rows = size = 0
+        for chunk in response.streaming_content:
+            size += len(chunk)
+            rows += chunk.count(b"\n")
+            peak = max(peak, current_rss())
+        elapsed = time.perf_counter() - started
+
+        growth_mb = (peak - baseline) / 1024**2
+        passed = growth_mb <= options["max_rss_mb"]
+        self.stdout.write(
+            f"{output:>5}: {rows} lines, {size / 1024 ** 2:.1f}MB in {elapsed:.1f}s "
+            f"({rows / elapsed:.0f} rows/s), RSS growth {growth_mb:.1f}MB [{'ok' if passed else 'FAILED'}]"
+        )
+        return passed
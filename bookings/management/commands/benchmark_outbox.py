@@ -0,0 +1,112 @@
+import socketserver
+import threading
+import time
+
+from django.core.mail import EmailMessage, get_connection
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from bookings import outbox
+
+
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+    """just enough smtp for smtplib: every message is accepted and thrown away"""
+
+    def handle(self):
+        with self.server.lock:
+            self.server.connections += 1
+        # greeting delayed like the handshake [dns, tcp, tls, auth] of a real server
+        time.sleep(self.server.handshake_delay)
+        self._reply(b"220 sink ESMTP")
+
+        while line := self.rfile.readline():
+            command = line[:4].upper()
+            if command == b"EHLO" or command == b"HELO":
+                self._reply(b"250 sink")
+            elif command == b"DATA":
+                self._reply(b"354 end data with <CR><LF>.<CR><LF>")
+                while self.rfile.readline() not in (b".\r\n", b""):
+                    pass
+                with self.server.lock:
+                    self.server.messages += 1
+                self._reply(b"250 OK")
+            elif command == b"QUIT":
+                self._reply(b"221 bye")
+                return
+            else:  # MAIL, RCPT, RSET, NOOP
+                self._reply(b"250 OK")
+
+    def _reply(self, line):
+        self.wfile.write(line + b"\r\n")
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, handshake_delay):
+        super().__init__(("127.0.0.1", 0), SMTPSinkHandler)
+        self.handshake_delay = handshake_delay
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.messages = 0
+
+    def reset(self):
+        self.connections = self.messages = 0
+
+
+class Command(BaseCommand):
+    help = (
+        "Sends messages to a local smtp sink: one connection per message [send_mail in every task, before] "
+        "vs the outbox flushed in batches over one connection [after]; the outbox is rolled back afterwards"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--messages", type=int, default=500)
+        parser.add_argument("--batch-size", type=int, default=outbox.BATCH_SIZE)
+        parser.add_argument("--handshake-ms", type=float, default=20, help="delay of the sink before its greeting")
+
+    def handle(self, *args, **options):
+        sink = SMTPSink(options["handshake_ms"] / 1000)
+        threading.Thread(target=sink.serve_forever, daemon=True).start()
+        host, port = sink.server_address
+
+        def smtp_connection():
+            return get_connection(
+                "django.core.mail.backends.smtp.EmailBackend",
+                host=host,
+                port=port,
+                username="",
+                password="",
+                use_tls=False,
+                use_ssl=False,
+                fail_silently=False,
+            )
+
+        count = options["messages"]
+        self.stdout.write(f"{'mode':>22} {'messages':>9} {'connections':>12} {'time':>9} {'msg/s':>8}")
+
+        try:
+            started = time.perf_counter()
+            for i in range(count):
+                EmailMessage(f"message {i}", "body", to=["guest@example.com"], connection=smtp_connection()).send()
+            self._report("connection per message", sink, time.perf_counter() - started)
+
+            with transaction.atomic():
+                for i in range(count):
+                    outbox.enqueue(f"message {i}", "body", to=["guest@example.com"])
+
+                started = time.perf_counter()
+                while sum(outbox.flush(batch_size=options["batch_size"], connection=smtp_connection()).values()):
+                    pass
+                self._report(f"outbox, batches of {options['batch_size']}", sink, time.perf_counter() - started)
+                transaction.set_rollback(True)
+        finally:
+            sink.shutdown()
+            sink.server_close()
+
+    def _report(self, mode, sink, elapsed):
+        self.stdout.write(
+            f"{mode:>22} {sink.messages:>9} {sink.connections:>12} {elapsed:>8.2f}s {sink.messages / elapsed:>8.0f}"
+        )
+        sink.reset()
@@ -0,0 +1,108 @@
+import time
+import tracemalloc
+
+from accounts.models import MyCustomUser
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from bookings.models import Reservation
+from bookings.paginators import MyCustomKeysetPaginator
+from bookings.utils import my_date
+from bookings.utils.seed import seed_reservations
+from bookings.views_api import ReservationsListViewSet
+
+
+class Command(BaseCommand):
+    help = (
+        "Seeds reservations [rolled back afterwards] and measures latency, queries and peak memory of "
+        "past_reservations pages at increasing depth"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reservations", type=int, default=1_000_000)
+        parser.add_argument("--houses", type=int, default=1000)
+        parser.add_argument("--users", type=int, default=50)
+        parser.add_argument("--page-size", type=int, default=25)
+        parser.add_argument("--depths", type=int, nargs="+", default=[0, 1000, 100_000, 500_000, 900_000])
+        parser.add_argument("--keep", action="store_true", help="commit the seeded data instead of rolling back")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            admin, owner = self._seed(options)
+            view = ReservationsListViewSet.as_view(
+                {"get": "past_reservations"}, pagination_class=MyCustomKeysetPaginator
+            )
+
+            for user in (admin, owner):
+                self.stdout.write(f"\n{'admin' if user.is_admin else 'owner'}: page of {options['page_size']}")
+                self.stdout.write(f"{'depth':>10} {'latency':>10} {'queries':>8} {'peak memory':>12} {'rows':>5}")
+                for depth in options["depths"]:
+                    self._measure(view, user, depth, options["page_size"])
+
+            if not options["keep"]:
+                transaction.set_rollback(True)
+
+    def _seed(self, options):
+        started = time.perf_counter()
+        # no passwords -> hashing would take longer than the seeding itself
+        users = [
+            MyCustomUser.objects.create_user(
+                email=f"benchmark{i}@example.com", name="bench", surname="mark", password=None
+            )
+            for i in range(options["users"])
+        ]
+        admin = MyCustomUser.objects.create_superuser(
+            email="benchmark_admin@example.com", name="bench", surname="admin", password=None
+        )
+        profiles = [(user.customerprofile.id, user.id) for user in users]
+        created = seed_reservations(options["reservations"], profiles, houses=options["houses"])
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {Reservation._meta.db_table}")
+        self.stdout.write(f"seeded {created} reservations in {time.perf_counter() - started:.1f}s")
+        return admin, users[0]
+
+    def _measure(self, view, user, depth, page_size):
+        """depth = number of rows before the page; the cursor is built outside of the measurement"""
+        params = {"user_page_size": page_size}
+        cursor_row = self._row_at(user, depth - 1) if depth else None
+        if depth and cursor_row is None:
+            self.stdout.write(f"{depth:>10} {'-':>10} -> not that many past reservations")
+            return
+
+        factory = APIRequestFactory(SERVER_NAME=settings.ALLOWED_HOSTS[0])
+        if cursor_row is not None:
+            params["cursor"] = MyCustomKeysetPaginator().cursor_for(cursor_row)
+        request = factory.get("/api/bookings/reservations/past_reservations/", params)
+        force_authenticate(request, user=user)
+
+        # timing and memory measured in separate calls -> tracemalloc slows everything down
+        started = time.perf_counter()
+        with CaptureQueriesContext(connection) as queries:
+            response = view(request)
+            response.render()
+        elapsed = time.perf_counter() - started
+
+        tracemalloc.start()
+        view(request).render()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        self.stdout.write(
+            f"{depth:>10} {elapsed * 1000:>8.1f}ms {len(queries):>8} {peak / 1024:>10.0f}KB "
+            f"{len(response.data['results']):>5}"
+        )
+
+    def _row_at(self, user, offset):
+        queryset = Reservation.objects.filter(Q(end_date__lt=my_date.today()) | Q(end_date=None))
+        if not user.is_admin:
+            queryset = queryset.filter(reservation_owner=user)
+        return (
+            queryset.order_by(F("end_date").desc(nulls_last=True), F("id").desc())
+            .only("id", "end_date")[offset : offset + 1]
+            .first()
+        )
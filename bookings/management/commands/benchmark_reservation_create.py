@@ -0,0 +1,77 @@
+import time
+from datetime import date, timedelta
+
+from accounts.models import MyCustomUser
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models.signals import post_save
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from bookings.models import ChalletHouse, ReservationConfrimation
+from bookings.utils.loadtest import percentile
+from bookings.views_api import ReservationCreateView
+
+
+def render_in_request(sender, instance, created, **kwargs):
+    """previous behaviour: ReservationConfrimation.save rendered the pdf inside the request"""
+    if instance.render():
+        ReservationConfrimation.objects.filter(id=instance.id).update(
+            saved_file=instance.saved_file.name, content_hash=instance.content_hash
+        )
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates reservations through ReservationCreateView [rolled back afterwards] and reports p50/p99 latency "
+        "with the pdf confirmation rendered in the request [before] and by the celery task [after]"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'mode':>20} {'requests':>9} {'p50':>9} {'p99':>9}")
+        for mode, inline in (("render in request", True), ("render in task", False)):
+            with transaction.atomic():
+                if inline:
+                    post_save.connect(render_in_request, sender=ReservationConfrimation)
+                try:
+                    timings = self._create_reservations(options["requests"])
+                finally:
+                    post_save.disconnect(render_in_request, sender=ReservationConfrimation)
+                    self._delete_rendered_files()
+                transaction.set_rollback(True)
+
+            self.stdout.write(
+                f"{mode:>20} {len(timings):>9} {percentile(timings, 50) * 1000:>7.1f}ms "
+                f"{percentile(timings, 99) * 1000:>7.1f}ms"
+            )
+
+    def _create_reservations(self, count):
+        # no password -> hashing is not what is measured here
+        user = MyCustomUser.objects.create_user(
+            email="benchmark@example.com", name="bench", surname="mark", password=None
+        )
+        house = ChalletHouse.objects.create(house_number=9999, price_night=300)
+        view = ReservationCreateView.as_view()
+        factory = APIRequestFactory(SERVER_NAME=settings.ALLOWED_HOSTS[0])
+        first_day = date.today() + timedelta(days=1)
+
+        timings = []
+        for i in range(count):
+            start = first_day + timedelta(days=i * 3)
+            data = {"start_date": start, "end_date": start + timedelta(days=2), "house": house.house_number}
+            request = factory.post("/api/bookings/reservations/create/", data, format="json")
+            force_authenticate(request, user=user)
+
+            started = time.perf_counter()
+            response = view(request)
+            timings.append(time.perf_counter() - started)
+            assert response.status_code == 201, response.data
+        return timings
+
+    def _delete_rendered_files(self):
+        """files are not part of the rolled back transaction"""
+        for confirmation in ReservationConfrimation.objects.exclude(saved_file="").exclude(saved_file=None):
+            confirmation.saved_file.delete(save=False)
@@ -0,0 +1,88 @@
+import contextlib
+import itertools
+import time
+from datetime import date
+from unittest import mock
+
+from accounts.models import MyCustomUser
+from core_project import metrics
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client
+from django.urls import reverse
+from rest_framework.views import APIView
+
+from bookings.models import Reservation
+from bookings.response_cache import CachedResponseMixin
+from bookings.utils.loadtest import percentile
+from bookings.utils.seed import seed_reservations
+
+
+def uncached(self, request, build, *args, **kwargs):
+    return build(request, *args, **kwargs)
+
+
+class Command(BaseCommand):
+    help = (
+        "Reads the reservation and house lists [pages 1-5] with a reservation saved every --write-every requests, "
+        "without and with the versioned response cache; seeded data is rolled back afterwards"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reservations", type=int, default=20_000)
+        parser.add_argument("--houses", type=int, default=200)
+        parser.add_argument("--requests", type=int, default=1000, help="per endpoint and mode")
+        parser.add_argument("--write-every", type=int, default=50)
+
+    def handle(self, *args, **options):
+        # thousands of requests from one user/ip -> throttles would answer most of them
+        with transaction.atomic(), mock.patch.object(APIView, "get_throttles", lambda self: []):
+            admin = MyCustomUser.objects.create_superuser(
+                email="benchmark_admin@example.com", name="bench", surname="admin", password=None
+            )
+            customer = MyCustomUser.objects.create_user(
+                email="benchmark_customer@example.com", name="bench", surname="customer", password=None
+            )
+            seed_reservations(
+                options["reservations"],
+                [(customer.customerprofile.id, customer.id)],
+                houses=options["houses"],
+                start=date.today(),
+            )
+            reservation = Reservation.objects.filter(reservation_owner=customer).first()
+
+            admin_client = Client(HTTP_HOST=settings.ALLOWED_HOSTS[0])
+            admin_client.force_login(admin)
+            anonymous_client = Client(HTTP_HOST=settings.ALLOWED_HOSTS[0])
+            endpoints = [
+                ("bookings:reservations", admin_client, "offset", lambda page: (page - 1) * 10),
+                ("bookings:challet_houses", anonymous_client, "page", lambda page: page),
+            ]
+
+            self.stdout.write(f"{'endpoint':>24} {'mode':>15} {'hit ratio':>10} {'p50':>9} {'p99':>9}")
+            for name, client, param, value in endpoints:
+                url = reverse(name)
+                for mode in ("no cache", "response cache"):
+                    before = metrics.cache_outcomes(name)
+                    timings = []
+                    patch = mock.patch.object(CachedResponseMixin, "cached_response", uncached)
+                    with patch if mode == "no cache" else contextlib.nullcontext():
+                        for i, page in zip(range(options["requests"]), itertools.cycle(range(1, 6))):
+                            if i and i % options["write_every"] == 0:
+                                reservation.total_price += 1
+                                reservation.save()
+                            started = time.perf_counter()
+                            response = client.get(url, {param: value(page)})
+                            timings.append(time.perf_counter() - started)
+                            assert response.status_code == 200, response.status_code
+
+                    after = metrics.cache_outcomes(name)
+                    hits, misses = after["hit"] - before["hit"], after["miss"] - before["miss"]
+                    ratio = hits / (hits + misses) if hits + misses else 0
+                    self.stdout.write(
+                        f"{name:>24} {mode:>15} {ratio:>10.2f} {percentile(timings, 50) * 1000:>7.2f}ms "
+                        f"{percentile(timings, 99) * 1000:>7.2f}ms"
+                    )
+
+            transaction.set_rollback(True)
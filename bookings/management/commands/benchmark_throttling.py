@@ -0,0 +1,101 @@
+import pickle
+import random
+import time
+from types import SimpleNamespace
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from redis import Redis
+from rest_framework import throttling
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from rest_framework.views import APIView
+
+from bookings import auxiliary
+from bookings.utils.loadtest import percentile
+
+RATE = "1000000/day"  # nothing is refused -> every request pays the full price
+
+
+def stack(*bases):
+    """throttles of the default settings + CustomUseRateThrottle [opinions], same scopes as the real ones"""
+    return [type(f"Benchmark{i}", (base,), {"rate": RATE}) for i, base in enumerate(bases)]
+
+
+BEFORE = stack(
+    type("Sustained", (throttling.UserRateThrottle,), {"scope": "sustained"}),
+    type("Burst", (throttling.UserRateThrottle,), {"scope": "burst"}),
+    throttling.AnonRateThrottle,
+    throttling.UserRateThrottle,
+)
+AFTER = stack(
+    auxiliary.SustainedRateThrottle,
+    auxiliary.BurstRateThrottle,
+    auxiliary.AnonRateThrottle,
+    auxiliary.CustomUseRateThrottle,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Per request overhead of the throttles of a view [4 scopes]: SimpleRateThrottle with a pickled history per "
+        "scope in the cache [before] vs one sliding window script for all scopes [after], by history size"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=1000)
+        parser.add_argument("--history", type=int, nargs="+", default=[0, 100, 1000, 10_000])
+
+    def handle(self, *args, **options):
+        factory = APIRequestFactory()
+        commands = []
+        execute_command = Redis.execute_command
+
+        def counting(client, *args, **kwargs):
+            commands.append(args)
+            return execute_command(client, *args, **kwargs)
+
+        self.stdout.write(
+            f"{'mode':>18} {'history':>8} {'round trips':>12} {'sent':>10} {'p50':>9} {'p99':>9} {'mean':>9}"
+        )
+        for history in options["history"]:
+            for mode, classes in (("SimpleRateThrottle", BEFORE), ("sliding window", AFTER)):
+                user = SimpleNamespace(
+                    pk=random.getrandbits(48),
+                    is_authenticated=True,
+                    is_anonymous=False,
+                    is_admin=False,
+                    customerprofile=SimpleNamespace(status="N"),
+                )
+                view = APIView()
+                view.throttle_classes = classes
+
+                def new_request():
+                    request = Request(factory.get("/"))
+                    request.user = user
+                    return request
+
+                def check():
+                    view.check_throttles(new_request())
+
+                for _ in range(history):
+                    check()
+
+                timings = []
+                commands.clear()
+                with mock.patch.object(Redis, "execute_command", counting):
+                    for _ in range(options["requests"]):
+                        started = time.perf_counter()
+                        check()
+                        timings.append(time.perf_counter() - started)
+
+                # bytes sent: pickled history lists [set] vs script arguments
+                payload = sum(len(pickle.dumps(args)) for args in commands) / options["requests"]
+                self.stdout.write(
+                    f"{mode:>18} {history:>8} {len(commands) / options['requests']:>12.1f} {payload:>9.0f}B "
+                    f"{percentile(timings, 50) * 1e6:>7.0f}us {percentile(timings, 99) * 1e6:>7.0f}us "
+                    f"{sum(timings) / len(timings) * 1e6:>7.0f}us"
+                )
+                keys = [throttle().get_cache_key(new_request(), view) for throttle in classes]
+                cache.delete_many([key for key in keys if key is not None])
@@ -0,0 +1,69 @@
+import time
+
+from accounts.models import MyCustomUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from bookings import statistics
+from bookings.models import CustomerProfile, Reservation, ReservationSummary
+from bookings.utils import my_date
+from bookings.utils.seed import seed_customers, seed_reservations
+
+
+class Command(BaseCommand):
+    help = (
+        "Seeds customers with reservations [rolled back afterwards] and measures latency and queries of the "
+        "users_generated_revenue statistics at increasing number of customers"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--customers", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+        parser.add_argument("--reservations-per-customer", type=int, default=2)
+        parser.add_argument("--houses", type=int, default=1000)
+        parser.add_argument("--repeat", type=int, default=3, help="best of n runs is reported")
+        parser.add_argument("--max-queries", type=int, default=1)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            owner = MyCustomUser.objects.create_user(
+                email="benchmark@example.com", name="bench", surname="mark", password=None
+            )
+
+            self.stdout.write(f"{'customers':>10} {'reservations':>13} {'latency':>10} {'queries':>8} {'rows':>8}")
+            seeded = 0
+            for step, customers in enumerate(sorted(options["customers"])):
+                # customers grow cumulatively -> only the difference is seeded
+                profiles = seed_customers(customers - seeded, owner.id)
+                seed_reservations(
+                    len(profiles) * options["reservations_per_customer"],
+                    profiles,
+                    houses=options["houses"],
+                    first_house_number=1000 + step * options["houses"],
+                    completed_before=my_date.today(),
+                    seed=step,
+                )
+                seeded = customers
+                statistics.rebuild(["bookings.Reservation"])  # bulk_create sends no signals
+                with connection.cursor() as cursor:
+                    for model in (Reservation, CustomerProfile, ReservationSummary):
+                        cursor.execute(f"ANALYZE {model._meta.db_table}")
+
+                self._measure(customers, options)
+
+            transaction.set_rollback(True)
+
+    def _measure(self, customers, options):
+        timings = []
+        for _ in range(options["repeat"]):
+            started = time.perf_counter()
+            with CaptureQueriesContext(connection) as queries:
+                data = statistics.compute("users", "users_generated_revenue")
+            timings.append(time.perf_counter() - started)
+
+        self.stdout.write(
+            f"{customers:>10} {Reservation.objects.count():>13} {min(timings) * 1000:>8.0f}ms {len(queries):>8} "
+            f"{len(data['users_generated_revenue']):>8}"
+        )
+        if len(queries) > options["max_queries"]:
+            raise CommandError(f"{len(queries)} queries for {customers} customers, expected {options['max_queries']}")
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from bookings import statistics
+
+
+class Command(BaseCommand):
+    help = "Recomputes the statistics summaries from scratch and compares them with the stored summary rows"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--fix", action="store_true", help="rebuild the summaries when they differ")
+
+    def handle(self, *args, **options):
+        differences = 0
+
+        for model, rows in statistics.source_rows().items():
+            fields = [field.attname for field in model._meta.concrete_fields if not field.primary_key]
+            # rows taken back to zero stay in the summary, they are never recomputed
+            stored = {key(model, row): row for row in model.objects.values(*fields) if counts(model, row)}
+            expected = {key(model, row): row for row in rows if counts(model, row)}
+
+            for row_key in sorted(stored.keys() | expected.keys(), key=str):
+                if stored.get(row_key) == expected.get(row_key):
+                    continue
+                differences += 1
+                self.stdout.write(self.style.WARNING(f"{model.__name__} {row_key} differs"))
+                self.stdout.write(f"  stored:     {stored.get(row_key)}")
+                self.stdout.write(f"  recomputed: {expected.get(row_key)}")
+
+        if differences and options["fix"]:
+            statistics.rebuild()
+        if differences and not options["fix"]:
+            raise CommandError(f"{differences} summary rows differ from the recomputed ones, run with --fix")
+        self.stdout.write(self.style.SUCCESS(f"done, {differences} differences{' fixed' if differences else ''}"))
+
+
+def key(model, row):
+    return tuple(row[field] for field in model.KEY)
+
+
+def counts(model, row):
+    return any(value for field, value in row.items() if field not in model.KEY)
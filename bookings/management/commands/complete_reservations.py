@@ -0,0 +1,33 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from bookings import auxiliary
+from bookings.models import CustomerProfile
+
+
+class Command(BaseCommand):
+    help = "Completes reservations which ended by the given date and updates visits/statuses of their customers"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--date", type=date.fromisoformat, default=None, help="end date [default: today]")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--dry-run", action="store_true", help="run everything and roll it back")
+
+    def handle(self, *args, **options):
+        end_date = options["date"] or date.today()
+
+        report = auxiliary.complete_past_reservations(
+            end_date,
+            CustomerProfile.hierarchy,
+            batch_size=options["batch_size"],
+            dry_run=options["dry_run"],
+            progress=lambda batch, completed: self.stdout.write(f"batch {batch}: {completed} reservations completed"),
+        )
+
+        self.stdout.write(
+            f"{'[dry run] ' if report['dry_run'] else ''}completed reservations: {report['completed']}, "
+            f"profiles with new visits: {report['profiles_updated']}, promoted profiles: {report['promoted']}"
+        )
+        for stage, seconds in report["seconds"].items():
+            self.stdout.write(f"{stage:>10}: {seconds * 1000:.1f}ms")
@@ -0,0 +1,80 @@
+import time
+from datetime import date, timedelta
+
+from accounts.models import MyCustomUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+
+from bookings import response_cache, statistics
+from bookings.models import ChalletHouse, CustomerProfile, HouseOccupancy, Opinion, Reservation, Suggestion
+from bookings.utils.seed import seed_communications, seed_reservations, seed_users
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk inserts synthetic users with profiles, houses, reservations, opinions and suggestions [kept, not rolled "
+        "back] -> data for run_benchmarks. Every house gets back to back stays starting --years ago, stays ending "
+        "before today are completed"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10_000)
+        parser.add_argument("--houses", type=int, default=50)
+        parser.add_argument("--reservations", type=int, default=5000, help="~100 per house cover ~2.5 years")
+        parser.add_argument("--years", type=int, default=3)
+        parser.add_argument("--opinions", type=int, default=2000)
+        parser.add_argument("--suggestions", type=int, default=500)
+        parser.add_argument("--prefix", default="generated", help="emails: <prefix><n>@example.com, must be new")
+        parser.add_argument("--batch-size", type=int, default=10_000)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        if options["users"] < 1 or options["houses"] < 1:
+            raise CommandError("at least one user and one house are needed")
+        if MyCustomUser.objects.filter(email__startswith=options["prefix"], email__endswith="@example.com").exists():
+            raise CommandError(f"users with the prefix {options['prefix']!r} already exist, pick another --prefix")
+
+        since = date.today() - timedelta(days=365 * options["years"])
+        batch_size, seed = options["batch_size"], options["seed"]
+        started = time.perf_counter()
+
+        with transaction.atomic():
+            # author of anonymous opinions/suggestions [auxiliary.get_sentinel_user]
+            if not MyCustomUser.objects.filter(email="sentinel_user@gmail.com").exists():
+                MyCustomUser.objects.create_user(
+                    email="sentinel_user@gmail.com", name="Anonimowy", surname="Uzytkownik", password=None
+                )
+            profiles = seed_users(options["users"], options["prefix"], since, batch_size, seed)
+            self._report("users + profiles", len(profiles), started)
+
+            first_house_number = (ChalletHouse.objects.aggregate(last=Max("house_number"))["last"] or 0) + 1
+            created = seed_reservations(
+                options["reservations"],
+                profiles,
+                houses=options["houses"],
+                first_house_number=first_house_number,
+                batch_size=batch_size,
+                start=since,
+                completed_before=date.today(),
+                seed=seed,
+            )
+            self._report("houses", options["houses"], started)
+            self._report("reservations", created, started)
+
+            author_ids = [user_id for _, user_id in profiles]
+            seed_communications(Opinion, options["opinions"], author_ids, since, batch_size, seed)
+            self._report("opinions", options["opinions"], started)
+            seed_communications(Suggestion, options["suggestions"], author_ids, since, batch_size, seed)
+            self._report("suggestions", options["suggestions"], started)
+
+            # bulk_create sends no signals -> occupancy, statistics and cached responses are brought up to date here
+            for house_number in range(first_house_number, first_house_number + options["houses"]):
+                HouseOccupancy.rebuild(house_number)
+            self._report("occupancy bitmaps", options["houses"], started)
+            self._report("statistics summaries", statistics.rebuild(), started)
+            for model in (MyCustomUser, CustomerProfile, ChalletHouse, Reservation, Opinion, Suggestion):
+                response_cache.mark_stale(model)
+
+    def _report(self, what, count, started):
+        self.stdout.write(f"{what:>18}: {count:>9} [{time.perf_counter() - started:.1f}s]")
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from bookings.models import ChalletHouse, HouseOccupancy
+
+
+class Command(BaseCommand):
+    help = "Recomputes occupancy bitmaps of all houses from their reservations"
+
+    def handle(self, *args, **options):
+        for house_number in ChalletHouse.objects.values_list("house_number", flat=True):
+            HouseOccupancy.rebuild(house_number)
+            self.stdout.write(f"House {house_number}: occupancy rebuilt")
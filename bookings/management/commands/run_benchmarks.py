@@ -0,0 +1,271 @@
+import json
+import subprocess
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from unittest import mock
+
+from accounts.models import MyCustomUser
+from core_project import instrumentation
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Max
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from rest_framework.views import APIView
+
+from bookings.models import ChalletHouse, CustomerProfile, Opinion, Reservation, Suggestion
+from bookings.utils.loadtest import percentile
+
+PASSWORD = "benchmark-password-1"
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def change(before, after):
+    return (after - before) / before if before else 0.0
+
+
+def compare(baseline, current, threshold):
+    """
+    [(endpoint, row)] of the endpoints in both runs -> row: p50/p95/p99 before and after, queries, regressed
+    regressed: p95 slower by more than `threshold` [and 1ms, below that it is noise] or more queries
+    """
+    rows = []
+    for endpoint, after in current["endpoints"].items():
+        before = baseline["endpoints"].get(endpoint)
+        if before is None:
+            continue
+        slower = change(before["p95_ms"], after["p95_ms"]) > threshold and after["p95_ms"] - before["p95_ms"] > 1
+        rows.append(
+            (
+                endpoint,
+                {
+                    **{f"{p}_before": before[f"{p}_ms"] for p in ("p50", "p95", "p99")},
+                    **{f"{p}_after": after[f"{p}_ms"] for p in ("p50", "p95", "p99")},
+                    "queries_before": before["queries"],
+                    "queries_after": after["queries"],
+                    "regressed": slower or after["queries"] > before["queries"],
+                },
+            )
+        )
+    return rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Drives every endpoint of core_project/urls.py with the test client against the data in the database "
+        "[generate_data], records p50/p95/p99 latency, throughput and queries per request into a JSON baseline and "
+        "compares it with an earlier one [--compare]. Writes are rolled back, throttles are off"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200, help="per endpoint")
+        parser.add_argument("--warmup", type=int, default=5, help="per endpoint, not recorded")
+        parser.add_argument("--only", nargs="+", default=[], help="endpoints whose name contains one of these")
+        parser.add_argument("--output", default="benchmarks/latest.json")
+        parser.add_argument("--compare", metavar="BASELINE", help="JSON of an earlier run")
+        parser.add_argument("--current", help="compare this JSON with --compare instead of running the benchmarks")
+        parser.add_argument("--threshold", type=float, default=0.2, help="p95 slowdown reported as a regression")
+        parser.add_argument("--fail-on-regression", action="store_true")
+
+    def handle(self, *args, **options):
+        if options["current"]:
+            if not options["compare"]:
+                raise CommandError("--current needs --compare")
+            current = json.loads(Path(options["current"]).read_text())
+        else:
+            current = self.run(options)
+            output = Path(options["output"])
+            output.parent.mkdir(parents=True, exist_ok=True)
+            output.write_text(json.dumps(current, indent=2))
+            self.stdout.write(f"written to {output}")
+
+        if options["compare"]:
+            baseline = json.loads(Path(options["compare"]).read_text())
+            regressions = self.report_comparison(baseline, current, options["threshold"])
+            if regressions and options["fail_on_regression"]:
+                raise CommandError(f"{len(regressions)} endpoint(s) regressed: {', '.join(regressions)}")
+
+    def run(self, options):
+        if not Reservation.objects.exists():
+            raise CommandError("no reservations to read, run generate_data first")
+
+        data = {
+            "users": MyCustomUser.objects.count(),
+            "houses": ChalletHouse.objects.count(),
+            "reservations": Reservation.objects.count(),
+            "opinions": Opinion.objects.count(),
+            "suggestions": Suggestion.objects.count(),
+        }
+        results = {}
+        # budgets are reported by the query counts, not enforced; thousands of requests -> no throttling
+        with transaction.atomic(), override_settings(QUERY_BUDGETS_RAISE=False), mock.patch.object(
+            APIView, "get_throttles", lambda self: []
+        ):
+            self.stdout.write(
+                f"{'endpoint':>45} {'status':>7} {'p50':>9} {'p95':>9} {'p99':>9} {'req/s':>7} {'queries':>8}"
+            )
+            for name, send in self.scenarios():
+                if options["only"] and not any(part in name for part in options["only"]):
+                    continue
+                results[name] = self.measure(send, options["requests"], options["warmup"])
+                result = results[name]
+                self.stdout.write(
+                    f"{name:>45} {result['status']:>7} {result['p50_ms']:>7.2f}ms {result['p95_ms']:>7.2f}ms "
+                    f"{result['p99_ms']:>7.2f}ms {result['rps']:>7.0f} {result['queries']:>8.1f}"
+                )
+            transaction.set_rollback(True)
+
+        return {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "requests": options["requests"],
+            "data": data,
+            "endpoints": results,
+        }
+
+    def measure(self, send, requests, warmup):
+        def complete():
+            response = send()
+            if response.streaming:  # export -> rows are read while the body is sent
+                b"".join(response.streaming_content)
+            return response
+
+        for _ in range(warmup):
+            complete()
+
+        timings, queries, statuses = [], 0, set()
+        started = time.perf_counter()
+        for _ in range(requests):
+            recorder = instrumentation.QueryRecorder()
+            request_started = time.perf_counter()
+            with connection.execute_wrapper(recorder):
+                response = complete()
+            timings.append(time.perf_counter() - request_started)
+            queries += recorder.count
+            statuses.add(response.status_code)
+        elapsed = time.perf_counter() - started
+
+        return {
+            "status": ",".join(map(str, sorted(statuses))),
+            "p50_ms": round(percentile(timings, 50) * 1000, 3),
+            "p95_ms": round(percentile(timings, 95) * 1000, 3),
+            "p99_ms": round(percentile(timings, 99) * 1000, 3),
+            "mean_ms": round(sum(timings) / len(timings) * 1000, 3),
+            "rps": round(requests / elapsed, 1),
+            "queries": round(queries / requests, 2),
+        }
+
+    def scenarios(self):
+        """[(name, send)] -> send() makes one request; reads first, writes at the end"""
+        host = settings.ALLOWED_HOSTS[0]
+        admin = MyCustomUser.objects.create_superuser(
+            email="run_benchmarks_admin@example.com", name="bench", surname="admin", password=PASSWORD
+        )
+        # the customer with the most recent reservation -> current and past reservations to read
+        reservation = Reservation.objects.exclude(start_date=None).order_by("-start_date").first()
+        customer = reservation.reservation_owner
+        profile = CustomerProfile.objects.filter(user=customer).first() or reservation.customer_profile
+        opinion, suggestion = Opinion.objects.first(), Suggestion.objects.first()
+
+        anonymous = APIClient(HTTP_HOST=host)
+        customer_client = APIClient(HTTP_HOST=host)
+        customer_client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.get_or_create(user=customer)[0].key}")
+        admin_client = APIClient(HTTP_HOST=host)
+        admin_client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.get_or_create(user=admin)[0].key}")
+        admin_session = Client(HTTP_HOST=host)  # django admin -> session authentication
+        admin_session.force_login(admin)
+
+        def get(client, name, *args, label="", **params):
+            return f"GET {name}{label}", lambda: client.get(reverse(name, args=args), params)
+
+        def post(client, name, data, *args):
+            return f"POST {name}", lambda: client.post(reverse(name, args=args), data() if callable(data) else data)
+
+        today = date.today()
+        scenarios = [
+            get(anonymous, "api_root"),
+            get(anonymous, "schema"),
+            get(anonymous, "swagger-ui"),
+            get(admin_session, "admin:index"),
+            get(customer_client, "rest_user_details"),
+            get(anonymous, "bookings:challet_houses"),
+            get(anonymous, "bookings:challet_house", reservation.house_id),
+            get(
+                anonymous,
+                "bookings:house_availability",
+                reservation.house_id,
+                **{"from": today.isoformat(), "to": (today + timedelta(days=90)).isoformat()},
+            ),
+            get(anonymous, "bookings:opinions"),
+            get(customer_client, "bookings:reservations"),
+            get(customer_client, "bookings:past_reservations"),
+            get(customer_client, "bookings:reservation_detail", reservation.id),
+            get(admin_client, "bookings:reservations", label=" [admin]"),
+            get(admin_client, "bookings:reservations_export"),
+            get(admin_client, "bookings:customers"),
+            get(admin_client, "bookings:single_customer", profile.id),
+            get(admin_client, "bookings:suggestions"),
+            get(admin_client, "bookings:run_updates"),
+            get(admin_client, "bookings:stats"),
+            get(customer_client, "accounts:user_detail", customer.slug),
+            get(admin_client, "accounts:users_list"),
+            get(admin_client, "accounts:admin_list"),
+        ]
+        if opinion is not None:
+            scenarios.append(get(admin_client, "bookings:opinion_detail", opinion.id))
+        if suggestion is not None:
+            scenarios.append(get(admin_client, "bookings:suggestion_detail", suggestion.id))
+
+        # writes: stays of 2 nights one after another in a house of its own, far from the generated ones
+        house = ChalletHouse.objects.create(
+            house_number=(ChalletHouse.objects.aggregate(last=Max("house_number"))["last"] or 0) + 1, price_night=300
+        )
+        stays = (today + timedelta(days=3650 + 3 * i) for i in range(1_000_000))
+
+        def new_stay():
+            start = next(stays)
+            return {"house": house.house_number, "start_date": start, "end_date": start + timedelta(days=2)}
+
+        text = {"title": "benchmark", "main_text": "written by run_benchmarks"}
+        scenarios += [
+            post(customer_client, "bookings:reservation_create", new_stay),
+            post(anonymous, "bookings:suggestions", text),
+            post(customer_client, "bookings:opinions", {**text, "rating": 5}),
+            post(anonymous, "accounts:api_token_auth", {"email": admin.email, "password": PASSWORD}),
+        ]
+        return scenarios
+
+    def report_comparison(self, baseline, current, threshold):
+        self.stdout.write(
+            f"\nbaseline {baseline.get('commit')} [{baseline.get('created')}] -> "
+            f"{current.get('commit')} [{current.get('created')}]"
+        )
+        self.stdout.write(f"{'endpoint':>45} {'p50':>18} {'p95':>18} {'p99':>18} {'queries':>12}")
+        regressions = []
+        for endpoint, row in compare(baseline, current, threshold):
+            cells = [
+                f"{row[f'{p}_before']:.1f}->{row[f'{p}_after']:.1f} {change(row[f'{p}_before'], row[f'{p}_after']):+.0%}"
+                for p in ("p50", "p95", "p99")
+            ]
+            line = (
+                f"{endpoint:>45} {cells[0]:>18} {cells[1]:>18} {cells[2]:>18} "
+                f"{row['queries_before']:>5.1f}->{row['queries_after']:<5.1f}"
+            )
+            if row["regressed"]:
+                regressions.append(endpoint)
+                line = self.style.WARNING(line + " regressed")
+            self.stdout.write(line)
+        return regressions
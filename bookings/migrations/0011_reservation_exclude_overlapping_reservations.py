@@ -0,0 +1,79 @@
+# Generated by Django 4.1 on 2026-10-16 22:38
+
+from bisect import bisect_left, insort
+
+import django.contrib.postgres.constraints
+from django.contrib.postgres.fields import DateRangeField, IntegerRangeField
+from django.db import migrations, models
+
+
+def check_overlapping_reservations(apps, schema_editor):
+    """
+    the old validator let parallel requests book the same nights -> such rows would make AddConstraint fail;
+    nothing is cancelled here, the migration stops with the conflicting reservations to be resolved by hand
+    """
+    Reservation = apps.get_model("bookings", "Reservation")
+    active = Reservation.objects.exclude(status=9).filter(start_date__isnull=False, end_date__isnull=False)
+
+    kept = {}  # house -> sorted, non overlapping (start, end, id) of the bookings checked so far
+    conflicts = []
+    rows = active.order_by("id").values_list("id", "house_id", "start_date", "end_date")
+    for reservation_id, house_id, start, end in rows.iterator():
+        stays = kept.setdefault(house_id, [])
+        position = bisect_left(stays, (start, end, reservation_id))
+        overlapping = [
+            stay[2] for stay in stays[max(position - 1, 0) : position + 1] if stay[0] < end and stay[1] > start
+        ]
+        if overlapping:
+            conflicts.append(f"id {reservation_id} [house {house_id}, {start} - {end}] overlaps id {overlapping[0]}")
+        else:
+            insort(stays, (start, end, reservation_id))
+
+    if conflicts:
+        raise RuntimeError(
+            f"{len(conflicts)} reservation(s) overlap an earlier booking of the same house, cancel or move them "
+            "before migrating:\n" + "\n".join(conflicts)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bookings", "0010_alter_challethouse_options"),
+    ]
+
+    operations = [
+        migrations.RunPython(check_overlapping_reservations, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="reservation",
+            constraint=django.contrib.postgres.constraints.ExclusionConstraint(
+                condition=models.Q(
+                    ("end_date__isnull", False),
+                    ("start_date__isnull", False),
+                    models.Q(("status", 9), _negated=True),
+                ),
+                expressions=[
+                    (
+                        models.Func(
+                            models.F("house"),
+                            models.F("house"),
+                            models.Value("[]"),
+                            function="int4range",
+                            output_field=IntegerRangeField(),
+                        ),
+                        "&&",
+                    ),
+                    (
+                        models.Func(
+                            models.F("start_date"),
+                            models.F("end_date"),
+                            function="daterange",
+                            output_field=DateRangeField(),
+                        ),
+                        "&&",
+                    ),
+                ],
+                name="exclude_overlapping_reservations",
+            ),
+        ),
+    ]
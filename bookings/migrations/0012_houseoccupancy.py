@@ -0,0 +1,71 @@
+# Generated by Django 4.1 on 2026-10-16 22:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from bookings.utils.bitmap import OccupancyBitmap
+
+
+def populate_occupancy(apps, schema_editor):
+    """bitmaps for all existing reservations; cancelled ones have no dates"""
+    Reservation = apps.get_model("bookings", "Reservation")
+    HouseOccupancy = apps.get_model("bookings", "HouseOccupancy")
+
+    bitmaps = {}
+    reservations = Reservation.objects.exclude(status=9).filter(start_date__isnull=False, end_date__isnull=False)
+    for house_id, start, end in reservations.values_list("house_id", "start_date", "end_date").iterator():
+        for year in OccupancyBitmap.years(start, end):
+            bitmaps.setdefault((house_id, year), OccupancyBitmap(year)).mark(start, end)
+
+    HouseOccupancy.objects.bulk_create(
+        HouseOccupancy(house_id=house_id, year=year, bitmap=bitmap.to_bytes())
+        for (house_id, year), bitmap in bitmaps.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bookings", "0011_reservation_exclude_overlapping_reservations"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="HouseOccupancy",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("year", models.PositiveSmallIntegerField()),
+                (
+                    "bitmap",
+                    models.BinaryField(
+                        default=b"\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00",
+                        max_length=46,
+                    ),
+                ),
+                (
+                    "house",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="occupancy",
+                        to="bookings.challethouse",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["house", "year"],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="houseoccupancy",
+            constraint=models.UniqueConstraint(fields=("house", "year"), name="unique_house_occupancy_year"),
+        ),
+        migrations.RunPython(populate_occupancy, migrations.RunPython.noop),
+    ]
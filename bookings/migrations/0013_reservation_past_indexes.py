@@ -0,0 +1,30 @@
+# Generated by Django 4.1 on 2026-10-16 22:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bookings", "0012_houseoccupancy"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="reservation",
+            index=models.Index(
+                models.OrderBy(models.F("end_date"), descending=True, nulls_last=True),
+                models.OrderBy(models.F("id"), descending=True),
+                name="reservation_end_date_id_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="reservation",
+            index=models.Index(
+                models.F("reservation_owner"),
+                models.OrderBy(models.F("end_date"), descending=True, nulls_last=True),
+                models.OrderBy(models.F("id"), descending=True),
+                name="reservation_owner_end_date_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.1 on 2026-10-16 23:03
+
+from django.db import migrations, models
+import rest_framework.utils.encoders
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bookings", "0013_reservation_past_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StatisticsEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("scope", models.CharField(max_length=20)),
+                ("key", models.CharField(max_length=50)),
+                (
+                    "value",
+                    models.JSONField(encoder=rest_framework.utils.encoders.JSONEncoder),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name_plural": "statistics entries",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="statisticsentry",
+            constraint=models.UniqueConstraint(fields=("scope", "key"), name="unique_statistics_entry"),
+        ),
+    ]
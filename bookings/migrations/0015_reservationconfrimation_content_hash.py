@@ -0,0 +1,18 @@
+# Generated by Django 4.1 on 2026-10-16 23:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bookings", "0014_statisticsentry"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="reservationconfrimation",
+            name="content_hash",
+            field=models.CharField(blank=True, default="", max_length=64),
+        ),
+    ]
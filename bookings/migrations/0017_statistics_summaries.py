@@ -0,0 +1,207 @@
+# Generated by Django 4.1 on 2026-10-17 01:24
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, Max, Q, Sum
+from django.db.models.functions import Coalesce, ExtractDay, ExtractMonth, Length
+import django.db.models.deletion
+
+
+STATUSES = {0: "not_confirmed", 1: "confirmed", 9: "cancelled", 99: "completed"}
+
+
+def populate_summaries(apps, schema_editor):
+    """summaries of the rows already stored -> the same rows statistics.rebuild() writes"""
+    Reservation = apps.get_model("bookings", "Reservation")
+    Opinion = apps.get_model("bookings", "Opinion")
+    CustomerProfile = apps.get_model("bookings", "CustomerProfile")
+    ReservationConfrimation = apps.get_model("bookings", "ReservationConfrimation")
+    MyCustomUser = apps.get_model("accounts", "MyCustomUser")
+
+    length = Coalesce(ExtractDay(F("end_date") - F("start_date")), 0)
+    reservations = (
+        Reservation.objects.annotate(month=Coalesce(ExtractMonth("start_date"), 0), length=length)
+        .values("month", "house_id", "customer_profile_id")
+        .annotate(
+            reservations=Count("id"),
+            **{field: Count("id", filter=Q(status=status)) for status, field in STATUSES.items()},
+            revenue=Coalesce(Sum("total_price"), 0),
+            nights=Sum("length"),
+            longest=Max("length"),
+        )
+        .order_by()
+    )
+    ReservationSummary = apps.get_model("bookings", "ReservationSummary")
+    ReservationSummary.objects.bulk_create(ReservationSummary(**row) for row in reservations)
+
+    opinions = (
+        Opinion.objects.annotate(month=ExtractMonth("provided_on"), body=Length("main_text"))
+        .values("month", "author_id")
+        .annotate(
+            opinions=Count("id"),
+            with_image=Count("id", filter=~Q(image="")),
+            rated=Count("rating"),
+            rating_total=Coalesce(Sum("rating"), 0),
+            longest_body=Coalesce(Max("body"), 0),
+        )
+        .order_by()
+    )
+    OpinionSummary = apps.get_model("bookings", "OpinionSummary")
+    OpinionSummary.objects.bulk_create(OpinionSummary(**row) for row in opinions)
+
+    customers = (
+        CustomerProfile.objects.annotate(month=ExtractMonth("joined"))
+        .values("month", "status")
+        .annotate(customers=Count("id"))
+        .order_by()
+    )
+    CustomerSummary = apps.get_model("bookings", "CustomerSummary")
+    CustomerSummary.objects.bulk_create(CustomerSummary(**row) for row in customers)
+
+    counters = MyCustomUser.objects.aggregate(
+        admin_users=Count("id", filter=Q(is_admin=True)), normal_users=Count("id", filter=Q(is_admin=False))
+    )
+    counters["order_confirmations"] = ReservationConfrimation.objects.count()
+    StatisticsCounter = apps.get_model("bookings", "StatisticsCounter")
+    StatisticsCounter.objects.bulk_create(StatisticsCounter(name=name, value=value) for name, value in counters.items())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("bookings", "0016_outgoingemail"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CustomerSummary",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("month", models.PositiveSmallIntegerField()),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("N", "New Customer"),
+                            ("R", "Regular Customer"),
+                            ("S", "Super Customer"),
+                        ],
+                        max_length=1,
+                    ),
+                ),
+                ("customers", models.IntegerField(default=0)),
+            ],
+            options={
+                "verbose_name_plural": "customer summaries",
+            },
+        ),
+        migrations.CreateModel(
+            name="OpinionSummary",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("month", models.PositiveSmallIntegerField()),
+                ("opinions", models.IntegerField(default=0)),
+                ("with_image", models.IntegerField(default=0)),
+                ("rated", models.IntegerField(default=0)),
+                ("rating_total", models.IntegerField(default=0)),
+                ("longest_body", models.IntegerField(default=0)),
+                (
+                    "author",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="ReservationSummary",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("month", models.PositiveSmallIntegerField()),
+                ("reservations", models.IntegerField(default=0)),
+                ("not_confirmed", models.IntegerField(default=0)),
+                ("confirmed", models.IntegerField(default=0)),
+                ("cancelled", models.IntegerField(default=0)),
+                ("completed", models.IntegerField(default=0)),
+                ("revenue", models.BigIntegerField(default=0)),
+                ("nights", models.IntegerField(default=0)),
+                ("longest", models.IntegerField(default=0)),
+                (
+                    "customer_profile",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="bookings.customerprofile",
+                    ),
+                ),
+                (
+                    "house",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="reservation_summaries",
+                        to="bookings.challethouse",
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="StatisticsCounter",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=50, unique=True)),
+                ("value", models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.DeleteModel(
+            name="StatisticsEntry",
+        ),
+        migrations.AddConstraint(
+            model_name="customersummary",
+            constraint=models.UniqueConstraint(fields=("month", "status"), name="unique_customer_summary"),
+        ),
+        migrations.AddConstraint(
+            model_name="reservationsummary",
+            constraint=models.UniqueConstraint(
+                fields=("month", "house", "customer_profile"),
+                name="unique_reservation_summary",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="opinionsummary",
+            constraint=models.UniqueConstraint(fields=("month", "author"), name="unique_opinion_summary"),
+        ),
+        migrations.RunPython(populate_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.1 on 2026-10-17 01:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bookings", "0017_statistics_summaries"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="outgoingemail",
+            name="claimed_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name="outgoingemail",
+            name="status",
+            field=models.SmallIntegerField(
+                choices=[
+                    (0, "Waiting to be sent"),
+                    (2, "Claimed by a flush, being sent"),
+                    (1, "Sent"),
+                    (9, "Failed, no attempts left"),
+                ],
+                default=0,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="outgoingemail",
+            index=models.Index(
+                condition=models.Q(("status", 2)),
+                fields=["claimed_at"],
+                name="outgoing_email_sending_idx",
+            ),
+        ),
+    ]
@@ -1,18 +1,31 @@
+import hashlib
 import io
+import json
+import os
+from datetime import date
 
 from accounts.models import MyCustomUser
+from core_project import metrics
+from core_project.snapshots import LoadedValues
 from django.conf import settings
+from django.contrib.postgres.constraints import ExclusionConstraint
+from django.contrib.postgres.fields import ArrayField, DateRangeField, IntegerRangeField, RangeOperators
 from django.core.exceptions import ValidationError
 from django.core.files import File
+from django.core.mail import EmailMessage
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
+from django.db import connection, models, transaction
+from django.db.models import F, Func, Q, Value
+from django.utils import timezone
 from reportlab.lib.pagesizes import letter
 from reportlab.pdfgen import canvas
+from rest_framework.utils.encoders import JSONEncoder
 
-from . import auxiliary
+from . import auxiliary, response_cache
+from .utils.bitmap import BITMAP_SIZE, OccupancyBitmap
 
 
-class CustomerProfile(models.Model):
+class CustomerProfile(LoadedValues, models.Model):
     # hierarchy deployed in other modules when changing statuses
     hierarchy = {"N": 4, "R": 10, "S": 11}
     NEW_CUSTOMER = "N"
@@ -62,7 +75,7 @@ class Suggestion(CommunicationBaseModel):
     pass
 
 
-class Opinion(CommunicationBaseModel):
+class Opinion(LoadedValues, CommunicationBaseModel):
     # need to implement a mechanism asking for a surname/name or smth linked to reservation
     # to check validity of the person leaving the opinion
     # -> want to avoid necessity to have account/register
@@ -88,9 +101,48 @@ class ChalletHouse(models.Model):
         return f"Domek numer {self.house_number}"
 
 
-class Reservation(models.Model):
+def date_range(start, end):
+    """daterange(start_date, end_date) -> [start, end), departure day stays free for the next arrival"""
+    return Func(F(start), F(end), function="daterange", output_field=DateRangeField())
+
+
+def house_range(field_name):
+    """
+    int4range(house, house, '[]') -> overlaps only the very same house.
+    Used instead of house equality (WITH =) which would require the btree_gist extension.
+    A plain Func [no subclass] -> migrations write it out in full instead of importing it from here.
+    """
+    return Func(F(field_name), F(field_name), Value("[]"), function="int4range", output_field=IntegerRangeField())
+
+
+class Reservation(LoadedValues, models.Model):
+    # name of the exclusion constraint below -> IntegrityErrors are mapped to DatesNotAvailable by this name
+    OVERLAP_CONSTRAINT = "exclude_overlapping_reservations"
+
     class Meta:
         ordering = ["id"]
+        constraints = [
+            # the database rejects double bookings of a house, even for parallel requests
+            # cancelled reservations have no dates (status 9) and never block anybody
+            ExclusionConstraint(
+                name="exclude_overlapping_reservations",
+                expressions=[
+                    (house_range("house"), RangeOperators.OVERLAPS),
+                    (date_range("start_date", "end_date"), RangeOperators.OVERLAPS),
+                ],
+                condition=Q(start_date__isnull=False, end_date__isnull=False) & ~Q(status=9),
+            ),
+        ]
+        indexes = [
+            # keyset pagination of past reservations [MyCustomKeysetPaginator] -> same order as the paginator uses
+            models.Index(F("end_date").desc(nulls_last=True), F("id").desc(), name="reservation_end_date_id_idx"),
+            models.Index(
+                F("reservation_owner"),
+                F("end_date").desc(nulls_last=True),
+                F("id").desc(),
+                name="reservation_owner_end_date_idx",
+            ),
+        ]
 
     CONFIRMED = 1
     NOT_CONFIRMED = 0
@@ -119,13 +171,20 @@ class Reservation(models.Model):
     nights = models.PositiveSmallIntegerField(blank=True)
     total_price = models.SmallIntegerField(blank=True)
 
-    # signal to create date + reservation Id
+    # date + reservation Id, set on insert [save]
     reservation_number = models.CharField(max_length=20, blank=True, null=True, unique=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     objects = auxiliary.ChalletSpotQuerySet()
 
+    @property
+    def occupied_nights(self):
+        """(house, start, end) of the stay or None for cancelled reservations"""
+        if self.start_date is None or self.end_date is None or self.status == self.CANCELLED:
+            return None
+        return (self.house_id, self.start_date, self.end_date)
+
     def save(self, *args, **kwargs):
 
         status_change = kwargs.pop("status_change", None)
@@ -135,40 +194,102 @@ class Reservation(models.Model):
         if not status_change:
             self.nights = (self.end_date - self.start_date).days  # time delta days
         self.total_price = self.nights * self.house.price_night
+
+        if self._state.adding and self.pk is None:
+            # id taken from the sequence upfront -> reservation number [today + id] is written by the single INSERT
+            self.pk = self._next_id()
+            self.reservation_number = date.today().strftime("%Y%m%d") + str(self.pk)
+            kwargs["force_insert"] = True  # pk is set -> django would try an UPDATE first
         super().save(*args, **kwargs)
 
+    @classmethod
+    def _next_id(cls):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT nextval(pg_get_serial_sequence(%s, 'id'))", [cls._meta.db_table])
+            return cursor.fetchone()[0]
+
     def clean(self):
         # validation for admin panel
         if self.start_date >= self.end_date:
             raise ValidationError("End date must be later than start date")
 
 
-class ReservationConfrimation(models.Model):
-    reservation = models.OneToOneField(Reservation, on_delete=models.CASCADE)
-    saved_file = models.FileField(null=True, upload_to="confirmations/")
+class HouseOccupancy(models.Model):
+    """
+    materialized calendar of a house -> one row per house and year, one bit per night [utils/bitmap.py]
+    kept up to date by reservation signals, read by the house serializer and the availability view
+    """
 
-    def save(self, *args, **kwargs):
+    class Meta:
+        ordering = ["house", "year"]
+        constraints = [models.UniqueConstraint(fields=["house", "year"], name="unique_house_occupancy_year")]
 
-        self._create_pdf(self.reservation)
+    house = models.ForeignKey(ChalletHouse, on_delete=models.CASCADE, related_name="occupancy")
+    year = models.PositiveSmallIntegerField()
+    bitmap = models.BinaryField(max_length=BITMAP_SIZE, default=bytes(BITMAP_SIZE))
 
-        super().save(*args, **kwargs)
+    def __str__(self) -> str:
+        return f"Occupancy of house {self.house_id} in {self.year}"
+
+    def as_bitmap(self) -> OccupancyBitmap:
+        return OccupancyBitmap(self.year, self.bitmap)
+
+    @classmethod
+    def mark_nights(cls, house_id, start, end, taken=True):
+        """
+        sets/clears the nights of a stay on every year row it touches
+        rows are locked until the end of the transaction -> parallel bookings of the same house do not lose updates
+        """
+        with transaction.atomic():
+            for year in OccupancyBitmap.years(start, end):
+                occupancy, created = cls.objects.select_for_update().get_or_create(house_id=house_id, year=year)
+                bitmap = occupancy.as_bitmap()
+                bitmap.mark(start, end, taken=taken)
+                if bitmap.to_bytes() != bytes(occupancy.bitmap):
+                    # unchanged rows are not written -> no version bump of the cached responses either
+                    occupancy.bitmap = bitmap.to_bytes()
+                    occupancy.save(update_fields=["bitmap"])
+
+    @classmethod
+    def rebuild(cls, house_number):
+        """recomputes all rows of a house from its reservations"""
+        bitmaps = {}
+        for start, end in Reservation.objects.house_availability(house_number):
+            for year in OccupancyBitmap.years(start, end):
+                bitmaps.setdefault(year, OccupancyBitmap(year)).mark(start, end)
+
+        with transaction.atomic():
+            cls.objects.filter(house_id=house_number).delete()
+            cls.objects.bulk_create(
+                cls(house_id=house_number, year=year, bitmap=bitmap.to_bytes()) for year, bitmap in bitmaps.items()
+            )
+            response_cache.mark_stale(cls)  # bulk_create sends no signals
 
-    def _create_pdf(self, reservation):
 
-        res = reservation
-        file = io.BytesIO()
-        c = canvas.Canvas(file, pagesize=letter, bottomup=1, verbosity=0)
-        w, h = letter  # [612/792]
-        # draw two lines at the top and bottom of the document. Entire witdth
-        c.line(0, 750, w, 750)
-        c.line(0, 50, w, 50)
-        # draw an address above the first line to the left
-        c.drawString(20, 780, f"{res.house.address}")
-        c.drawString(w - 200, 780, f"Created at: {res.created_at.replace(microsecond=0,tzinfo=None)}")
+class ReservationConfrimation(LoadedValues, models.Model):
+    """
+    pdf confirmation of the reservation -> rendered by a celery task [render_confirmation_task], not in the request
+    content_hash: hash of everything printed on the pdf, re-saves with unchanged data do not render it again
+    """
 
-        # write a string centered based on the middle [w/2]
-        c.drawCentredString(w / 2, 730, f"RESERVATION: {res.reservation_number}")
+    reservation = models.OneToOneField(Reservation, on_delete=models.CASCADE)
+    saved_file = models.FileField(null=True, upload_to="confirmations/")
+    content_hash = models.CharField(max_length=64, blank=True, default="")
+
+    def render(self) -> bool:
+        """stores a new pdf if its content changed since the last rendering -> False if the saved file is up to date"""
+        content = self._pdf_content(self.reservation)
+        content_hash = hashlib.sha256(json.dumps(content, cls=JSONEncoder).encode()).hexdigest()
+        if self.saved_file and content_hash == self.content_hash:
+            return False
 
+        with metrics.PDF_RENDER_DURATION.time():
+            self._create_pdf(content)
+        self.content_hash = content_hash
+        return True
+
+    def _pdf_content(self, reservation):
+        res = reservation
         lines = {
             "Guest": res.reservation_owner.full_name,
             "Check in": res.start_date,
@@ -186,12 +307,34 @@ class ReservationConfrimation(models.Model):
                 }
             )
 
+        return {
+            "address": res.house.address,
+            "created_at": res.created_at.replace(microsecond=0, tzinfo=None),
+            "reservation_number": res.reservation_number,
+            "lines": lines,
+        }
+
+    def _create_pdf(self, content):
+
+        file = io.BytesIO()
+        c = canvas.Canvas(file, pagesize=letter, bottomup=1, verbosity=0)
+        w, h = letter  # [612/792]
+        # draw two lines at the top and bottom of the document. Entire witdth
+        c.line(0, 750, w, 750)
+        c.line(0, 50, w, 50)
+        # draw an address above the first line to the left
+        c.drawString(20, 780, f"{content['address']}")
+        c.drawString(w - 200, 780, f"Created at: {content['created_at']}")
+
+        # write a string centered based on the middle [w/2]
+        c.drawCentredString(w / 2, 730, f"RESERVATION: {content['reservation_number']}")
+
         # below moves the cursor after text is drawn
         main_text_object = c.beginText()
         main_text_object.setTextOrigin(50, 640)
         main_text_object.setFont("Helvetica-Oblique", 14)
 
-        for title, value in lines.items():
+        for title, value in content["lines"].items():
             if title == "*":
                 s = str(title) + str(value)
                 main_text_object.setFillGray(0.4)
@@ -202,6 +345,138 @@ class ReservationConfrimation(models.Model):
         c.drawText(main_text_object)
         c.save()
 
-        file.name = f"{reservation.reservation_number}.pdf"
+        # stored right away [save=False -> no model save, no post_save signal]
+        self.saved_file.save(f"{content['reservation_number']}.pdf", File(file), save=False)
 
-        self.saved_file = File(file)
+
+class ReservationSummary(models.Model):
+    """
+    reservations of a customer in a house by month of arrival [0 -> no dates, cancelled] -> read by StatisticsView
+    counts and sums are moved by the statistics signals [bookings/statistics.py], longest is the longest stay in days
+    """
+
+    KEY = ("month", "house_id", "customer_profile_id")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["month", "house", "customer_profile"], name="unique_reservation_summary")
+        ]
+
+    month = models.PositiveSmallIntegerField()
+    house = models.ForeignKey(ChalletHouse, on_delete=models.CASCADE, related_name="reservation_summaries")
+    customer_profile = models.ForeignKey(CustomerProfile, on_delete=models.CASCADE)
+
+    reservations = models.IntegerField(default=0)
+    not_confirmed = models.IntegerField(default=0)
+    confirmed = models.IntegerField(default=0)
+    cancelled = models.IntegerField(default=0)
+    completed = models.IntegerField(default=0)
+    revenue = models.BigIntegerField(default=0)
+    nights = models.IntegerField(default=0)
+    longest = models.IntegerField(default=0)
+
+    def __str__(self) -> str:
+        return f"Reservations of profile {self.customer_profile_id} in house {self.house_id}, month {self.month}"
+
+
+class OpinionSummary(models.Model):
+    """opinions of an author by month they were provided in -> read by StatisticsView [bookings/statistics.py]"""
+
+    KEY = ("month", "author_id")
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["month", "author"], name="unique_opinion_summary")]
+
+    month = models.PositiveSmallIntegerField()
+    # rows of deleted authors go with them, their opinions [sentinel user now] are summed up again after commit
+    author = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+
+    opinions = models.IntegerField(default=0)
+    with_image = models.IntegerField(default=0)
+    rated = models.IntegerField(default=0)
+    rating_total = models.IntegerField(default=0)
+    longest_body = models.IntegerField(default=0)
+
+    def __str__(self) -> str:
+        return f"Opinions of user {self.author_id}, month {self.month}"
+
+
+class CustomerSummary(models.Model):
+    """customer profiles by month they joined in and status -> read by StatisticsView [bookings/statistics.py]"""
+
+    KEY = ("month", "status")
+
+    class Meta:
+        verbose_name_plural = "customer summaries"
+        constraints = [models.UniqueConstraint(fields=["month", "status"], name="unique_customer_summary")]
+
+    month = models.PositiveSmallIntegerField()
+    status = models.CharField(choices=CustomerProfile.STATUS_CHOICES, max_length=1)
+
+    customers = models.IntegerField(default=0)
+
+    def __str__(self) -> str:
+        return f"Customers {self.status}, month {self.month}"
+
+
+class StatisticsCounter(models.Model):
+    """single numbers of StatisticsView [admin/normal users, order confirmations] -> moved by the statistics signals"""
+
+    KEY = ("name",)
+
+    name = models.CharField(max_length=50, unique=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self) -> str:
+        return f"{self.name}: {self.value}"
+
+
+class OutgoingEmail(models.Model):
+    """
+    outbox of emails written by celery tasks -> sent in batches over one smtp connection [bookings/outbox.py]
+    failed messages are retried with a growing delay [send_after] until they run out of attempts
+    """
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["send_after", "id"], condition=Q(status=0), name="outgoing_email_pending_idx"),
+            models.Index(fields=["claimed_at"], condition=Q(status=2), name="outgoing_email_sending_idx"),
+        ]
+
+    PENDING = 0
+    SENT = 1
+    SENDING = 2
+    FAILED = 9
+
+    STATUS_CHOICES = [
+        (PENDING, "Waiting to be sent"),
+        (SENDING, "Claimed by a flush, being sent"),
+        (SENT, "Sent"),
+        (FAILED, "Failed, no attempts left"),
+    ]
+
+    subject = models.CharField(max_length=200)
+    body = models.TextField()
+    from_email = models.CharField(max_length=254, blank=True, null=True)
+    to = ArrayField(models.EmailField())
+    # existing file [e.g. pdf confirmation] attached as it is, not copied
+    attachment = models.FileField(blank=True, null=True)
+    attachment_mimetype = models.CharField(max_length=50, blank=True)
+
+    status = models.SmallIntegerField(choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    send_after = models.DateTimeField(default=timezone.now)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self) -> str:
+        return f"Email to {', '.join(self.to)}: {self.subject} [{self.get_status_display()}]"
+
+    def as_message(self, connection=None) -> EmailMessage:
+        message = EmailMessage(self.subject, self.body, self.from_email, to=self.to, connection=connection)
+        if self.attachment:
+            with self.attachment.open("rb") as file:
+                message.attach(os.path.basename(self.attachment.name), file.read(), self.attachment_mimetype or None)
+        return message
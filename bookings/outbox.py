@@ -0,0 +1,129 @@
+"""
+outbox of emails [OutgoingEmail] -> celery tasks only write messages, flush_outgoing_emails_task sends them
+
+- one smtp connection per batch instead of a new connection [handshake, tls] for every single message
+- a failed message is retried later with a growing delay, the rest of the batch is sent anyway
+- a batch is claimed first [status sending, skip locked -> parallel flushers never take the same messages] and the
+  claim committed; smtp runs outside of any transaction, the result of each message is written on its own
+- claims older than CLAIM_TIMEOUT [flusher died while sending] go back to the due messages -> sent at least once
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import OutgoingEmail
+
+BATCH_SIZE = 100
+MAX_ATTEMPTS = 5
+# 30s, 1min, 2min, 4min ... never more than an hour
+BACKOFF_SECONDS = 30
+MAX_BACKOFF_SECONDS = 3600
+CLAIM_TIMEOUT = timedelta(minutes=15)
+
+
+def enqueue(subject, body, to, from_email=None, attachment=None, mimetype=""):
+    return OutgoingEmail.objects.create(
+        subject=subject,
+        body=body,
+        to=list(to),
+        from_email=from_email or settings.EMAIL_HOST_USER,
+        attachment=attachment,
+        attachment_mimetype=mimetype,
+    )
+
+
+def backoff(attempts):
+    return timedelta(seconds=min(BACKOFF_SECONDS * 2 ** (attempts - 1), MAX_BACKOFF_SECONDS))
+
+
+def flush(batch_size=BATCH_SIZE, max_attempts=MAX_ATTEMPTS, connection=None):
+    """
+    sends one batch of due messages over a single connection -> {"sent", "retried", "failed"}
+    connection: any django email backend, get_connection() [EMAIL_BACKEND] by default
+    """
+    report = {"sent": 0, "retried": 0, "failed": 0}
+    now = timezone.now()
+    batch = claim(batch_size, now)
+    if not batch:
+        return report
+
+    connection = connection or get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as e:
+        # server not reachable -> the whole batch is tried again later
+        for email in batch:
+            _failed(email, e, now, max_attempts, report)
+        return report
+
+    try:
+        for email in batch:
+            _send(email, connection, now, max_attempts, report)
+    finally:
+        connection.close()
+    return report
+
+
+def claim(batch_size, now):
+    """due messages [+ stale claims] marked as being sent in a short transaction of their own"""
+    due = Q(status=OutgoingEmail.PENDING, send_after__lte=now) | Q(
+        status=OutgoingEmail.SENDING, claimed_at__lt=now - CLAIM_TIMEOUT
+    )
+    with transaction.atomic():
+        batch = list(
+            OutgoingEmail.objects.select_for_update(skip_locked=True)
+            .filter(due)
+            .order_by("send_after", "id")[:batch_size]
+        )
+        OutgoingEmail.objects.filter(id__in=[email.id for email in batch]).update(
+            status=OutgoingEmail.SENDING, claimed_at=now
+        )
+    return batch
+
+
+def _send(email, connection, now, max_attempts, report):
+    try:
+        connection.send_messages([email.as_message(connection)])
+    except Exception as e:
+        _failed(email, e, now, max_attempts, report)
+        # connection might be broken after the error -> next message goes over a new one
+        connection.close()
+        try:
+            connection.open()
+        except Exception:
+            pass  # send_messages opens it again for every message
+    else:
+        email.status = OutgoingEmail.SENT
+        email.sent_at = now
+        email.attempts += 1
+        report["sent"] += 1
+        _record(email)
+
+
+def _failed(email, error, now, max_attempts, report):
+    email.attempts += 1
+    email.last_error = f"{error.__class__.__name__}: {error}"
+    if email.attempts >= max_attempts:
+        email.status = OutgoingEmail.FAILED
+        report["failed"] += 1
+    else:
+        email.status = OutgoingEmail.PENDING
+        email.send_after = now + backoff(email.attempts)
+        report["retried"] += 1
+    _record(email)
+
+
+def _record(email):
+    """result of one message -> one UPDATE [own transaction], the message is done whatever happens to the rest"""
+    OutgoingEmail.objects.filter(id=email.id).update(
+        status=email.status,
+        attempts=email.attempts,
+        send_after=email.send_after,
+        last_error=email.last_error,
+        sent_at=email.sent_at,
+        claimed_at=None,
+    )
@@ -1,8 +1,15 @@
 # https://stackoverflow.com/questions/44370252/django-rest-framework-how-to-turn-off-on-pagination-in-modelviewset -> viewsets turning off
 
 
+import json
+from base64 import b64decode, b64encode
+from datetime import date
+
+from django.db.models import F
 from rest_framework import pagination
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 
 class MyCustomPageNumberPagination(pagination.PageNumberPagination):
@@ -37,3 +44,150 @@ class MyCustomListOffsetPagination(pagination.LimitOffsetPagination):
 class MyCustomCursorPaginator(pagination.CursorPagination):
     page_size = 3
     ordering = "edited_on"
+
+
+class MyCustomKeysetPaginator(pagination.BasePagination):
+    """
+    keyset [seek] pagination on (date_field, id), both descending -> most recent first, rows without the date at the end
+    - cursor keeps the last row seen -> every page is an index range scan, no OFFSET no matter how deep the page is
+    - no count query and only page_size + 1 rows are fetched
+    - rows without date_field (cancelled reservations) are paginated separately by id, as NULL cannot be compared;
+      a page spanning both parts needs a second query
+    """
+
+    page_size = 3
+    page_size_query_param = "user_page_size"
+    max_page_size = 25
+    cursor_query_param = "cursor"
+    date_field = "end_date"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.cursor = self.decode_cursor(request)
+
+        if self.cursor is None or not self.cursor["reverse"]:
+            rows = self._take(self._forward_segments(queryset), self.page_size + 1)
+            self.has_next = len(rows) > self.page_size
+            self.has_previous = self.cursor is not None
+            self.page = rows[: self.page_size]
+        else:
+            rows = self._take(self._backward_segments(queryset), self.page_size + 1)
+            self.has_next = True
+            self.has_previous = len(rows) > self.page_size
+            self.page = rows[: self.page_size][::-1]
+
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "previous": self.get_previous_link(), "results": data})
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(page_size, self.max_page_size) if page_size > 0 else self.page_size
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def encode_cursor(self, row, reverse):
+        return replace_query_param(self.base_url, self.cursor_query_param, self.cursor_for(row, reverse))
+
+    def cursor_for(self, row, reverse=False):
+        """cursor value pointing right after [or before if reverse] the row"""
+        value = getattr(row, self.date_field)
+        position = {"d": value.isoformat() if value else None, "id": row.id, "r": int(reverse)}
+        return b64encode(json.dumps(position).encode("ascii")).decode("ascii")
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            position = json.loads(b64decode(encoded.encode("ascii")).decode("ascii"))
+            return {
+                "date": date.fromisoformat(position["d"]) if position["d"] else None,
+                "id": int(position["id"]),
+                "reverse": bool(position["r"]),
+            }
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def _forward_segments(self, queryset):
+        """rows after the cursor in page order: dated rows [date desc, id desc] followed by undated ones [id desc]"""
+        field = self.date_field
+        dated = queryset.filter(**{f"{field}__isnull": False}).order_by(F(field).desc(nulls_last=True), F("id").desc())
+        undated = queryset.filter(**{f"{field}__isnull": True}).order_by(F(field).desc(nulls_last=True), F("id").desc())
+
+        if self.cursor is None:
+            return [dated, undated]
+        if self.cursor["date"] is None:
+            return [undated.filter(id__lt=self.cursor["id"])]
+        # range condition on the leading column keeps it an index scan, only rows of the same date are filtered
+        dated = dated.filter(**{f"{field}__lte": self.cursor["date"]}).exclude(
+            **{field: self.cursor["date"], "id__gte": self.cursor["id"]}
+        )
+        return [dated, undated]
+
+    def _backward_segments(self, queryset):
+        """rows before the cursor, closest first -> exact reverse of the page order"""
+        field = self.date_field
+        dated = queryset.filter(**{f"{field}__isnull": False}).order_by(F(field).asc(nulls_first=True), F("id").asc())
+        undated = queryset.filter(**{f"{field}__isnull": True}).order_by(F(field).asc(nulls_first=True), F("id").asc())
+
+        if self.cursor["date"] is None:
+            return [undated.filter(id__gt=self.cursor["id"]), dated]
+        dated = dated.filter(**{f"{field}__gte": self.cursor["date"]}).exclude(
+            **{field: self.cursor["date"], "id__lte": self.cursor["id"]}
+        )
+        return [dated]
+
+    def _take(self, segments, limit):
+        rows = []
+        for segment in segments:
+            rows.extend(segment[: limit - len(rows)])
+            if len(rows) >= limit:
+                break
+        return rows
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "next": {"type": "string", "nullable": True},
+                "previous": {"type": "string", "nullable": True},
+                "results": schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "The pagination cursor value.",
+                "schema": {"type": "string"},
+            },
+            {
+                "name": self.page_size_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Number of results to return per page.",
+                "schema": {"type": "integer"},
+            },
+        ]
@@ -0,0 +1,145 @@
+"""
+versioned response cache for list endpoints
+
+- every tracked model has a version number in redis, bumped when the model is saved/deleted [signals.py] or
+  updated in bulk [mark_stale] and once more after commit; saves that change nothing the responses show are skipped
+- a response is stored under (endpoint, audience, query params, day, versions of the models it is built from)
+  -> a write makes the old entries unreachable, they simply expire; long ttl without serving stale data
+- audience: "admin" [same data for all admins], "user:<id>" or "anon"
+- X-Response-Cache: hit/miss header, hit/miss counts and latencies per endpoint -> prometheus
+  [core_project.metrics]
+"""
+import hashlib
+import time
+from functools import partial
+from urllib.parse import urlencode
+
+from core_project import metrics
+from core_project import snapshots
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework import status
+from rest_framework.response import Response
+
+from bookings.utils import my_date
+
+# models whose writes bump a version -> endpoints can only depend on these
+# label -> fields the cached responses show [None: all]; a save that changes none of them bumps nothing
+MODELS = {
+    "accounts.MyCustomUser": {"name", "surname", "slug"},  # full name of authors/customers, links by slug
+    "bookings.ChalletHouse": None,
+    "bookings.CustomerProfile": None,
+    "bookings.HouseOccupancy": None,
+    "bookings.Opinion": None,
+    "bookings.Reservation": None,
+}
+
+
+def _version_key(label):
+    return f"response_cache:version:{label}"
+
+
+def versions(labels):
+    """current versions of the models -> one round trip"""
+    stored = cache.get_many([_version_key(label) for label in labels])
+    return [stored.get(_version_key(label), 0) for label in labels]
+
+
+def bump(labels):
+    """one pipeline for all labels -> versions start from 1 after redis was emptied"""
+    cache.incr_many([_version_key(label) for label in labels])
+
+
+def changes_responses(instance, created, update_fields=None):
+    """
+    False for saves that leave every shown field as it was -> e.g. last_login written on each login, a profile
+    saved again with the same data; compared with the row as loaded [core_project.snapshots] where there is one
+    """
+    fields = MODELS[instance._meta.label]
+    if update_fields is not None and fields is not None and not fields & set(update_fields):
+        return False
+    loaded = None if created else snapshots.as_loaded(instance)
+    if loaded is None:
+        return True
+    fields = fields or [field.attname for field in instance._meta.concrete_fields]
+    return any(getattr(loaded, field) != getattr(instance, field) for field in fields)
+
+
+def mark_stale(model):
+    """responses built from the model are not served any more once the transaction commits"""
+    label = model._meta.label
+    if label not in MODELS:
+        return
+
+    # bumped right away -> this connection does not read cached responses older than its own writes,
+    # the bump after commit drops whatever other requests stored in between
+    bump([label])
+    # one per write, not deduplicated: a version bumped twice only moves on once more
+    transaction.on_commit(partial(bump, [label]))  # runs right away outside of a transaction
+
+
+def audience(user):
+    if not user.is_authenticated:
+        return "anon"
+    return "admin" if user.is_admin else f"user:{user.id}"
+
+
+def _request_parts(request, endpoint, url_kwargs):
+    params = urlencode(sorted(request.query_params.lists()), doseq=True)
+    return [
+        endpoint,
+        urlencode(sorted((url_kwargs or {}).items())),
+        audience(request.user),
+        request.get_host(),  # hyperlinks in the responses are absolute
+        params,
+        my_date.today().isoformat(),  # current/past reservations depend on the day
+    ]
+
+
+def _hashed(parts):
+    return "response_cache:" + hashlib.sha256("|".join(parts).encode()).hexdigest()
+
+
+def cache_key(request, endpoint, depends_on, url_kwargs=None):
+    return _hashed([*_request_parts(request, endpoint, url_kwargs), *map(str, versions(depends_on))])
+
+
+class CachedResponseMixin:
+    """
+    list() answered from the response cache, other handlers call cached_response(request, handler, **kwargs)
+    -> response_cache_models: labels of the models the response is built from [subset of MODELS]
+    """
+
+    response_cache_models: tuple = ()
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, super().list, *args, **kwargs)
+
+    def cached_response(self, request, build, *args, **kwargs):
+        assert set(self.response_cache_models) <= MODELS.keys(), "response cache depends on untracked models"
+        started = time.perf_counter()
+        endpoint = self._endpoint(request)
+        key = cache_key(request, endpoint, self.response_cache_models, kwargs)
+
+        data = cache.get(key)
+        if data is not None:
+            return self._hit(data, endpoint, started)
+
+        response = build(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data, settings.RESPONSE_CACHE_TTL)
+        return self._miss(response, endpoint, started)
+
+    def _endpoint(self, request):
+        return request.resolver_match.view_name if request.resolver_match else type(self).__name__
+
+    def _hit(self, data, endpoint, started):
+        response = Response(data, headers={"X-Response-Cache": "hit"})
+        metrics.RESPONSE_CACHE.labels(endpoint, "hit").observe(time.perf_counter() - started)
+        return response
+
+    def _miss(self, response, endpoint, started):
+        response["X-Response-Cache"] = "miss"
+        metrics.RESPONSE_CACHE.labels(endpoint, "miss").observe(time.perf_counter() - started)
+        return response
@@ -1,12 +1,13 @@
-import calendar
-from collections import OrderedDict
 from datetime import date, datetime, timedelta
 from typing import Optional
 
+from core_project import audit
+from django.db import IntegrityError, transaction
 from rest_framework import serializers
 
 from . import exceptions
 from .models import ChalletHouse, CustomerProfile, Opinion, Reservation, Suggestion
+from .utils.bitmap import OccupancyBitmap
 
 
 class CustomerProfileSerializer(serializers.HyperlinkedModelSerializer):
@@ -120,54 +121,27 @@ class ReservationSerializer(DynamicFieldsModelSerializer):
 
         self._check_if_dates_make_sense(start, end)
 
-        self._check_if_no_overlaping_days(attrs, start, end)
-
         attrs = self._fix_get_status_display_to_status(attrs)
 
         return attrs
 
-    def _check_if_no_overlaping_days(self, attrs, start, end):
+    def create(self, validated_data):
         """
-        checks if this is creation of new reservations. If so, checks if dates on the reservation are available
-        and raises appropriate exception if not. If this is not a new reservation then house attribute will not be present
-        and this function will return True
+        overlapping days are rejected by the exclusion constraint on the reservation table
+        -> no need to load reservations of the house upfront and two parallel requests cannot both pass
         """
-        # house will be in the attributes list only during creation of the reservation
-        # house will already be an instance of ChalletHouse.
-        selected_house = attrs.get("house", None)
-        if selected_house is None:
-            return True
-
-        new_reservation_days = [start + timedelta(days=day) for day in range((end - start).days + 1)]
-        # {house_nb: list_of_dates}
-        taken_spots = selected_house.house_reservations.house_spots(selected_house.house_number)
-
-        # try except block in case it is the first registration and taken_spots is empty.
         try:
-            # for 1 night reservations only check first date - the latter will be leaving date so someone can arrive that day in the afternoon
-            if len(new_reservation_days) == 2:
-                if new_reservation_days[0] not in taken_spots.get(selected_house.house_number):
-                    return True
-            # otherwise check first and the last one quickly (reservations outside of current range)
-            elif (
-                end < taken_spots.get(selected_house.house_number)[0]
-                or start >= taken_spots.get(selected_house.house_number)[-1]
-            ):
-
-                return True
-
-            else:
-                # first day may overlap -> end date = leave so we can have someone leaving and comming in on the same day
-
-                for day in new_reservation_days[1:]:
-                    if day in taken_spots.get(selected_house.house_number):
-                        raise exceptions.DatesNotAvailable(days=new_reservation_days)
-
-                return True
-
+            with transaction.atomic():
+                return super().create(validated_data)
+        except IntegrityError as e:
+            constraint_name = getattr(getattr(e.__cause__, "diag", None), "constraint_name", None)
+            if constraint_name != Reservation.OVERLAP_CONSTRAINT:
+                raise
+
+            start = validated_data.get("start_date")
+            end = validated_data.get("end_date")
+            new_reservation_days = [start + timedelta(days=day) for day in range((end - start).days + 1)]
             raise exceptions.DatesNotAvailable(days=new_reservation_days)  # days att might be ditched if too exp.
-        except IndexError:
-            pass
 
     def _check_if_dates_make_sense(self, start, end):
         """end date must be higher than start date"""
@@ -249,6 +223,7 @@ class DetailViewReservationSerializer(ReservationSerializer):
 
     def update(self, instance, validated_data):
         new_status = validated_data.get("status")
+        previous_status = instance.status
 
         if new_status == 9:
             instance.start_date = None
@@ -259,6 +234,16 @@ class DetailViewReservationSerializer(ReservationSerializer):
             instance.status = new_status
 
         instance.save(status_change=new_status)
+        if previous_status != new_status:
+            request = self.context.get("request")
+            audit.log_on_commit(
+                "status_transition",
+                model="bookings.Reservation",
+                to=new_status,
+                ids=[instance.id],
+                previous=[previous_status],
+                user=request.user.id if request else None,
+            )
         return instance
 
     def validate_status(self, value):
@@ -307,75 +292,86 @@ class ChalletHouseSerializer(serializers.ModelSerializer):
 
     def get_already_reserved_nights(self, obj) -> list[str]:
 
-        taken_spots = obj.house_reservations.house_spots(obj.house_number)
+        today = date.today()
+        taken_nights = []
+        for bitmap in self._get_occupancy(obj):
+            taken_nights.extend(bitmap.taken_nights(start=today))
 
-        return taken_spots[obj.house_number]
+        return taken_nights
 
     def get_house_reservations(self, obj) -> Optional[list[Optional[str]]]:
         """
         house reservations will display reservations to their owners only..
         Admins will see all reservations [replacing nested serializer with this method to enable this "feature"]
+        -> reservations are prefetched already filtered per user by the views [visible_reservations]
         """
         user = self.context.get("request").user
         serializer_context = {"remove_house": True, "request": self.context.get("request")}
 
         if not user.is_authenticated:
             reservations: list[Optional[str]] = []
-            serializer = BasicReservationSerializer(reservations, many=True, context=serializer_context)
+        elif hasattr(obj, "visible_reservations"):
+            reservations = obj.visible_reservations
         elif user.is_admin:
-            reservations = Reservation.objects.filter(house=obj).select_related(
-                "customer_profile__user", "reservation_owner"
-            )
-            serializer = BasicReservationSerializer(reservations, many=True, context=serializer_context)
+            reservations = Reservation.objects.filter(house=obj).select_related("customer_profile__user")
         else:
             reservations = Reservation.objects.filter(reservation_owner=user, house=obj).select_related(
-                "customer_profile__user", "reservation_owner"
+                "customer_profile__user"
             )
-            serializer = BasicReservationSerializer(reservations, many=True, context=serializer_context)
 
+        serializer = BasicReservationSerializer(reservations, many=True, context=serializer_context)
         return serializer.data
 
     def get_free_spots_this_year(self, obj) -> Optional[list[Optional[str]]]:
 
-        taken_spots = obj.house_reservations.house_spots(obj.house_number)
-
-        # taken_spots = taken_spots[obj.house_number]
-        taken_spots_dict = OrderedDict()
-
-        # dict for O(1) lookups later
-        for day in taken_spots[obj.house_number]:
-            taken_spots_dict[day] = True
-
-        current_year = date.today().year
-        current_month = date.today().month
-        all_days_till_next_year = []
-        c = calendar.Calendar()
-
-        for i in range(current_month, 13):
-            weeks_month = c.monthdatescalendar(current_year, current_month)
-            for one_week in weeks_month:
-                all_days_till_next_year.extend(one_week)
-            current_month += 1
-
-        free_days = {}
-        # taken spots returns days in order
-        # https://stackoverflow.com/questions/10058140/accessing-items-in-an-collections-ordereddict-by-index
-        # below allows to get first value to check against without the need to create an entire list.
-        first_day_taken = next(iter(taken_spots_dict.keys()))
-        # append all days which are not listed in taken_spots to free days list
-        for day in all_days_till_next_year:
-            if day < first_day_taken:
-                continue
+        today = date.today()
+        # no occupancy row yet -> nothing has been booked this year
+        this_year = next(
+            (bitmap for bitmap in self._get_occupancy(obj) if bitmap.year == today.year), OccupancyBitmap(today.year)
+        )
+
+        # all nights from today till the end of the year which are not taken
+        return list(this_year.free_nights(start=today))
+
+    def _get_occupancy(self, obj):
+        """
+        both reserved and free nights are read from the occupancy bitmaps [HouseOccupancy] -> query them once per house
+        views prefetch them [current_occupancy], so normally there is no query at all
+        """
+        if not hasattr(self, "_occupancy"):
+            self._occupancy = {}
+
+        if obj.house_number not in self._occupancy:
+            if hasattr(obj, "current_occupancy"):
+                occupancy = obj.current_occupancy
             else:
-                if day in taken_spots_dict:
-                    continue
-                else:
-                    # sometimes days overlap - last week september/beginning October etc
-                    # possible duplicates in wrong order (last/early days get mixed up -> dictionary solves the problem)
-                    if day not in free_days:
-                        free_days[day] = True
-
-        return [*free_days.keys()]
+                occupancy = obj.occupancy.filter(year__gte=date.today().year)
+            self._occupancy[obj.house_number] = [house_occupancy.as_bitmap() for house_occupancy in occupancy]
+
+        return self._occupancy[obj.house_number]
+
+
+class HouseAvailabilitySerializer(serializers.Serializer):
+    """
+    validates the range of the availability view: ?from=&to= -> start/end [end = departure day, not included]
+    by default next 30 nights are returned
+    """
+
+    max_nights = 366
+
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+
+    def validate(self, attrs):
+        start = attrs.get("start") or date.today()
+        end = attrs.get("end") or start + timedelta(days=30)
+
+        if start >= end:
+            raise serializers.ValidationError("End date must be later than start date")
+        if (end - start).days > self.max_nights:
+            raise serializers.ValidationError(f"Availability can be checked for up to {self.max_nights} nights")
+
+        return {"start": start, "end": end}
 
 
 class RunUpdatesSerializer(serializers.Serializer):
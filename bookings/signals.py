@@ -1,15 +1,19 @@
-import datetime
+from functools import partial
 
+from accounts import authentication
 from accounts.models import MyCustomUser
-from django.core.exceptions import ObjectDoesNotExist
-from django.db.models.signals import post_save
+from celery import chain
+from core_project import snapshots
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from rest_framework.authtoken.models import Token
 
 from bookings.models import Reservation
 
-from .models import CustomerProfile, ReservationConfrimation
-from .tasks import send_email_notification_reservation, send_order_confirmation_task
+from . import response_cache, statistics
+from .models import CustomerProfile, HouseOccupancy, ReservationConfrimation
+from .tasks import render_confirmation_task, send_email_notification_reservation, send_order_confirmation_task
 
 
 @receiver(post_save, sender=MyCustomUser)
@@ -41,49 +45,68 @@ def update_profiles(sender, instance, created, **kwargs):
         instance.customerprofile.save()
 
 
+@receiver(post_save, sender=CustomerProfile)
+def invalidate_cached_token(sender, instance, created, **kwargs):
+    """the status of the profile travels with the cached user [throttles] -> dropped from the token cache"""
+    if not created:
+        authentication.invalidate_users([instance.user_id])
+
+
 @receiver(post_save, sender=Reservation)
-def update_reservation_number(sender, instance, created, **kwargs):
+def reservation_pipeline(sender, instance, created, **kwargs):
     """
-    creating a reservation number out of todays date and id of the created reservation
+    everything that follows a reservation save [reservation number is already written by Reservation.save]
+    - created: confirmation row in the same transaction; admin notification + pdf confirmation sent after commit
+    - updated: pdf confirmation rendered again [only if its content changed] and sent after commit
+    tasks are scheduled on commit -> the worker sees the saved data and nothing is sent for rolled back reservations
     """
-
     if created:
-        new_reservation_number = "".join(str(datetime.date.today()).split("-")) + str(instance.id)
-        instance.reservation_number = new_reservation_number
-        instance.save()
-
+        confirmation = ReservationConfrimation.objects.create(reservation=instance)
         data_celery = _prepare_data_for_celery_email(instance)
-        send_email_notification_reservation.delay(data_celery, new_reservation_number)
+        transaction.on_commit(
+            partial(send_email_notification_reservation.delay, data_celery, instance.reservation_number)
+        )
+
+    # dont send new confirmations for completed/not confirmed reservations
+    # for 99 status (after customer came back home) its meaningless and the other one would be a reconfirmation
+    elif instance.status in [0, 99]:
+        return
+
+    else:
+        confirmation = ReservationConfrimation.objects.filter(reservation=instance).only("id").first()
+        if confirmation is None:
+            return
+
+    render_and_send = chain(render_confirmation_task.si(confirmation.id), send_order_confirmation_task.s())
+    transaction.on_commit(render_and_send.apply_async)
 
 
 @receiver(post_save, sender=Reservation)
-def reservation_confirmation(sender, instance, created, **kwargs):
-    """this function must be placed below update_reservation_number -> to avoid reservation_number = None"""
+def update_house_occupancy(sender, instance, created, **kwargs):
+    """
+    keeps the occupancy bitmap of the house in line with the reservation:
+    nights of the previous dates are released and the new ones taken [cancellation -> released only]
+    """
+    previous = None if created else snapshots.as_loaded(instance)
+    previous_nights = previous.occupied_nights if previous is not None else None
+    current_nights = instance.occupied_nights
 
-    if created:
-        confirmation = ReservationConfrimation.objects.create(reservation=instance)
+    if previous_nights != current_nights:
+        if previous_nights is not None:
+            HouseOccupancy.mark_nights(*previous_nights, taken=False)
+        if current_nights is not None:
+            HouseOccupancy.mark_nights(*current_nights, taken=True)
 
-    else:
-        #     # if updated (status change)
-        #     # for some reason, two signals are being generated and the first one makes "created" false.
-        #     # without this try except block code could fail as we would try to queyr object that is techinically not there yet
-        try:
-            confirmation = ReservationConfrimation.objects.get(reservation=instance)
-            # 0 is a default status, without this if block, program would generate two emails with the same attachment
-            # upon creation of a reservation. This is because the func update_reservation_number ends up with a save on the Reservation model.
-            # that means that there are 2 post_save calls, once with created=True, and once with False.
-            # False would ideally mean = update, but it is not due to this issue. Since 0 is a default status,
-            # here it is assumed that the reservation was just created and we can skip sending a new email
-            if confirmation.reservation.status == 0:
-                return
-
-        except ObjectDoesNotExist:
-            return
-        confirmation.save()
+
+@receiver(post_delete, sender=Reservation)
+def release_house_occupancy(sender, instance, **kwargs):
+    nights = (snapshots.as_loaded(instance) or instance).occupied_nights
+    if nights is not None:
+        HouseOccupancy.mark_nights(*nights, taken=False)
 
 
 def _prepare_data_for_celery_email(instance):
-    customer = MyCustomUser.objects.get(id=instance.reservation_owner.id)
+    customer = instance.reservation_owner
 
     data = {
         "start_date": instance.start_date,
@@ -96,12 +119,32 @@ def _prepare_data_for_celery_email(instance):
     return data
 
 
-@receiver(post_save, sender=ReservationConfrimation)
-def send_order_confrimation(sender, instance, created, **kwargs):
+@receiver(post_save)
+def add_to_statistics(sender, instance, created, **kwargs):
+    """summary rows of the statistics moved by what the saved row contributes now vs before [bookings/statistics.py]"""
+    if kwargs.get("raw") or sender not in statistics.TRACKED:
+        return  # fixtures
+    statistics.record_save(instance, created)
+
+
+@receiver(post_delete)
+def remove_from_statistics(sender, instance, **kwargs):
+    if sender in statistics.TRACKED:
+        statistics.record_delete(instance)
+
+
+def mark_responses_stale(sender, instance, **kwargs):
+    """cached responses built from the changed model are not served after commit [bookings/response_cache.py]"""
+    if kwargs.get("raw"):
+        return  # fixtures
+    if "created" in kwargs and not response_cache.changes_responses(
+        instance, kwargs["created"], kwargs.get("update_fields")
+    ):
+        return  # saved, nothing shown by the cached responses changed
+    response_cache.mark_stale(sender)
+
 
-    # dont send new confirmations for completed/not confirmed if not created signal
-    # for 99 status (after customer came back home) its meaningless
-    # and the other one would be a reconfirmation which is not needed either.
-    if created is True or instance.reservation.status not in [0, 99]:
-        id = instance.id
-        send_order_confirmation_task.apply_async((id,), countdown=0)
+# tracked models only, not every save of the project
+for label in response_cache.MODELS:
+    post_save.connect(mark_responses_stale, sender=label, dispatch_uid=f"mark_responses_stale_save_{label}")
+    post_delete.connect(mark_responses_stale, sender=label, dispatch_uid=f"mark_responses_stale_delete_{label}")
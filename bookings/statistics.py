@@ -0,0 +1,587 @@
+"""
+statistics of StatisticsView, read from summary rows
+
+- ReservationSummary [month, house, customer], OpinionSummary [month, author], CustomerSummary [month, status] and
+  StatisticsCounter hold counts, sums and maximums; a saved row adds what it contributes and takes back what it
+  contributed when it was loaded [signals.py, core_project.snapshots] -> F() increments of one summary row
+- every section [function below] is a read of the summary rows -> its cost does not grow with the reservations
+- update()/bulk_create send no signals -> complete_reservations()/add_customers() for the nightly job, rebuild()
+  recomputes the summaries from scratch [generate_data, check_statistics --fix]
+"""
+import json
+from collections import Counter
+from datetime import date
+from decimal import ROUND_HALF_UP, Decimal
+from functools import partial
+
+from accounts.models import MyCustomUser
+from core_project import snapshots
+from django.db import connection, transaction
+from django.db.models import Count, F, Max, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Concat, ExtractDay, ExtractMonth, Greatest, Length
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import (
+    ChalletHouse,
+    CustomerProfile,
+    CustomerSummary,
+    Opinion,
+    OpinionSummary,
+    Reservation,
+    ReservationConfrimation,
+    ReservationSummary,
+    StatisticsCounter,
+)
+
+# scope -> {key: function}; order of keys = order in the response
+SECTIONS: dict[str, dict] = {"users": {}, "reservations": {}, "opinions": {}, "challet_houses": {}}
+
+# summary fields holding a maximum -> raised with Greatest, recomputed when the row holding it goes away
+MAXIMUMS = {"longest", "longest_body"}
+
+RESERVATION_STATUSES = {
+    Reservation.NOT_CONFIRMED: "not_confirmed",
+    Reservation.CONFIRMED: "confirmed",
+    Reservation.CANCELLED: "cancelled",
+    Reservation.COMPLETED: "completed",
+}
+
+
+def section(scope):
+    def decorator(func):
+        SECTIONS[scope][func.__name__] = func
+        return func
+
+    return decorator
+
+
+def normalize(value):
+    """the same json the view would render -> dates, decimals and querysets as in the api, dict keys as strings"""
+    return json.loads(json.dumps(value, cls=JSONEncoder))
+
+
+def compute(scope, key):
+    return normalize(SECTIONS[scope][key]())
+
+
+def read(scope):
+    statistics = {}
+    for key in SECTIONS[scope]:
+        statistics.update(compute(scope, key))
+    return statistics
+
+
+# what a row contributes -> (summary model, key, values)
+
+
+def _reservation(reservation):
+    start, end = reservation.start_date, reservation.end_date
+    length = (end - start).days if start is not None and end is not None else 0
+    key = {
+        "month": start.month if start is not None else 0,
+        "house_id": reservation.house_id,
+        "customer_profile_id": reservation.customer_profile_id,
+    }
+    values = {
+        "reservations": 1,
+        RESERVATION_STATUSES[reservation.status]: 1,
+        "revenue": reservation.total_price or 0,
+        "nights": length,
+        "longest": length,
+    }
+    return ReservationSummary, key, values
+
+
+def _opinion(opinion):
+    key = {"month": opinion.provided_on.month if opinion.provided_on else 0, "author_id": opinion.author_id}
+    values = {
+        "opinions": 1,
+        "with_image": 1 if opinion.image else 0,
+        "rated": 1 if opinion.rating is not None else 0,
+        "rating_total": opinion.rating or 0,
+        "longest_body": len(opinion.main_text),
+    }
+    return OpinionSummary, key, values
+
+
+def _customer(profile):
+    key = {"month": profile.joined.month if profile.joined else 0, "status": profile.status}
+    return CustomerSummary, key, {"customers": 1}
+
+
+def _user(user):
+    return StatisticsCounter, {"name": "admin_users" if user.is_admin else "normal_users"}, {"value": 1}
+
+
+def _confirmation(confirmation):
+    return StatisticsCounter, {"name": "order_confirmations"}, {"value": 1}
+
+
+TRACKED = {
+    Reservation: _reservation,
+    Opinion: _opinion,
+    CustomerProfile: _customer,
+    MyCustomUser: _user,
+    ReservationConfrimation: _confirmation,
+}
+
+
+def contribution(instance):
+    return TRACKED[type(instance)](instance)
+
+
+def record_save(instance, created):
+    """contribution of the row as it was loaded [core_project.snapshots] taken back, the current one added"""
+    current = contribution(instance)
+    loaded = None if created else snapshots.as_loaded(instance)
+    previous = contribution(loaded) if loaded is not None else None
+
+    if not created and previous is None:
+        rebuild_on_commit(type(instance))  # no row before the save -> previous contribution unknown
+    elif previous != current:
+        if previous is not None:
+            add(*previous, sign=-1)
+        add(*current)
+
+
+def record_delete(instance):
+    add(*contribution(snapshots.as_loaded(instance) or instance), sign=-1)
+    if type(instance) is MyCustomUser:
+        # opinions of the user were moved to the sentinel user by the database [no signals]
+        rebuild_on_commit(Opinion)
+
+
+def add(model, key, values, sign=1):
+    """F() increments of the summary row under the key, created by the first increment [decrements never create]"""
+    changes = {field: F(field) + sign * value for field, value in values.items() if field not in MAXIMUMS and value}
+
+    if sign < 0:
+        model.objects.filter(**key).update(**changes)
+        for field in MAXIMUMS & values.keys():
+            if values[field]:
+                # the row might have held the maximum -> recomputed from the rows left
+                model.objects.filter(**key, **{field: values[field]}).update(
+                    **{field: Coalesce(Subquery(_maximum(model, key)), 0)}
+                )
+        return
+
+    changes.update({field: Greatest(field, Value(values[field])) for field in MAXIMUMS & values.keys()})
+    if model.objects.filter(**key).update(**changes):
+        return
+    # first increment of the key -> empty row [or the one a parallel transaction has just inserted] incremented
+    model.objects.bulk_create([model(**key)], ignore_conflicts=True)
+    model.objects.filter(**key).update(**changes)
+
+
+def _maximum(model, key):
+    """longest stay/body of the source rows under the key -> subquery of a single value"""
+    if model is ReservationSummary:
+        rows = Reservation.objects.filter(
+            start_date__month=key["month"],
+            house_id=key["house_id"],
+            customer_profile_id=key["customer_profile_id"],
+            end_date__isnull=False,
+        ).annotate(value=ExtractDay(F("end_date") - F("start_date")))
+    else:
+        rows = Opinion.objects.filter(provided_on__month=key["month"], author_id=key["author_id"]).annotate(
+            value=Length("main_text")
+        )
+    return rows.order_by("-value").values("value")[:1]
+
+
+def rebuild_on_commit(model):
+    """
+    summaries of the model recomputed by a celery task once the transaction commits
+    -> a rebuild is idempotent, a second one scheduled by the same transaction does no harm
+    """
+    from .tasks import rebuild_statistics_task
+
+    transaction.on_commit(partial(rebuild_statistics_task.delay, [model._meta.label]))
+
+
+# set based changes [no signals]
+
+
+def complete_reservations(ids):
+    """status of the reservations -> completed; runs before the update, previous statuses are read from the rows"""
+    summary = ReservationSummary._meta.db_table
+    moved = ", ".join(f"{field} = summary.{field} - moved.{field}" for field in ("not_confirmed", "confirmed"))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            UPDATE {summary} AS summary
+            SET completed = summary.completed + moved.not_confirmed + moved.confirmed, {moved}
+            FROM (
+                SELECT
+                    COALESCE(EXTRACT(MONTH FROM start_date), 0) AS month, house_id, customer_profile_id,
+                    COUNT(*) FILTER (WHERE status = %(not_confirmed)s) AS not_confirmed,
+                    COUNT(*) FILTER (WHERE status = %(confirmed)s) AS confirmed
+                FROM {Reservation._meta.db_table}
+                WHERE id = ANY(%(ids)s) AND status IN (%(not_confirmed)s, %(confirmed)s)
+                GROUP BY 1, 2, 3
+            ) AS moved
+            WHERE summary.month = moved.month
+                AND summary.house_id = moved.house_id
+                AND summary.customer_profile_id = moved.customer_profile_id
+            """,
+            {"ids": list(ids), "not_confirmed": Reservation.NOT_CONFIRMED, "confirmed": Reservation.CONFIRMED},
+        )
+
+
+def add_customers(transitions):
+    """[(joined month, previous status, new status)] of profiles updated without save() -> moved in CustomerSummary"""
+    changes = Counter()
+    for month, previous, status in transitions:
+        changes[(month, previous)] -= 1
+        changes[(month, status)] += 1
+    # decrements first -> an increment never waits for a row its own decrement would create
+    for (month, status), change in sorted(changes.items(), key=lambda item: item[1]):
+        if change:
+            add(
+                CustomerSummary, {"month": month, "status": status}, {"customers": abs(change)}, -1 if change < 0 else 1
+            )
+
+
+# rebuilt from scratch
+
+
+def source_rows():
+    """summary model -> rows [key and values] recomputed from the source tables"""
+    length = ExtractDay(F("end_date") - F("start_date"))
+    reservations = (
+        Reservation.objects.annotate(month=Coalesce(ExtractMonth("start_date"), 0), length=Coalesce(length, 0))
+        .values("month", "house_id", "customer_profile_id")
+        .annotate(
+            reservations=Count("id"),
+            **{field: Count("id", filter=Q(status=status)) for status, field in RESERVATION_STATUSES.items()},
+            revenue=Coalesce(Sum("total_price"), 0),
+            nights=Sum("length"),
+            longest=Max("length"),
+        )
+        .order_by()
+    )
+    opinions = (
+        Opinion.objects.annotate(month=ExtractMonth("provided_on"), body=Length("main_text"))
+        .values("month", "author_id")
+        .annotate(
+            opinions=Count("id"),
+            with_image=Count("id", filter=~Q(image="")),
+            rated=Count("rating"),
+            rating_total=Coalesce(Sum("rating"), 0),
+            longest_body=Coalesce(Max("body"), 0),
+        )
+        .order_by()
+    )
+    customers = (
+        CustomerProfile.objects.annotate(month=ExtractMonth("joined"))
+        .values("month", "status")
+        .annotate(customers=Count("id"))
+        .order_by()
+    )
+    users = MyCustomUser.objects.aggregate(
+        admin_users=Count("id", filter=Q(is_admin=True)), normal_users=Count("id", filter=Q(is_admin=False))
+    )
+    counters = {**users, "order_confirmations": ReservationConfrimation.objects.count()}
+    return {
+        ReservationSummary: list(reservations),
+        OpinionSummary: list(opinions),
+        CustomerSummary: list(customers),
+        StatisticsCounter: [{"name": name, "value": value} for name, value in counters.items()],
+    }
+
+
+SUMMARIES = {
+    "bookings.Reservation": ReservationSummary,
+    "bookings.Opinion": OpinionSummary,
+    "bookings.CustomerProfile": CustomerSummary,
+    "accounts.MyCustomUser": StatisticsCounter,
+    "bookings.ReservationConfrimation": StatisticsCounter,
+}
+
+
+def rebuild(labels=None):
+    """
+    summaries of the models [labels, all when None] recomputed from the source tables -> number of summary rows
+    - the summary tables are locked first: increments of transactions which are not committed yet wait for the
+      rebuild and are added on top of it, committed ones are part of what it reads
+    """
+    summaries = set(SUMMARIES.values()) if labels is None else {SUMMARIES[label] for label in labels}
+    if not summaries:
+        return 0
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            tables = ", ".join(model._meta.db_table for model in summaries)
+            cursor.execute(f"LOCK TABLE {tables} IN SHARE ROW EXCLUSIVE MODE")
+            rows = source_rows()
+            for model in summaries:
+                # plain DELETE -> the rows are not loaded to send delete signals
+                cursor.execute(f"DELETE FROM {model._meta.db_table}")
+                model.objects.bulk_create(model(**row) for row in rows[model])
+    return sum(len(rows[model]) for model in summaries)
+
+
+def _month_name(month_number):
+    return date(2020, month_number, 1).strftime("%B")
+
+
+def _average(total, count, places=2):
+    """total / count rounded half up as postgres ROUND does, None without rows"""
+    if not count:
+        return None
+    return float((Decimal(total) / Decimal(count)).quantize(Decimal(1).scaleb(-places), rounding=ROUND_HALF_UP))
+
+
+def _counters():
+    return dict(StatisticsCounter.objects.values_list("name", "value"))
+
+
+def _reservations():
+    return ReservationSummary.objects.filter(reservations__gt=0)
+
+
+def _customer_repr(first_name, surname, user_id):
+    # same format as CustomerProfile.profile_user_repr -> Max Biaggi [ID:1]
+    return f"{first_name} {surname} [ID:{user_id}]"
+
+
+_CUSTOMER = ("customer_profile__first_name", "customer_profile__surname", "customer_profile__user_id")
+
+
+# users
+
+
+@section("users")
+def user_types():
+    counters = _counters()
+    return {"user_types": {"admin": counters.get("admin_users", 0), "normal_user": counters.get("normal_users", 0)}}
+
+
+@section("users")
+def joined_on_month():
+    months = (
+        CustomerSummary.objects.filter(customers__gt=0)
+        .values_list("month")
+        .annotate(count=Sum("customers"))
+        .order_by("month")
+    )
+    return {"joined_on_month": {_month_name(month): count for month, count in months}}
+
+
+@section("users")
+def customer_statuses():
+    statuses = dict(CustomerSummary.objects.values_list("status").annotate(count=Sum("customers")).order_by())
+    return {
+        "customer_statuses": {
+            "new_customers": statuses.get(CustomerProfile.NEW_CUSTOMER, 0),
+            "regular_customers": statuses.get(CustomerProfile.REGULAR, 0),
+            "super": statuses.get(CustomerProfile.SUPER, 0),
+        }
+    }
+
+
+@section("users")
+def users_generated_revenue():
+    """
+    revenue generated by each customer [highest first] + completed visits of each customer in each house
+    -> one query grouped by customer and house, both dicts built from its rows
+    """
+    rows = (
+        _reservations()
+        .values_list("customer_profile_id", *_CUSTOMER, "house")
+        .annotate(revenue=Sum("revenue"), visits=Sum("completed"))
+        .order_by("customer_profile__user_id", "customer_profile_id", "house")
+    )
+
+    revenue = {}
+    favorite_houses = {}
+    for _, first_name, surname, user_id, house, house_revenue, visits in rows:
+        customer = _customer_repr(first_name, surname, user_id)
+        revenue[customer] = revenue.get(customer, 0) + house_revenue
+        if visits:
+            favorite_houses.setdefault(f"{first_name} {surname} [{user_id}]", {})[house] = {"total_visits": visits}
+
+    return {
+        "users_generated_revenue": dict(sorted(revenue.items(), key=lambda item: item[1], reverse=True)),
+        "favorite_houses": favorite_houses,
+    }
+
+
+# reservations
+
+
+@section("reservations")
+def reservation_lengths():
+    # average [whole days] and longest stay of the reservations with dates
+    lengths = (
+        _reservations()
+        .filter(month__gt=0)
+        .aggregate(reservations=Sum("reservations"), nights=Sum("nights"), longest=Max("longest"))
+    )
+    return {
+        "average_reservation_length": lengths["nights"] // lengths["reservations"] if lengths["reservations"] else None,
+        "max_length": lengths["longest"],
+    }
+
+
+@section("reservations")
+def users_reservations():
+    # customers with at least one reservation and the number of their reservations, most first
+    rows = (
+        _reservations()
+        .values_list("customer_profile_id", *_CUSTOMER)
+        .annotate(count=Sum("reservations"))
+        .order_by("-count")
+    )
+    return {"users_reservations": {_customer_repr(*customer): count for _, *customer, count in rows}}
+
+
+@section("reservations")
+def longest_reservation_per_user():
+    rows = (
+        _reservations()
+        .filter(month__gt=0)
+        .values_list("customer_profile_id", *_CUSTOMER)
+        .annotate(longest=Max("longest"))
+        .order_by("longest")
+    )
+    return {"longest_reservation_per_user": {_customer_repr(*customer): longest for _, *customer, longest in rows}}
+
+
+@section("reservations")
+def total_reservations():
+    # cancelled reservations have no dates -> month 0
+    return {
+        "total_reservations": ReservationSummary.objects.aggregate(
+            cancelled_count=Coalesce(Sum("reservations", filter=Q(month=0)), 0),
+            not_cancelled_count=Coalesce(Sum("reservations", filter=Q(month__gt=0)), 0),
+            total=Coalesce(Sum("reservations"), 0),
+        )
+    }
+
+
+@section("reservations")
+def reservations_statuses():
+    return {
+        "reservations_statuses": ReservationSummary.objects.aggregate(
+            **{field: Coalesce(Sum(field), 0) for field in ("confirmed", "not_confirmed", "cancelled", "completed")}
+        )
+    }
+
+
+@section("reservations")
+def number_of_order_confirmations():
+    return {"number_of_order_confirmations": _counters().get("order_confirmations", 0)}
+
+
+@section("reservations")
+def reservations_monthly():
+    months = (
+        _reservations()
+        .filter(month__gt=0)
+        .values_list("month")
+        .annotate(
+            count=Sum("reservations"),
+            revenue=Sum("revenue"),
+            nights=Sum("nights"),
+            customers=Count("customer_profile", distinct=True),
+            longest=Max("longest"),
+        )
+        .order_by("month")
+    )
+
+    monthly = {}
+    for month, count, revenue, nights, customers, longest in months:
+        monthly[_month_name(month)] = {
+            "count": count,
+            "monthly_revenue": revenue,
+            "average_stay_days": nights // count,
+            "longest_stay": longest,
+            "unique_customers": customers,
+        }
+    return {"reservations_monthly": monthly}
+
+
+# opinions
+
+
+@section("opinions")
+def opinions_details():
+    # total number of opinions / share of opinions with an image / longest body / average rating
+    totals = OpinionSummary.objects.filter(opinions__gt=0).aggregate(
+        opinions=Sum("opinions"),
+        with_image=Sum("with_image"),
+        rated=Sum("rated"),
+        rating_total=Sum("rating_total"),
+        longest_body=Max("longest_body"),
+    )
+    return {
+        "number_of_opinions": totals["opinions"] or 0,
+        "img_per_opinion": _average(totals["with_image"], totals["opinions"]),
+        "longest_body": totals["longest_body"],
+        "avg_rating": _average(totals["rating_total"], totals["rated"]),
+    }
+
+
+@section("opinions")
+def opinions_per_month():
+    months = (
+        OpinionSummary.objects.filter(opinions__gt=0)
+        .values_list("month")
+        .annotate(count=Sum("opinions"), with_image=Sum("with_image"))
+        .order_by("month")
+    )
+    return {
+        "opinions_per_month": {
+            _month_name(month): {"count": count, "image_per_opinion": _average(with_image, count)}
+            for month, count, with_image in months
+        }
+    }
+
+
+@section("opinions")
+def user_opinions_count():
+    # number of opinions and average rating per author [full name]
+    authors = (
+        OpinionSummary.objects.filter(opinions__gt=0)
+        .annotate(full_name=Concat("author__name", Value(" "), "author__surname"))
+        .values_list("full_name")
+        .annotate(count=Sum("opinions"), rated=Sum("rated"), rating_total=Sum("rating_total"))
+        .order_by("-count")
+    )
+    return {
+        "user_opinions_count": {
+            full_name: {"count": count, "average_rating": _average(rating_total, rated)}
+            for full_name, count, rated, rating_total in authors
+        }
+    }
+
+
+# challet houses
+
+
+def _houses(**annotations):
+    return ChalletHouse.objects.values("house_number").annotate(**annotations).order_by("house_number")
+
+
+@section("challet_houses")
+def total_reservations_house():
+    reservations = Coalesce(Sum("reservation_summaries__reservations"), 0)
+    return {"total_reservations_house": _houses(number_of_reservations=reservations)}
+
+
+@section("challet_houses")
+def reservations_per_house_monthly():
+    # number of reservations per month of arrival for each of the houses
+    rows = _reservations().values_list("house", "month").annotate(count=Sum("reservations")).order_by("house", "month")
+
+    per_house = {}
+    for house_number, month, count in rows:
+        month = _month_name(month) if month else "Cancelled"
+        per_house.setdefault(house_number, {})[month] = {"reservations": count}
+    return {"reservations_per_house_monthly": per_house}
+
+
+@section("challet_houses")
+def total_revenue_house():
+    revenue = Sum("reservation_summaries__revenue", filter=Q(reservation_summaries__reservations__gt=0))
+    return {"total_revenue_house": _houses(total_revenue=revenue)}
@@ -3,10 +3,9 @@ from datetime import date, timedelta
 from celery import shared_task
 from celery.utils.log import get_task_logger
 from django.conf import settings
-from django.core.mail import EmailMessage, send_mail
 
-from bookings import auxiliary
-from bookings.models import CustomerProfile, Reservation, ReservationConfrimation
+from bookings import auxiliary, outbox, statistics
+from bookings.models import CustomerProfile, ReservationConfrimation
 
 logger = get_task_logger(__name__)
 
@@ -16,15 +15,17 @@ def run_profile_reservation_updates():
     end_date = date.today()
     customer_hierarchy = CustomerProfile.hierarchy
     # excluding 9 - cancelled, 99 completed. Not confirmed are ok - we are not demanding users to confirm
-    all_current_reservations = (
-        Reservation.objects.filter(end_date__lte=end_date)
-        .exclude(status__in=[9, 99])
-        .select_related("customer_profile")
-    )
+    report = auxiliary.complete_past_reservations(end_date, customer_hierarchy)
+
+    logger.info(f"{run_profile_reservation_updates.__name__} just ran. {report}")
 
-    auxiliary.update_reservation_customerprofile(all_current_reservations, customer_hierarchy, end_date=end_date)
 
-    logger.info(f"{run_profile_reservation_updates.__name__} just ran.")
+@shared_task
+def rebuild_statistics_task(labels, *args, **kwargs):
+    """recomputes the statistics summaries of the models [labels] from scratch -> changes the signals could not follow"""
+    statistics.rebuild(labels)
+
+    logger.info(f"{rebuild_statistics_task.__name__} just ran. Summaries of {', '.join(labels) or 'no models'} rebuilt")
 
 
 @shared_task
@@ -55,31 +56,65 @@ def send_email_notification_reservation(data_celery, new_reservation_number, *ar
     email: {email}
     """
 
-    send_mail(
-        subject=subject,
-        message=message,
-        from_email=settings.EMAIL_HOST_USER,
-        recipient_list=[settings.NOTIFICATION_EMAIL],
-        fail_silently=False,
-    )
+    # sent by flush_outgoing_emails_task together with other messages
+    outbox.enqueue(subject, message, to=[settings.NOTIFICATION_EMAIL])
 
     logger.info(f"{send_email_notification_reservation.__name__} just ran")
 
 
+@shared_task
+def render_confirmation_task(id, *args, **kwargs):
+    """
+    renders the pdf confirmation outside of the request; chained with send_order_confirmation_task [signals.py]
+    - returns the id of the confirmation to be sent or None if the pdf content did not change -> nothing new to send
+    """
+    instance = ReservationConfrimation.objects.select_related(
+        "reservation__house", "reservation__reservation_owner"
+    ).get(id=id)
+
+    if not instance.render():
+        logger.info(f"{render_confirmation_task.__name__} just ran. Confirmation {id} unchanged")
+        return None
+
+    # update instead of save -> post_save would schedule the rendering again
+    ReservationConfrimation.objects.filter(id=id).update(
+        saved_file=instance.saved_file.name, content_hash=instance.content_hash
+    )
+    logger.info(f"{render_confirmation_task.__name__} just ran. Confirmation {id} rendered")
+    return id
+
+
 @shared_task
 def send_order_confirmation_task(id, *args, **kwargs):
 
-    instance = ReservationConfrimation.objects.get(id=id)
+    if id is None:
+        return  # pdf not rendered again [render_confirmation_task]
 
-    file = instance.saved_file
-    content = file.read()
+    instance = ReservationConfrimation.objects.select_related("reservation__reservation_owner").get(id=id)
 
     subject = f"Reservation confirmation {instance.reservation.reservation_number}"
     body = "See attached your reservation confirmation"
-    from_email = settings.EMAIL_HOST_USER
 
-    email = EmailMessage(subject, body, from_email, to=[instance.reservation.reservation_owner.email])
-    email.attach(file.name, content, "application/pdf")
-    email.send(fail_silently=False)
+    outbox.enqueue(
+        subject,
+        body,
+        to=[instance.reservation.reservation_owner.email],
+        attachment=instance.saved_file.name,
+        mimetype="application/pdf",
+    )
 
     logger.info(f"{send_order_confirmation_task.__name__} just ran")
+
+
+@shared_task
+def flush_outgoing_emails_task(*args, **kwargs):
+    """sends everything waiting in the outbox [bookings/outbox.py] -> batch after batch, one smtp connection each"""
+    total = {"sent": 0, "retried": 0, "failed": 0}
+    while True:
+        report = outbox.flush()
+        for key, value in report.items():
+            total[key] += value
+        if sum(report.values()) < outbox.BATCH_SIZE:
+            break
+
+    logger.info(f"{flush_outgoing_emails_task.__name__} just ran. {total}")
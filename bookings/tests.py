@@ -1,24 +1,61 @@
 import datetime
 import io
+import json
 import os
 import shutil
+import smtplib
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, timedelta
 from unittest import mock
 
 from accounts.models import MyCustomUser
+from asgiref.sync import sync_to_async
+from core_project import instrumentation, metrics
 from django.conf import settings
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import IntegrityError, connection, transaction
 from django.db.models import Count, Q, Sum
-from django.test import TestCase
-from django.test.utils import override_settings
+from django.test import AsyncClient, SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext, override_settings
 from django.urls import reverse
+from django.utils import timezone
 from PIL import Image
+from prometheus_client import REGISTRY
+from redis.client import Pipeline
 from rest_framework import status
 from rest_framework.parsers import JSONParser
-from rest_framework.test import APIClient, APITestCase
-
-from bookings.models import ChalletHouse, CustomerProfile, Opinion, Reservation, Suggestion
-from bookings.tasks import run_profile_reservation_updates, send_email_notification_reservation
+from rest_framework.response import Response
+from rest_framework.test import APIClient, APIRequestFactory, APITestCase, force_authenticate
+from rest_framework.views import APIView
+
+from bookings import auxiliary, outbox, response_cache, statistics, throttling
+from bookings.models import (
+    ChalletHouse,
+    CustomerProfile,
+    HouseOccupancy,
+    Opinion,
+    OutgoingEmail,
+    Reservation,
+    ReservationConfrimation,
+    ReservationSummary,
+    Suggestion,
+)
+from bookings.tasks import (
+    rebuild_statistics_task,
+    render_confirmation_task,
+    run_profile_reservation_updates,
+    send_email_notification_reservation,
+    send_order_confirmation_task,
+)
 from bookings.utils import my_date
+from bookings.utils.bitmap import OccupancyBitmap
+from bookings.utils.intervals import DateIntervalSet
 
 from .filters import HouseFilter, OpinionFilter, ReservationFilter
 
@@ -512,6 +549,133 @@ class CustomerChalletHousesAPITest(APITestCase):
         self.assertEqual(new_reservation.end_date, data.get("end_date"))
         self.assertEqual(new_reservation.house.house_number, data.get("house"))
 
+    def test_reservation_create_view_fills_gap_between_stays(self):
+        """departure days of the surrounding reservations [8th and 10th Nov] are free for arrival/departure"""
+        self.client.force_authenticate(self.testuser)
+        url = reverse("bookings:reservation_create")
+
+        data = {"start_date": date(2022, 11, 8), "end_date": date(2022, 11, 10), "house": 1}
+        response = self.client.post(url, data=data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        data = {"start_date": date(2022, 11, 14), "end_date": date(2022, 11, 16), "house": 1}
+        response = self.client.post(url, data=data)
+        self.assertEqual(response.status_code, status.HTTP_406_NOT_ACCEPTABLE)
+
+    def test_house_availability_view(self):
+        url = reverse("bookings:house_availability", kwargs={"pk": self.house_nb_1.house_number})
+
+        response = self.client.get(url, {"from": "2022-11-05", "to": "2022-11-12"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["free_nights"], [date(2022, 11, 5), date(2022, 11, 8), date(2022, 11, 9)])
+        self.assertEqual(
+            response.data["already_reserved_nights"],
+            [date(2022, 11, 6), date(2022, 11, 7), date(2022, 11, 10), date(2022, 11, 11)],
+        )
+
+        # default range -> next 30 nights
+        response = self.client.get(url)
+        self.assertEqual(len(response.data["free_nights"] + response.data["already_reserved_nights"]), 30)
+
+        response = self.client.get(url, {"from": "2022-11-12", "to": "2022-11-05"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(url, {"from": "2022-11-05", "to": "2024-11-05"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(reverse("bookings:house_availability", kwargs={"pk": 3}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_house_occupancy_follows_reservation_changes(self):
+        """cancellation releases nights, changed dates release the old ones and take the new ones"""
+        occupancy = HouseOccupancy.objects.get(house=self.house_nb_1, year=2022).as_bitmap()
+        self.assertEqual(len(list(occupancy.taken_nights())), self.return_all_nights())
+
+        self.client.force_authenticate(self.testuser)
+        url = reverse("bookings:reservation_detail", kwargs={"pk": self.first_reservation.id})
+        response = self.client.put(url, data={"status": 9})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        occupancy = HouseOccupancy.objects.get(house=self.house_nb_1, year=2022).as_bitmap()
+        self.assertFalse(occupancy.is_taken(date(2022, 11, 6)))
+        self.assertTrue(occupancy.is_taken(date(2022, 11, 10)))
+
+        # new year's eve stay -> two rows
+        self.last_reservation.start_date = date(2022, 12, 30)
+        self.last_reservation.end_date = date(2023, 1, 2)
+        self.last_reservation.save()
+        occupancy_2022 = HouseOccupancy.objects.get(house=self.house_nb_1, year=2022).as_bitmap()
+        occupancy_2023 = HouseOccupancy.objects.get(house=self.house_nb_1, year=2023).as_bitmap()
+        self.assertEqual(list(occupancy_2022.taken_nights()), [date(2022, 12, 30), date(2022, 12, 31)])
+        self.assertEqual(list(occupancy_2023.taken_nights()), [date(2023, 1, 1)])
+
+        # incremental updates end up the same as recomputing everything
+        HouseOccupancy.rebuild(self.house_nb_1.house_number)
+        self.assertEqual(
+            HouseOccupancy.objects.get(house=self.house_nb_1, year=2022).as_bitmap().to_bytes(),
+            occupancy_2022.to_bytes(),
+        )
+
+        self.last_reservation.delete()
+        occupancy_2023 = HouseOccupancy.objects.get(house=self.house_nb_1, year=2023).as_bitmap()
+        self.assertEqual(list(occupancy_2023.taken_nights()), [])
+
+        # loaded without the dates -> the nights of the row are released all the same
+        stay = Reservation.objects.create(
+            customer_profile=self.testuser.customerprofile,
+            reservation_owner=self.testuser,
+            house=self.house_nb_1,
+            start_date=date(2022, 11, 20),
+            end_date=date(2022, 11, 22),
+        )
+        reservation = Reservation.objects.only("id", "status").get(id=stay.id)
+        # cancelled as the detail serializer does it -> no dates
+        reservation.status, reservation.start_date, reservation.end_date = Reservation.CANCELLED, None, None
+        reservation.save(status_change=True)
+        occupancy = HouseOccupancy.objects.get(house=self.house_nb_1, year=2022).as_bitmap()
+        self.assertEqual(list(occupancy.taken_nights()), [])
+
+    def test_reservations_export(self):
+        url = reverse("bookings:reservations_export")
+        self.client.force_authenticate(self.testuser)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(self.admin_user)
+        response = self.client.get(url, HTTP_ACCEPT="text/csv")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "text/csv")
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(",")[:3], ["reservation_number", "house", "status"])
+        self.assertEqual(len(lines), Reservation.objects.count() + 1)
+        self.assertEqual(
+            lines[1],
+            f"{self.first_reservation.reservation_number},1,0,2022-11-06,2022-11-08,2,700,testname,testsurname,"
+            f"test@gmail.com,{self.first_reservation.created_at}",
+        )
+
+        # same filters as the reservation list
+        response = self.client.get(url, {"output": "jsonl", "start_date__gte": "2022-11-09"})
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row["reservation_number"] for row in rows], [self.last_reservation.reservation_number])
+        self.assertEqual(rows[0]["email"], self.testuser2.email)
+
+        self.assertEqual(self.client.get(url, {"output": "xml"}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(url, {"start_date__gte": "tomorrow"}).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_reservations_export_in_keyset_chunks(self):
+        """no server side cursors [pgbouncer] -> the same export, one query per chunk"""
+        url = reverse("bookings:reservations_export")
+        self.client.force_authenticate(self.admin_user)
+        expected = b"".join(self.client.get(url).streaming_content)
+
+        with mock.patch.dict(connection.settings_dict, {"DISABLE_SERVER_SIDE_CURSORS": True}), mock.patch(
+            "bookings.views_api.ReservationExportView.chunk_size", 1
+        ):
+            response = self.client.get(url)
+            with CaptureQueriesContext(connection) as captured:
+                exported = b"".join(response.streaming_content)
+        self.assertEqual(exported, expected)
+        self.assertEqual(len(captured), Reservation.objects.count() + 1)  # + the empty chunk at the end
+
     def test_reservation_list_view(self):
         """
         reservation list requires users to be logged in and adjusts the content:
@@ -643,16 +807,77 @@ class CustomerChalletHousesAPITest(APITestCase):
         self.client.force_authenticate(self.admin_user)
         url = reverse("bookings:past_reservations")
         response = self.client.get(url)
-        self.assertEqual(len(response.data), Reservation.objects.count())
+        self.assertEqual(len(response.data["results"]), Reservation.objects.count())
         self.client.logout()
 
         self.client.login(email="test@gmail.com", password="adminadmin1")
 
         # user sees only his past reservations
         response_2 = self.client.get(url)
-        self.assertEqual(len(response_2.data), len(Reservation.objects.filter(reservation_owner=self.testuser)))
+        self.assertEqual(
+            len(response_2.data["results"]), len(Reservation.objects.filter(reservation_owner=self.testuser))
+        )
         self.client.force_authenticate(user=None)
 
+    @mock.patch("bookings.utils.my_date.today")
+    def test_past_reservations_keyset_pagination(self, d):
+        """
+        pages follow (end_date, id) descending with cancelled reservations [no dates] at the end;
+        walking next links and then previous links back returns every reservation exactly once
+        """
+        my_date.today.return_value = date(2023, 1, 1)
+        house_nb_2 = ChalletHouse.objects.create(price_night=200, house_number=2)
+        for user, start in [(self.testuser, date(2022, 11, 10)), (self.testuser2, date(2022, 12, 1))]:
+            # same end date as the last reservation on the other house -> ties broken by id
+            Reservation.objects.create(
+                customer_profile=user.customerprofile,
+                reservation_owner=user,
+                house=house_nb_2,
+                start_date=start,
+                end_date=start + timedelta(days=5) if start.month == 11 else date(2022, 12, 3),
+            )
+        self.client.force_authenticate(self.admin_user)
+        self.client.put(
+            reverse("bookings:reservation_detail", kwargs={"pk": self.first_reservation.id}), data={"status": 9}
+        )
+        Reservation.objects.create(  # future one -> not listed
+            customer_profile=self.testuser.customerprofile,
+            reservation_owner=self.testuser,
+            house=house_nb_2,
+            start_date=date(2023, 2, 1),
+            end_date=date(2023, 2, 3),
+        )
+
+        past = Reservation.objects.filter(Q(end_date__lt=date(2023, 1, 1)) | Q(end_date=None))
+        expected = [
+            r.reservation_number
+            for r in sorted(past, key=lambda r: (r.end_date is not None, r.end_date or date.min, r.id), reverse=True)
+        ]
+        self.assertEqual(expected[-1], self.first_reservation.reservation_number)
+
+        url = reverse("bookings:past_reservations") + "?user_page_size=1"
+        seen, previous_pages = [], []
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertLessEqual(len(queries), 2)  # second one only when a page reaches cancelled reservations
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            seen.extend(r["reservation_number"] for r in response.data["results"])
+            previous_pages.append(response.data["previous"])
+            url = response.data["next"]
+        self.assertEqual(seen, expected)
+
+        # and back to the first page
+        url, seen_backwards = previous_pages[-1], []
+        while url:
+            response = self.client.get(url)
+            seen_backwards[:0] = [r["reservation_number"] for r in response.data["results"]]
+            url = response.data["previous"]
+        self.assertEqual(seen_backwards, expected[:-1])
+
+        response = self.client.get(reverse("bookings:past_reservations"), {"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
 
 class FiltersTestingAPI(APITestCase):
     @classmethod
@@ -1005,6 +1230,66 @@ class ReservationsCustomerProfileUpdate(APITestCase):
 
         self.assertEqual(profile.status, "R")
 
+    def test_complete_past_reservations_batches_and_dry_run(self):
+        """statements per batch do not depend on its size; dry run reports the same numbers and changes nothing"""
+        profile = self.testuser.customerprofile
+        start_date = date.today() + timedelta(40)
+        for i in range(10):
+            Reservation.objects.create(
+                customer_profile=profile,
+                reservation_owner=self.testuser,
+                house=self.house_nb_1,
+                start_date=start_date + timedelta(i),
+                end_date=start_date + timedelta(i + 1),
+            )
+        end_date = date.today() + timedelta(60)
+        hierarchy = CustomerProfile.hierarchy
+
+        dry_run = auxiliary.complete_past_reservations(end_date, hierarchy, batch_size=5, dry_run=True)
+        profile.refresh_from_db()
+        self.assertEqual((profile.total_visits, profile.status), (0, "N"))
+        self.assertFalse(Reservation.objects.filter(status=99).exists())
+
+        progress = []
+        # savepoint + (select ids, statistics summaries, update reservations, update visits) per batch
+        # + last empty select + promotion
+        # + profile moved between statistics summaries [decrement, first row of the status: update, insert, update]
+        # transitions come with the statements -> audit log adds no queries, records written after commit
+        # + tokens of promoted users looked up after commit [dropped from the token cache]
+        with self.assertNumQueries(2 + 3 * 4 + 1 + 1 + 4 + 1), self.assertLogs("audit") as logs:
+            with self.captureOnCommitCallbacks(execute=True):
+                report = auxiliary.complete_past_reservations(
+                    end_date, hierarchy, batch_size=5, progress=lambda *args: progress.append(args)
+                )
+        self.assertEqual(progress, [(1, 5), (2, 10), (3, 13)])
+        transitions = [r.data for r in logs.records if r.getMessage() == "status_transition"]
+        self.assertEqual(
+            [(t["model"], t["to"], len(t["ids"])) for t in transitions][-2:],
+            [
+                ("bookings.Reservation", 99, 3),
+                ("bookings.CustomerProfile", "S", 1),
+            ],
+        )
+        self.assertEqual(sum(len(t["ids"]) for t in transitions if t["to"] == 99), 13)
+        self.assertEqual(transitions[-1]["ids"], [profile.id])
+        self.assertEqual(transitions[-1]["previous"], ["N"])
+        self.assertEqual(report["completed"], 13)  # 10 + reservations 1, 2 and 4
+        self.assertEqual(report["promoted"], 1)
+        self.assertEqual(
+            {key: value for key, value in dry_run.items() if key not in ("seconds", "dry_run")},
+            {key: value for key, value in report.items() if key not in ("seconds", "dry_run")},
+        )
+
+        profile.refresh_from_db()
+        self.assertEqual((profile.total_visits, profile.status), (13, "S"))
+        self.assertEqual(Reservation.objects.filter(status=99).count(), 13)
+        # statistics summaries moved along with the updates
+        call_command("check_statistics", stdout=io.StringIO())
+
+        # nothing left to complete; audit log switched off -> nothing is collected or logged
+        with override_settings(AUDIT_LOG_ENABLED=False), self.assertNoLogs("audit"):
+            self.assertEqual(auxiliary.complete_past_reservations(end_date, hierarchy)["completed"], 0)
+
 
 class EmailAutoSendReservationCreate(APITestCase):
     @classmethod
@@ -1018,8 +1303,7 @@ class EmailAutoSendReservationCreate(APITestCase):
             password="adminadmin1",
         )
 
-    @mock.patch("bookings.tasks.send_mail")
-    def test_reservation_creation(self, mail):
+    def test_reservation_creation(self):
         reservation_1 = Reservation.objects.create(
             customer_profile=self.testuser.customerprofile,
             reservation_owner=self.testuser,
@@ -1037,9 +1321,42 @@ class EmailAutoSendReservationCreate(APITestCase):
         }
 
         send_email_notification_reservation(data_clery, reservation_1.reservation_number)
-        assert mail.called is True
+        # written to the outbox, sent by the flusher
+        self.assertEqual(OutgoingEmail.objects.filter(subject__contains=reservation_1.reservation_number).count(), 1)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(outbox.flush(), {"sent": 1, "retried": 0, "failed": 0})
+        self.assertEqual(mail.outbox[0].to, [settings.NOTIFICATION_EMAIL])
+
+    @mock.patch("bookings.signals.chain")
+    @mock.patch("bookings.signals.send_email_notification_reservation.delay")
+    def test_reservation_created_with_single_write(self, notification, chain):
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            reservation = Reservation.objects.create(
+                customer_profile=self.testuser.customerprofile,
+                reservation_owner=self.testuser,
+                house=self.house_nb_1,
+                start_date=date.today() + timedelta(20),
+                end_date=date.today() + timedelta(22),
+            )
 
-    @mock.patch("bookings.tasks.auxiliary.update_reservation_customerprofile")
+        # id from the sequence -> reservation number is part of the only write to the reservation table
+        writes = [
+            q["sql"].split(" (")[0] for q in queries.captured_queries if q["sql"].startswith(("INSERT", "UPDATE"))
+        ]
+        self.assertEqual(writes.count('INSERT INTO "bookings_reservation"'), 1)
+        self.assertEqual(writes.count('INSERT INTO "bookings_reservationconfrimation"'), 1)
+        self.assertFalse([w for w in writes if w.startswith('UPDATE "bookings_reservation" ')])
+        self.assertEqual(reservation.reservation_number, date.today().strftime("%Y%m%d") + str(reservation.id))
+        self.assertEqual(Reservation.objects.get(id=reservation.id).reservation_number, reservation.reservation_number)
+
+        # reservation + confirmation, occupancy bitmap [lock, insert, update]
+        # + statistics: first summary row of the customer [update, insert, update], confirmations counter
+        self.assertEqual(len(queries), 14)
+        notification.assert_called_once()
+        self.assertEqual(notification.call_args[0][1], reservation.reservation_number)
+        chain.return_value.apply_async.assert_called_once()
+
+    @mock.patch("bookings.tasks.auxiliary.complete_past_reservations")
     def test_customer_profile_creation(self, mail):
         reservation_2 = Reservation.objects.create(
             customer_profile=self.testuser.customerprofile,
@@ -1053,6 +1370,826 @@ class EmailAutoSendReservationCreate(APITestCase):
         assert mail.called is True
         self.assertEqual(len(mail.call_args[0]), 2)
 
+    @mock.patch("bookings.signals.chain")
+    def test_confirmation_rendered_by_task_and_deduplicated(self, chain):
+        with self.captureOnCommitCallbacks(execute=True):
+            reservation = Reservation.objects.create(
+                customer_profile=self.testuser.customerprofile,
+                reservation_owner=self.testuser,
+                house=self.house_nb_1,
+                start_date=date.today() + timedelta(10),
+                end_date=date.today() + timedelta(12),
+            )
+        confirmation = ReservationConfrimation.objects.get(reservation=reservation)
+
+        # nothing rendered in the request, render + send scheduled after commit
+        self.assertFalse(confirmation.saved_file)
+        chain.assert_called_once_with(render_confirmation_task.si(confirmation.id), send_order_confirmation_task.s())
+        chain.return_value.apply_async.assert_called_once()
+
+        self.assertEqual(render_confirmation_task(confirmation.id), confirmation.id)
+        confirmation.refresh_from_db()
+        self.assertTrue(confirmation.saved_file.name.endswith(".pdf"))
+        self.assertEqual(len(confirmation.content_hash), 64)
+
+        # same content -> no new file and nothing to send
+        self.assertIsNone(render_confirmation_task(confirmation.id))
+        send_order_confirmation_task(None)
+        self.assertEqual(len(mail.outbox), 0)
+
+        Reservation.objects.filter(id=reservation.id).update(status=Reservation.CONFIRMED)
+        self.assertEqual(render_confirmation_task(confirmation.id), confirmation.id)
+        send_order_confirmation_task(confirmation.id)
+        outbox.flush()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].attachments[0][2], "application/pdf")
+
+
+class OutboxFlushTest(TestCase):
+    def setUp(self):
+        for i in range(5):
+            outbox.enqueue(f"message {i}", "body", to=[f"user{i}@example.com"])
+
+    def test_batch_sent_over_one_connection(self):
+        connection = mock.MagicMock()
+        connection.send_messages.return_value = 1
+
+        self.assertEqual(outbox.flush(batch_size=3, connection=connection), {"sent": 3, "retried": 0, "failed": 0})
+        connection.open.assert_called_once()
+        connection.close.assert_called_once()
+        self.assertEqual(connection.send_messages.call_count, 3)
+
+        # locmem backend by default
+        self.assertEqual(outbox.flush(), {"sent": 2, "retried": 0, "failed": 0})
+        self.assertEqual([m.subject for m in mail.outbox], ["message 3", "message 4"])
+        self.assertEqual(outbox.flush(), {"sent": 0, "retried": 0, "failed": 0})
+        self.assertFalse(OutgoingEmail.objects.filter(status=OutgoingEmail.PENDING).exists())
+
+    def test_failed_message_retried_with_backoff(self):
+        connection = mock.MagicMock()
+        # second message rejected, the rest of the batch is sent anyway
+        connection.send_messages.side_effect = [1, smtplib.SMTPRecipientsRefused({}), 1, 1, 1]
+
+        self.assertEqual(outbox.flush(connection=connection), {"sent": 4, "retried": 1, "failed": 0})
+        failed = OutgoingEmail.objects.get(subject="message 1")
+        self.assertEqual((failed.status, failed.attempts), (OutgoingEmail.PENDING, 1))
+        self.assertIn("SMTPRecipientsRefused", failed.last_error)
+        self.assertGreater(failed.send_after, timezone.now() + outbox.backoff(1) - timedelta(seconds=5))
+
+        # not due yet
+        self.assertEqual(outbox.flush(connection=connection), {"sent": 0, "retried": 0, "failed": 0})
+
+        # server down -> the whole batch waits, last attempt marks the message as failed
+        connection.open.side_effect = smtplib.SMTPConnectError(421, "unavailable")
+        OutgoingEmail.objects.filter(id=failed.id).update(send_after=timezone.now(), attempts=outbox.MAX_ATTEMPTS - 1)
+        self.assertEqual(outbox.flush(connection=connection), {"sent": 0, "retried": 0, "failed": 1})
+        self.assertEqual(OutgoingEmail.objects.get(id=failed.id).status, OutgoingEmail.FAILED)
+
+    def test_batch_claimed_before_sending(self):
+        connection = mock.MagicMock()
+        during_send = []
+
+        def send_messages(messages):
+            # claim already committed -> another flush only takes the other 4 messages
+            during_send.append(
+                (
+                    OutgoingEmail.objects.get(subject=messages[0].subject).status,
+                    outbox.flush(connection=mock.MagicMock()),
+                )
+            )
+            return 1
+
+        connection.send_messages.side_effect = send_messages
+        self.assertEqual(outbox.flush(batch_size=1, connection=connection), {"sent": 1, "retried": 0, "failed": 0})
+        self.assertEqual(during_send, [(OutgoingEmail.SENDING, {"sent": 4, "retried": 0, "failed": 0})])
+
+    def test_stale_claim_taken_again(self):
+        now = timezone.now()
+        OutgoingEmail.objects.update(status=OutgoingEmail.SENDING, claimed_at=now - timedelta(minutes=1))
+        OutgoingEmail.objects.filter(subject="message 0").update(claimed_at=now - outbox.CLAIM_TIMEOUT * 2)
+
+        self.assertEqual(outbox.flush(), {"sent": 1, "retried": 0, "failed": 0})
+        self.assertEqual([m.subject for m in mail.outbox], ["message 0"])
+        sent = OutgoingEmail.objects.get(subject="message 0")
+        self.assertEqual((sent.status, sent.claimed_at), (OutgoingEmail.SENT, None))
+
+
+class SlidingWindowThrottleTest(APITestCase):
+    def test_all_scopes_checked_in_one_round_trip(self):
+        now = [1000]
+
+        class MinuteThrottle(auxiliary.BurstRateThrottle):
+            scope = "test_minute"
+            rate = "2/minute"
+            timer = staticmethod(lambda: now[0])
+
+        class HourThrottle(auxiliary.SustainedRateThrottle):
+            scope = "test_hour"
+            rate = "3/hour"
+            timer = staticmethod(lambda: now[0])
+
+        class ThrottledView(APIView):
+            throttle_classes = [MinuteThrottle, HourThrottle]
+
+            def get(self, request):
+                return Response()
+
+        user = MyCustomUser.objects.create_user(email="t@gmail.com", name="throttled", surname="user", password=None)
+        keys = [f"throttle_test_minute_{user.pk}", f"throttle_test_hour_{user.pk}"]
+        cache.delete_many(keys)
+        self.addCleanup(cache.delete_many, keys)
+        factory = APIRequestFactory()
+
+        def get(at):
+            now[0] = at
+            request = factory.get("/")
+            force_authenticate(request, user)
+            return ThrottledView.as_view()(request)
+
+        with mock.patch("bookings.throttling.evaluate", wraps=throttling.evaluate) as evaluate:
+            self.assertEqual(get(1000).status_code, status.HTTP_200_OK)
+            self.assertEqual(get(1010).status_code, status.HTTP_200_OK)
+            # minute full; the hour still counts the request [every scope on its own, as SimpleRateThrottle]
+            response = get(1020)
+            self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+            self.assertEqual(response["Retry-After"], "40")
+            # request from 1000 dropped out of the minute, the hour is full now
+            response = get(1061)
+            self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+            self.assertEqual(response["Retry-After"], str(1000 + 3600 - 1061))
+
+        self.assertEqual(evaluate.call_count, 4)  # one script per request for both scopes
+        # refused scopes are counted for /metrics
+        self.assertEqual(REGISTRY.get_sample_value("throttle_rejections_total", {"scope": "test_minute"}), 1)
+        self.assertEqual(REGISTRY.get_sample_value("throttle_rejections_total", {"scope": "test_hour"}), 1)
+
+
+class ChalletHouseQueryCountTest(APITestCase):
+    """
+    house list/detail are served with a fixed number of queries, no matter how many houses/reservations there are
+    list: pagination count, houses, occupancy [+ reservations visible to the user]; detail: the same minus count
+    """
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.testuser = MyCustomUser.objects.create_user(
+            email="test@gmail.com",
+            name="testname",
+            surname="testsurname",
+            date_of_birth=date(1995, 10, 10),
+            password="adminadmin1",
+        )
+        cls.testuser2 = MyCustomUser.objects.create_user(
+            email="test2@gmail.com",
+            name="testname",
+            surname="testsurname",
+            date_of_birth=date(1995, 10, 10),
+            password="adminadmin1",
+        )
+        cls.admin_user = MyCustomUser.objects.create_superuser(
+            email="admin@gmail.com",
+            name="filip",
+            surname="admins",
+            date_of_birth=date(1995, 10, 10),
+            password="passwordtest123",
+        )
+        for house_number in range(1, 3):
+            cls.add_house_with_reservations(house_number)
+
+    @classmethod
+    def add_house_with_reservations(cls, house_number):
+        house = ChalletHouse.objects.create(price_night=350, house_number=house_number)
+        for week, user in enumerate([cls.testuser, cls.testuser2, cls.testuser, cls.testuser2]):
+            start = date(2022, 11, 1) + timedelta(weeks=week)
+            Reservation.objects.create(
+                customer_profile=user.customerprofile,
+                reservation_owner=user,
+                house=house,
+                start_date=start,
+                end_date=start + timedelta(days=3),
+            )
+
+    def setUp(self):
+        cache.clear()  # house list is behind the response cache
+
+    def get_with_queries(self, url, queries):
+        with self.assertNumQueries(queries):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        cache.clear()
+        return response
+
+    def test_house_list_queries(self):
+        url = reverse("bookings:challet_houses")
+        callers = [(None, 3, 0), (self.testuser, 4, 2), (self.admin_user, 4, 4)]
+
+        for houses_added in range(2):
+            for user, queries, visible_reservations in callers:
+                with self.subTest(user=str(user), houses=ChalletHouse.objects.count()):
+                    self.client.force_authenticate(user)
+                    response = self.get_with_queries(url, queries)
+                    results = response.data["results"]
+                    self.assertEqual(len(results), ChalletHouse.objects.count())
+                    for house in results:
+                        self.assertEqual(len(house["house_reservations"]), visible_reservations)
+                        self.assertEqual(len(house["already_reserved_nights"]), 12)
+
+            # more houses and reservations -> the same number of queries
+            self.add_house_with_reservations(3 + houses_added)
+
+    def test_house_detail_queries(self):
+        url = reverse("bookings:challet_house", kwargs={"pk": 1})
+        callers = [(None, 2, 0), (self.testuser2, 3, 2), (self.admin_user, 3, 4)]
+
+        for user, queries, visible_reservations in callers:
+            with self.subTest(user=str(user)):
+                self.client.force_authenticate(user)
+                response = self.get_with_queries(url, queries)
+                self.assertEqual(len(response.data["house_reservations"]), visible_reservations)
+
+        # owner sees his own reservations only
+        self.client.force_authenticate(self.testuser2)
+        response = self.client.get(url)
+        own_reservations = Reservation.objects.filter(house=1, reservation_owner=self.testuser2)
+        self.assertEqual(
+            [r["reservation_number"] for r in response.data["house_reservations"]],
+            [r.reservation_number for r in own_reservations],
+        )
+
+
+class ResponseCacheTest(APITestCase):
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.house = ChalletHouse.objects.create(price_night=350, house_number=1)
+        cls.testuser = MyCustomUser.objects.create_user(
+            email="test@gmail.com", name="testname", surname="testsurname", password="adminadmin1"
+        )
+        cls.testuser2 = MyCustomUser.objects.create_user(
+            email="test2@gmail.com", name="othername", surname="othersurname", password="adminadmin1"
+        )
+        cls.reservation = Reservation.objects.create(
+            customer_profile=cls.testuser.customerprofile,
+            reservation_owner=cls.testuser,
+            house=cls.house,
+            start_date=date.today() + timedelta(10),
+            end_date=date.today() + timedelta(13),
+        )
+
+    def setUp(self):
+        cache.clear()  # entries of other tests may share the versions
+
+    def get(self, url, user, queries=None):
+        self.client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        if queries is not None:
+            self.assertEqual(len(captured), queries)
+        return response
+
+    def test_reservations_cached_per_user_until_changed(self):
+        url = reverse("bookings:reservations")
+        before = metrics.cache_outcomes("bookings:reservations")
+        first = self.get(url, self.testuser)
+        self.assertEqual(first["X-Response-Cache"], "miss")
+        cached = self.get(url, self.testuser, queries=0)
+        self.assertEqual(cached["X-Response-Cache"], "hit")
+        self.assertEqual(cached.data, first.data)
+
+        # another user -> own entry
+        other = self.get(url, self.testuser2)
+        self.assertEqual((other["X-Response-Cache"], other.data["count"]), ("miss", 0))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.reservation.end_date += timedelta(1)
+            self.reservation.save()
+        changed = self.get(url, self.testuser)
+        self.assertEqual(changed["X-Response-Cache"], "miss")
+        self.assertEqual(changed.data["results"][0]["end_date"], str(self.reservation.end_date))
+
+        after = metrics.cache_outcomes("bookings:reservations")
+        self.assertEqual({outcome: after[outcome] - before[outcome] for outcome in after}, {"hit": 1, "miss": 3})
+
+    def test_house_list_invalidated_by_house_and_profile_writes(self):
+        url = reverse("bookings:challet_houses")
+        self.assertEqual(self.get(url, None)["X-Response-Cache"], "miss")
+        self.assertEqual(self.get(url, None, queries=0)["X-Response-Cache"], "hit")
+        # query params are part of the key
+        self.assertEqual(self.client.get(url, {"ordering": "-house_number"})["X-Response-Cache"], "miss")
+
+        self.house.price_night = 400
+        self.house.save()
+        response = self.get(url, None)
+        self.assertEqual(response["X-Response-Cache"], "miss")
+        self.assertEqual(response.data["results"][0]["price_night"], 400)
+
+        self.get(url, self.testuser)
+        profile = self.testuser.customerprofile
+        profile.status = CustomerProfile.REGULAR
+        profile.save()
+        self.assertEqual(self.get(url, self.testuser)["X-Response-Cache"], "miss")
+
+    async def test_views_served_by_the_asgi_handler(self):
+        """asgi is opt-in [gunicorn.conf.py] -> the same sync views, run in threads by the handler"""
+        client, url = AsyncClient(), reverse("bookings:challet_houses")
+        sync_miss = await sync_to_async(self.client.get)(url)
+        await cache.aclear()
+
+        first = await client.get(url)
+        self.assertEqual((first.status_code, first["X-Response-Cache"]), (status.HTTP_200_OK, "miss"))
+        self.assertEqual(first.data, sync_miss.data)
+        # queries run in threads [sync_to_async] belong to the request
+        queries = [int(response["Server-Timing"].split('desc="')[1].split()[0]) for response in (first, sync_miss)]
+        self.assertEqual(queries[0], queries[1])
+        self.assertGreater(queries[0], 0)
+        self.assertEqual((await client.get(url))["X-Response-Cache"], "hit")
+
+        self.assertEqual((await client.get(reverse("api_root"))).status_code, status.HTTP_200_OK)
+        missing = await client.get(reverse("bookings:house_availability", args=[self.house.pk + 1]))
+        self.assertEqual(missing.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_opinions_list_cached(self):
+        url = reverse("bookings:opinions")
+        self.assertEqual(self.get(url, self.testuser)["X-Response-Cache"], "miss")
+        self.assertEqual(self.get(url, self.testuser, queries=0)["X-Response-Cache"], "hit")
+
+        # a new opinion makes the cached list stale
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, {"title": "title", "main_text": "text", "rating": 5})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.get(url, self.testuser)
+        self.assertEqual(response["X-Response-Cache"], "miss")
+        self.assertEqual([opinion["title"] for opinion in response.data["results"]], ["title"])
+
+    def test_only_shown_changes_bump_versions(self):
+        labels = ["accounts.MyCustomUser", "bookings.CustomerProfile", "bookings.Suggestion"]
+        before = response_cache.versions(labels)
+
+        # login [last_login only], profile saved again with the same data, untracked model
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(self.client.login(email="test@gmail.com", password="adminadmin1"))
+            CustomerProfile.objects.get(user=self.testuser).save()
+            Suggestion.objects.create(title="title", main_text="text", author=self.testuser)
+        self.assertEqual(response_cache.versions(labels), before)
+
+        # shown by the cached responses -> bumped right away and after commit
+        user = MyCustomUser.objects.get(id=self.testuser.id)
+        user.name = "renamed"
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save()
+        self.assertEqual(response_cache.versions(labels[:1]), [before[0] + 2])
+
+    def test_versions_bumped_in_one_pipeline(self):
+        labels = ["bookings.ChalletHouse", "bookings.Reservation"]
+        cache.delete_many([response_cache._version_key(label) for label in labels])
+        self.assertEqual(response_cache.versions(labels), [0, 0])
+
+        with mock.patch("redis.client.Pipeline.execute", autospec=True, side_effect=Pipeline.execute) as execute:
+            response_cache.bump(labels)
+            response_cache.bump(labels[:1])
+        self.assertEqual(execute.call_count, 2)
+        # missing keys start from 0, raw ints readable by get_many
+        self.assertEqual(response_cache.versions(labels), [2, 1])
+
+
+class QueryInstrumentationTest(APITestCase):
+    @classmethod
+    def setUpTestData(cls) -> None:
+        for house_number in range(1, 3):
+            ChalletHouse.objects.create(price_night=350, house_number=house_number)
+
+    def setUp(self):
+        cache.clear()  # house list is behind the response cache
+
+    def test_server_timing_and_histograms(self):
+        labels = {"endpoint": "bookings:challet_houses"}
+
+        def queries(suffix, **bucket):
+            return REGISTRY.get_sample_value(f"http_request_queries_{suffix}", {**labels, **bucket}) or 0
+
+        before = [queries("bucket", le="2.0"), queries("bucket", le="5.0"), queries("count"), queries("sum")]
+        response = self.client.get(reverse("bookings:challet_houses"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("db;dur=", response["Server-Timing"])
+        self.assertIn('desc="3 queries, 0 repeated"', response["Server-Timing"])
+        self.assertIn("render;dur=", response["Server-Timing"])
+
+        after = [queries("bucket", le="2.0"), queries("bucket", le="5.0"), queries("count"), queries("sum")]
+        self.assertEqual([a - b for a, b in zip(after, before)], [0, 1, 1, 3])
+
+    def test_query_budget(self):
+        url = reverse("bookings:challet_houses")
+        with override_settings(QUERY_BUDGETS={"bookings:challet_houses": {"GET": 2}}):
+            with self.assertRaisesMessage(instrumentation.QueryBudgetExceeded, "3 queries, budget 2"):
+                self.client.get(url)
+            cache.clear()
+            with override_settings(QUERY_BUDGETS_RAISE=False), self.assertLogs(
+                "core_project.instrumentation", "WARNING"
+            ):
+                self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+    def test_fingerprint(self):
+        # any number of parameters / rows -> the same statement
+        self.assertEqual(
+            instrumentation.fingerprint('SELECT * FROM "t" WHERE "id" IN (%s, %s, %s)'),
+            instrumentation.fingerprint('SELECT * FROM "t" WHERE "id" IN (%s)'),
+        )
+        self.assertEqual(
+            instrumentation.fingerprint('INSERT INTO "t" ("a", "b") VALUES (%s, %s), (%s, %s)'),
+            'INSERT INTO "t" ("a", "b") VALUES (%s, ...)',
+        )
+
+
+class MetricsTest(APITestCase):
+    def sample(self, name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_request_and_response_cache_metrics(self):
+        cache.clear()
+        url = reverse("bookings:challet_houses")
+        labels = {"endpoint": "bookings:challet_houses"}
+        requests = self.sample("http_request_duration_seconds_count", method="GET", **labels)
+        hits = self.sample("response_cache_duration_seconds_count", outcome="hit", **labels)
+
+        self.client.get(url)
+        self.client.get(url)
+        self.assertEqual(self.sample("http_request_duration_seconds_count", method="GET", **labels), requests + 2)
+        self.assertEqual(self.sample("response_cache_duration_seconds_count", outcome="hit", **labels), hits + 1)
+
+        # no token -> refused unless DEBUG is on
+        with override_settings(METRICS_TOKEN=""):
+            self.assertEqual(self.client.get(reverse("metrics")).status_code, status.HTTP_403_FORBIDDEN)
+            with override_settings(DEBUG=True):
+                response = self.client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(b'http_request_queries_bucket{endpoint="bookings:challet_houses",le="5.0"}', response.content)
+
+        with override_settings(METRICS_TOKEN="secret", DEBUG=True):
+            self.assertEqual(self.client.get(reverse("metrics")).status_code, status.HTTP_403_FORBIDDEN)
+            response = self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer secret")
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_task_metrics(self):
+        name = rebuild_statistics_task.name
+        runs = self.sample("celery_task_duration_seconds_count", task=name, state="SUCCESS")
+        rebuild_statistics_task.apply(args=[[]])
+        self.assertEqual(self.sample("celery_task_duration_seconds_count", task=name, state="SUCCESS"), runs + 1)
+
+        # published 5s ago [header added by before_task_publish], or due 2s ago -> lag from the later of both
+        lag_count = self.sample("celery_task_queue_lag_seconds_count", task=name)
+        lag_sum = self.sample("celery_task_queue_lag_seconds_sum", task=name)
+        eta = (timezone.now() - timedelta(seconds=2)).isoformat()
+        for eta in (None, eta):
+            task = mock.Mock(request=mock.Mock(published_at=time.time() - 5, eta=eta))
+            task.name = name
+            metrics.task_started(task_id="published", task=task)
+            metrics.task_finished(task_id="published", task=task, state="SUCCESS")
+        self.assertEqual(self.sample("celery_task_queue_lag_seconds_count", task=name), lag_count + 2)
+        self.assertAlmostEqual(self.sample("celery_task_queue_lag_seconds_sum", task=name) - lag_sum, 7, delta=1)
+
+
+class StatisticsStoreTest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.house_nb_1 = ChalletHouse.objects.create(price_night=350, house_number=1)
+        cls.testuser = MyCustomUser.objects.create_user(
+            email="test@gmail.com",
+            name="testname",
+            surname="testsurname",
+            date_of_birth=date(1995, 10, 10),
+            password="adminadmin1",
+        )
+        cls.admin_user = MyCustomUser.objects.create_superuser(
+            email="admin@gmail.com",
+            name="filip",
+            surname="admins",
+            date_of_birth=date(1995, 10, 10),
+            password="passwordtest123",
+        )
+        cls.reservation = Reservation.objects.create(
+            customer_profile=cls.testuser.customerprofile,
+            reservation_owner=cls.testuser,
+            house=cls.house_nb_1,
+            start_date=date(2022, 11, 6),
+            end_date=date(2022, 11, 8),
+        )
+        cls.opinion = Opinion.objects.create(title="test opinion", main_text="nice", author=cls.testuser, rating=4)
+
+    def setUp(self):
+        self.client.force_authenticate(self.admin_user)
+
+    def test_statistics_read_from_summaries(self):
+        url = reverse("bookings:stats")
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["users"]["user_types"], {"admin": 1, "normal_user": 1})
+        self.assertEqual(response.data["reservations"]["total_reservations"]["total"], 1)
+        self.assertEqual(response.data["reservations"]["number_of_order_confirmations"], 1)
+        self.assertEqual(response.data["reservations"]["max_length"], 2)
+        self.assertEqual(response.data["opinions"]["number_of_opinions"], 1)
+        self.assertEqual(
+            response.data["challet_houses"]["total_revenue_house"], [{"house_number": 1, "total_revenue": 700}]
+        )
+
+        # one read of the summary rows per section
+        with self.assertNumQueries(3):
+            self.client.get(url, {"request_data": "opinions"})
+
+    @mock.patch("bookings.tasks.rebuild_statistics_task.delay")
+    def test_statistics_moved_by_signals(self, rebuild):
+        url = reverse("bookings:stats")
+        with self.captureOnCommitCallbacks(execute=True):
+            Opinion.objects.create(title="second opinion", main_text="nice", author=self.testuser, rating=2)
+            opinion = Opinion.objects.create(title="third", main_text="very nice", author=self.testuser, rating=3)
+        response = self.client.get(url, {"request_data": "opinions"})
+        self.assertEqual(response.data["opinions"]["number_of_opinions"], 3)
+        self.assertEqual(response.data["opinions"]["avg_rating"], 3.0)
+        self.assertEqual(response.data["opinions"]["longest_body"], 9)
+
+        # what the row contributed when it was loaded is taken back -> no scans, no rebuilds
+        opinion = Opinion.objects.get(id=opinion.id)
+        opinion.rating = 5
+        opinion.save()
+        Opinion.objects.get(id=opinion.id).delete()
+        response = self.client.get(url, {"request_data": "opinions"})
+        self.assertEqual(response.data["opinions"]["number_of_opinions"], 2)
+        self.assertEqual(response.data["opinions"]["avg_rating"], 3.0)
+        self.assertEqual(response.data["opinions"]["longest_body"], 4)
+
+        # cancelled -> no dates, month 0
+        reservation = Reservation.objects.get(id=self.reservation.id)
+        reservation.status, reservation.start_date, reservation.end_date = Reservation.CANCELLED, None, None
+        reservation.save(status_change=True)
+        response = self.client.get(url, {"request_data": "reservations"})
+        self.assertEqual(response.data["reservations"]["total_reservations"]["cancelled_count"], 1)
+        self.assertEqual(response.data["reservations"]["reservations_statuses"]["cancelled"], 1)
+        self.assertEqual(response.data["reservations"]["max_length"], None)
+        self.assertEqual(ReservationSummary.objects.get(month=11).longest, 0)
+        rebuild.assert_not_called()
+        call_command("check_statistics", stdout=io.StringIO())
+
+        # loaded without the fields -> read from the row before the save, summaries still moved incrementally
+        opinion = Opinion.objects.only("id", "title").get(id=self.opinion.id)
+        opinion.rating = 1
+        with self.captureOnCommitCallbacks(execute=True):
+            opinion.save()
+        rebuild.assert_not_called()
+        call_command("check_statistics", stdout=io.StringIO())
+
+    def test_check_statistics_command(self):
+        out = io.StringIO()
+        call_command("check_statistics", stdout=out)
+        self.assertIn("0 differences", out.getvalue())
+
+        # bulk updates do not send signals -> summaries go out of sync
+        Reservation.objects.update(total_price=1000)
+        with self.assertRaises(CommandError):
+            call_command("check_statistics", stdout=io.StringIO())
+
+        call_command("check_statistics", "--fix", stdout=io.StringIO())
+        call_command("check_statistics", stdout=io.StringIO())
+        response = self.client.get(reverse("bookings:stats"), {"request_data": "challet_houses"})
+        self.assertEqual(response.data["challet_houses"]["total_revenue_house"][0]["total_revenue"], 1000)
+
+    def test_users_generated_revenue_single_query(self):
+        house_nb_2 = ChalletHouse.objects.create(price_night=200, house_number=2)
+        Reservation.objects.create(
+            customer_profile=self.testuser.customerprofile,
+            reservation_owner=self.testuser,
+            house=house_nb_2,
+            start_date=date(2022, 11, 10),
+            end_date=date(2022, 11, 11),
+        )
+        Reservation.objects.filter(house=self.house_nb_1).update(status=Reservation.COMPLETED)
+        statistics.rebuild(["bookings.Reservation"])  # update() sends no signals
+
+        # revenue and visits of all customers in all houses -> one grouped query, no matter how many customers
+        with self.assertNumQueries(1):
+            data = statistics.compute("users", "users_generated_revenue")
+
+        customer = self.testuser.customerprofile
+        self.assertEqual(data["users_generated_revenue"], {customer.profile_user_repr: 900})
+        self.assertEqual(
+            data["favorite_houses"], {f"testname testsurname [{self.testuser.id}]": {"1": {"total_visits": 1}}}
+        )
+
+
+class LoadTestCommandsTest(TestCase):
+    def generate(self, **options):
+        options = {"users": 20, "houses": 3, "reservations": 30, "opinions": 5, "suggestions": 4, **options}
+        call_command("generate_data", stdout=io.StringIO(), **options)
+
+    def test_generate_data(self):
+        self.generate()
+        self.assertEqual(MyCustomUser.objects.filter(email__startswith="generated").count(), 20)
+        self.assertEqual(CustomerProfile.objects.filter(user__email__startswith="generated").count(), 20)
+        self.assertEqual(ChalletHouse.objects.count(), 3)
+        self.assertEqual(Reservation.objects.count(), 30)
+        self.assertEqual((Opinion.objects.count(), Suggestion.objects.count()), (5, 4))
+        # bulk inserted reservations are visible to availability checks and summed up for the statistics
+        self.assertTrue(HouseOccupancy.objects.exists())
+        call_command("check_statistics", stdout=io.StringIO())
+
+        with self.assertRaisesMessage(CommandError, "already exist"):
+            self.generate()
+        self.generate(prefix="more", houses=1, reservations=5)
+        self.assertEqual(ChalletHouse.objects.count(), 4)
+
+    def test_run_benchmarks_baseline_and_compare(self):
+        self.generate()
+        with tempfile.TemporaryDirectory() as directory:
+            baseline = os.path.join(directory, "baseline.json")
+            call_command(
+                "run_benchmarks",
+                requests=3,
+                warmup=0,
+                only=["challet_houses", "reservations"],
+                output=baseline,
+                stdout=io.StringIO(),
+            )
+            with open(baseline) as file:
+                result = json.load(file)
+            self.assertEqual(result["data"]["reservations"], 30)
+            endpoint = result["endpoints"]["GET bookings:challet_houses"]
+            self.assertEqual(endpoint["status"], "200")
+            self.assertLessEqual(endpoint["p50_ms"], endpoint["p95_ms"])
+
+            # same numbers -> nothing regressed
+            call_command(
+                "run_benchmarks", compare=baseline, current=baseline, fail_on_regression=True, stdout=io.StringIO()
+            )
+            # more queries than before -> regression
+            result["endpoints"]["GET bookings:challet_houses"]["queries"] -= 1
+            previous = os.path.join(directory, "previous.json")
+            with open(previous, "w") as file:
+                json.dump(result, file)
+            with self.assertRaisesMessage(CommandError, "GET bookings:challet_houses"):
+                call_command(
+                    "run_benchmarks", compare=previous, current=baseline, fail_on_regression=True, stdout=io.StringIO()
+                )
+
+
+class DateIntervalSetTest(SimpleTestCase):
+    def setUp(self):
+        self.taken_nights = DateIntervalSet(
+            [(date(2022, 11, 10), date(2022, 11, 15)), (date(2022, 11, 6), date(2022, 11, 8))]
+        )
+
+    def test_intervals_sorted_and_merged(self):
+        self.assertEqual(
+            list(self.taken_nights),
+            [(date(2022, 11, 6), date(2022, 11, 8)), (date(2022, 11, 10), date(2022, 11, 15))],
+        )
+        # touching the departure day and overlapping both stays -> one interval
+        self.taken_nights.add(date(2022, 11, 8), date(2022, 11, 11))
+        self.assertEqual(list(self.taken_nights), [(date(2022, 11, 6), date(2022, 11, 15))])
+
+        with self.assertRaises(ValueError):
+            self.taken_nights.add(date(2022, 11, 8), date(2022, 11, 8))
+
+    def test_overlaps(self):
+        # departure day of one stay is the arrival day of the next one
+        self.assertFalse(self.taken_nights.overlaps(date(2022, 11, 8), date(2022, 11, 10)))
+        self.assertFalse(self.taken_nights.overlaps(date(2022, 11, 1), date(2022, 11, 6)))
+        self.assertFalse(self.taken_nights.overlaps(date(2022, 11, 15), date(2022, 11, 20)))
+        self.assertTrue(self.taken_nights.overlaps(date(2022, 11, 7), date(2022, 11, 9)))
+        self.assertTrue(self.taken_nights.overlaps(date(2022, 11, 1), date(2022, 11, 30)))
+        self.assertTrue(self.taken_nights.overlaps(date(2022, 11, 14), date(2022, 11, 15)))
+        self.assertIn(date(2022, 11, 6), self.taken_nights)
+        self.assertNotIn(date(2022, 11, 8), self.taken_nights)
+
+    def test_days_and_free_days(self):
+        self.assertEqual(len(list(self.taken_nights.days())), 7)
+        self.assertEqual(
+            list(self.taken_nights.days(start=date(2022, 11, 7), end=date(2022, 11, 11))),
+            [date(2022, 11, 7), date(2022, 11, 10)],
+        )
+        self.assertEqual(
+            list(self.taken_nights.free_days(date(2022, 11, 5), date(2022, 11, 17))),
+            [date(2022, 11, 5), date(2022, 11, 8), date(2022, 11, 9), date(2022, 11, 15), date(2022, 11, 16)],
+        )
+        self.assertEqual(
+            list(DateIntervalSet().free_days(date(2022, 12, 30), date(2023, 1, 1))),
+            [
+                date(2022, 12, 30),
+                date(2022, 12, 31),
+            ],
+        )
+
+
+class OccupancyBitmapTest(SimpleTestCase):
+    def test_mark_and_clear_nights(self):
+        bitmap = OccupancyBitmap(2024)  # leap year
+        bitmap.mark(date(2024, 2, 27), date(2024, 3, 2))
+        self.assertEqual(
+            list(bitmap.taken_nights()), [date(2024, 2, 27), date(2024, 2, 28), date(2024, 2, 29), date(2024, 3, 1)]
+        )
+        self.assertFalse(bitmap.is_taken(date(2024, 3, 2)))  # departure day
+
+        bitmap.mark(date(2024, 2, 28), date(2024, 3, 1), taken=False)
+        self.assertEqual(list(bitmap.taken_nights()), [date(2024, 2, 27), date(2024, 3, 1)])
+        self.assertEqual(len(list(bitmap.free_nights())), 364)
+
+        # stored as 46 bytes and read back the same
+        self.assertEqual(OccupancyBitmap(2024, bitmap.to_bytes()).to_bytes(), bitmap.to_bytes())
+        self.assertEqual(len(bitmap.to_bytes()), 46)
+
+    def test_ranges_clipped_to_year(self):
+        self.assertEqual(list(OccupancyBitmap.years(date(2022, 12, 30), date(2023, 1, 1))), [2022])
+        self.assertEqual(list(OccupancyBitmap.years(date(2022, 12, 30), date(2023, 1, 3))), [2022, 2023])
+
+        bitmap = OccupancyBitmap(2023)
+        bitmap.mark(date(2022, 12, 1), date(2023, 1, 10))
+        bitmap.mark(date(2023, 12, 31), date(2024, 1, 5))
+        self.assertEqual(len(list(bitmap.taken_nights())), 10)
+        self.assertTrue(bitmap.is_taken(date(2023, 12, 31)))
+        self.assertEqual(
+            list(bitmap.free_nights(start=date(2023, 1, 8), end=date(2023, 1, 12))),
+            [date(2023, 1, 10), date(2023, 1, 11)],
+        )
+
+
+class ReservationConcurrencyTest(TransactionTestCase):
+    """
+    reservations are committed for real -> parallel requests run on their own connections to the test database
+    """
+
+    def setUp(self):
+        self.house_nb_1 = ChalletHouse.objects.create(price_night=350, house_number=1)
+        self.users = [
+            MyCustomUser.objects.create_user(
+                email=f"parallel{i}@gmail.com",
+                name=f"parallel{i}",
+                surname="testsurname",
+                date_of_birth=date(1995, 10, 10),
+                password="adminadmin1",
+            )
+            for i in range(6)
+        ]
+
+    def _create_reservation(self, user, barrier):
+        client = APIClient()
+        client.force_authenticate(user)
+        data = {"start_date": date(2022, 12, 20), "end_date": date(2022, 12, 23), "house": 1}
+        try:
+            # all threads fire their request at the same time
+            barrier.wait()
+            return client.post(reverse("bookings:reservation_create"), data=data).status_code
+        finally:
+            connection.close()
+
+    def test_parallel_creates_same_dates(self):
+        barrier = threading.Barrier(len(self.users))
+
+        with ThreadPoolExecutor(max_workers=len(self.users)) as executor:
+            statuses = list(executor.map(lambda user: self._create_reservation(user, barrier), self.users))
+
+        self.assertEqual(statuses.count(status.HTTP_201_CREATED), 1)
+        self.assertEqual(statuses.count(status.HTTP_406_NOT_ACCEPTABLE), len(self.users) - 1)
+        self.assertEqual(Reservation.objects.count(), 1)
+
+    def test_exclusion_constraint(self):
+        user = self.users[0]
+        reservation = Reservation.objects.create(
+            customer_profile=user.customerprofile,
+            reservation_owner=user,
+            house=self.house_nb_1,
+            start_date=date(2022, 12, 20),
+            end_date=date(2022, 12, 23),
+        )
+        # departure day is free for the next arrival
+        Reservation.objects.create(
+            customer_profile=user.customerprofile,
+            reservation_owner=user,
+            house=self.house_nb_1,
+            start_date=date(2022, 12, 23),
+            end_date=date(2022, 12, 24),
+        )
+
+        with self.assertRaises(IntegrityError):
+            with transaction.atomic():
+                Reservation.objects.create(
+                    customer_profile=user.customerprofile,
+                    reservation_owner=user,
+                    house=self.house_nb_1,
+                    start_date=date(2022, 12, 22),
+                    end_date=date(2022, 12, 27),
+                )
+
+        # cancelled reservation [no dates] releases its days
+        reservation.start_date = None
+        reservation.end_date = None
+        reservation.status = 9
+        reservation.nights = 0
+        reservation.save(status_change=9)
+        Reservation.objects.create(
+            customer_profile=user.customerprofile,
+            reservation_owner=user,
+            house=self.house_nb_1,
+            start_date=date(2022, 12, 20),
+            end_date=date(2022, 12, 23),
+        )
+
 
 dir = settings.MEDIA_ROOT
 shutil.rmtree(dir)
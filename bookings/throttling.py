@@ -0,0 +1,94 @@
+"""
+sliding window throttling in redis, every throttle of the view checked by one script [one round trip per request]
+
+- one sorted set per throttle key [scope + user/ip], members are the timestamps of allowed requests
+- the first throttle of a request evaluates the keys of all throttles of the view, the others read its results
+- same rules as SimpleRateThrottle: requests older than the duration drop out, a refused request is not recorded,
+  every scope is counted on its own
+"""
+import itertools
+import os
+
+from core_project import metrics
+from django.core.cache import cache
+
+# KEYS: sorted set per scope; ARGV: now, member, then limit and duration [seconds] of every key
+# -> per key "0" when allowed [and recorded], otherwise seconds until its oldest request drops out
+SLIDING_WINDOW_SCRIPT = """
+local now = tonumber(ARGV[1])
+local result = {}
+for i, key in ipairs(KEYS) do
+    local limit = tonumber(ARGV[2 * i + 1])
+    local duration = tonumber(ARGV[2 * i + 2])
+    redis.call("ZREMRANGEBYSCORE", key, "-inf", now - duration)
+    if redis.call("ZCARD", key) < limit then
+        redis.call("ZADD", key, now, ARGV[2])
+        redis.call("EXPIRE", key, math.ceil(duration))
+        result[i] = "0"
+    else
+        local oldest = redis.call("ZRANGE", key, 0, 0, "WITHSCORES")
+        result[i] = tostring(tonumber(oldest[2]) + duration - now)
+    end
+end
+return result
+"""
+
+_script = None
+_members = itertools.count()
+
+
+def _get_script():
+    global _script
+    if _script is None:
+        # evalsha, the script is sent again only if redis does not know it
+        _script = cache.client().register_script(SLIDING_WINDOW_SCRIPT)
+    return _script
+
+
+def evaluate(rules, now):
+    """rules: [(key, num_requests, duration)] -> {key: seconds to wait [0 = allowed]}"""
+    if not rules:
+        return {}
+    keys = [cache.make_key(key) for key, _, _ in rules]
+    args = [now, f"{now}:{os.getpid()}:{next(_members)}"]
+    for _, num_requests, duration in rules:
+        args += [num_requests, duration]
+
+    waits = _get_script()(keys=keys, args=args, client=cache.client())
+    return {key: float(wait) for (key, _, _), wait in zip(rules, waits)}
+
+
+class SlidingWindowThrottleMixin:
+    """for SimpleRateThrottle subclasses -> history kept in redis instead of a pickled list in the cache"""
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        results = getattr(request, "_throttle_waits", None)
+        if results is None:
+            results = request._throttle_waits = evaluate(self._view_rules(request, view), self.timer())
+        elif self.key not in results:
+            # throttle not listed by the view -> checked on its own
+            results.update(evaluate([(self.key, self.num_requests, self.duration)], self.timer()))
+
+        self.wait_seconds = results[self.key]
+        if self.wait_seconds:
+            metrics.THROTTLE_REJECTIONS.labels(self.scope).inc()
+        return self.wait_seconds == 0
+
+    def wait(self):
+        return self.wait_seconds
+
+    def _view_rules(self, request, view):
+        rules = [(self.key, self.num_requests, self.duration)]
+        for throttle in view.get_throttles():
+            if isinstance(throttle, SlidingWindowThrottleMixin) and throttle.rate is not None:
+                key = throttle.get_cache_key(request, view)
+                if key is not None and key != self.key:
+                    rules.append((key, throttle.num_requests, throttle.duration))
+        return rules
@@ -1,6 +1,5 @@
 from core_project import main_api_view
 from django.urls import path
-from django.views.decorators.cache import cache_page
 
 from . import views_api
 
@@ -15,16 +14,25 @@ urlpatterns = [
     path("suggestions/<int:pk>/", views_api.SuggestionUserDetailView.as_view(), name="suggestion_detail"),
     path("opinions/", views_api.OpinionCreateListView.as_view(), name="opinions"),
     path("opinions/<int:pk>/", views_api.OpinionUserDetailView.as_view(), name="opinion_detail"),
-    path("challet_houses/", cache_page(5)(views_api.ChalletHouseListView.as_view()), name="challet_houses"),
+    path("challet_houses/", views_api.ChalletHouseListView.as_view(), name="challet_houses"),
     path("challet_houses/<int:pk>/", views_api.ChalletHouseDetailView.as_view(), name="challet_house"),
+    path(
+        "challet_houses/<int:pk>/availability/",
+        views_api.HouseAvailabilityView.as_view(),
+        name="house_availability",
+    ),
     path("reservations/", views_api.ReservationsListViewSet.as_view({"get": "list"}), name="reservations"),
     path(
         "reservations/past_reservations/",
-        views_api.ReservationsListViewSet.as_view({"get": "past_reservations"}),
+        # routes are not registered with a router -> @action kwargs [pagination_class] must be passed here
+        views_api.ReservationsListViewSet.as_view(
+            {"get": "past_reservations"}, pagination_class=views_api.MyCustomKeysetPaginator
+        ),
         name="past_reservations",
     ),
+    path("reservations/export/", views_api.ReservationExportView.as_view(), name="reservations_export"),
     path("reservations/<int:pk>/", views_api.ReservationRetrieveUpdate.as_view(), name="reservation_detail"),
     path("reservations/create/", views_api.ReservationCreateView.as_view(), name="reservation_create"),
     path("admin_func/", views_api.run_updates, name="run_updates"),
-    path("stats/", cache_page(20)(views_api.StatisticsView.as_view()), name="stats"),
+    path("stats/", views_api.StatisticsView.as_view(), name="stats"),
 ]
@@ -0,0 +1,69 @@
+from datetime import date, timedelta
+
+# 366 days -> 46 bytes, leap years included
+BITMAP_SIZE = 46
+
+
+class OccupancyBitmap:
+    """
+    one bit per night of a single year: bit n = n-th day of the year is taken (night from that day to the next one)
+    - lookups and updates of a single night are O(1)
+    - ranges outside of the year are clipped, so the same stay can be applied to every year it touches
+    """
+
+    def __init__(self, year: int, data: bytes = None):
+        self.year = year
+        self.first_day = date(year, 1, 1)
+        self.last_day = date(year + 1, 1, 1)  # exclusive
+        self._bits = bytearray(data) if data else bytearray(BITMAP_SIZE)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.year}, taken={sum(1 for _ in self.taken_nights())})"
+
+    @staticmethod
+    def years(start: date, end: date) -> range:
+        """years touched by the nights of [start, end)"""
+        return range(start.year, (end - timedelta(days=1)).year + 1)
+
+    def to_bytes(self) -> bytes:
+        return bytes(self._bits)
+
+    def is_taken(self, day: date) -> bool:
+        index = (day - self.first_day).days
+        return bool(self._bits[index >> 3] & (1 << (index & 7)))
+
+    def mark(self, start: date, end: date, taken: bool = True) -> None:
+        """sets (or clears) every night of [start, end) that falls into this year"""
+        first = (max(start, self.first_day) - self.first_day).days
+        last = (min(end, self.last_day) - self.first_day).days
+
+        for index in range(first, last):
+            if taken:
+                self._bits[index >> 3] |= 1 << (index & 7)
+            else:
+                self._bits[index >> 3] &= ~(1 << (index & 7))
+
+    def taken_nights(self, start: date = None, end: date = None):
+        yield from self._nights(start, end, taken=True)
+
+    def free_nights(self, start: date = None, end: date = None):
+        yield from self._nights(start, end, taken=False)
+
+    def _nights(self, start, end, taken):
+        start = self.first_day if start is None else max(start, self.first_day)
+        end = self.last_day if end is None else min(end, self.last_day)
+
+        day = start
+        while day < end:
+            index = (day - self.first_day).days
+            byte = self._bits[index >> 3]
+            # whole byte either empty or full -> skip 8 nights at once
+            if index & 7 == 0 and byte in (0, 255) and day + timedelta(days=8) <= end:
+                if bool(byte) is taken:
+                    yield from (day + timedelta(days=i) for i in range(8))
+                day += timedelta(days=8)
+                continue
+
+            if bool(byte & (1 << (index & 7))) is taken:
+                yield day
+            day += timedelta(days=1)
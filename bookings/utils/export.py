@@ -0,0 +1,56 @@
+import csv
+import json
+from itertools import islice
+
+from django.db import connections
+
+
+class Echo:
+    """pseudo buffer for csv.writer -> returns the line instead of storing it [django docs: streaming large csv]"""
+
+    def write(self, value):
+        return value
+
+
+def batched(rows, size):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+def rows(queryset, fields, chunk_size):
+    """
+    values_list rows of the queryset [ordered by pk], chunk_size rows fetched at a time
+    - server side cursor [iterator]: one query, one snapshot
+    - DISABLE_SERVER_SIDE_CURSORS [pgbouncer] -> keyset chunks: pk > last pk of the previous chunk, each one a query of
+      its own; rows written during the export may show up
+    """
+    if not connections[queryset.db].settings_dict["DISABLE_SERVER_SIDE_CURSORS"]:
+        return queryset.order_by("pk").values_list(*fields).iterator(chunk_size=chunk_size)
+    return keyset_rows(queryset, fields, chunk_size)
+
+
+def keyset_rows(queryset, fields, chunk_size):
+    queryset = queryset.order_by("pk").values_list("pk", *fields)
+    last_pk = None
+    while True:
+        chunk = list((queryset if last_pk is None else queryset.filter(pk__gt=last_pk))[:chunk_size])
+        for row in chunk:
+            yield row[1:]
+        if len(chunk) < chunk_size:
+            return
+        last_pk = chunk[-1][0]
+
+
+def csv_lines(columns, rows, batch_size=1000):
+    """header + one csv line per row, yielded in batches of lines -> less overhead per row than yielding each line"""
+    writer = csv.writer(Echo())
+    yield writer.writerow(columns)
+    for batch in batched(rows, batch_size):
+        yield "".join(writer.writerow(row) for row in batch)
+
+
+def jsonl_lines(columns, rows, batch_size=1000):
+    """one json object per line [json lines], dates as iso strings"""
+    for batch in batched(rows, batch_size):
+        yield "".join(json.dumps(dict(zip(columns, row)), default=str) + "\n" for row in batch)
@@ -0,0 +1,79 @@
+from bisect import bisect_left, bisect_right
+from datetime import date, timedelta
+
+
+class DateIntervalSet:
+    """
+    sorted, non-overlapping set of half-open date intervals [start, end)
+    - an interval is a stay: start_date is the first night, end_date is the departure day (not a night)
+    - touching/overlapping intervals are merged on insert, so starts and ends are both kept sorted
+    - overlap queries are two bisections -> O(log n) instead of scanning a list of single days
+    """
+
+    def __init__(self, intervals=()):
+        self._starts: list[date] = []
+        self._ends: list[date] = []
+        for start, end in intervals:
+            self.add(start, end)
+
+    def __len__(self) -> int:
+        return len(self._starts)
+
+    def __iter__(self):
+        return zip(self._starts, self._ends)
+
+    def __contains__(self, day: date) -> bool:
+        return self.overlaps(day, day + timedelta(days=1))
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({list(self)})"
+
+    def add(self, start: date, end: date) -> None:
+        if start >= end:
+            raise ValueError("End date must be later than start date")
+
+        # first interval ending on/after start and first interval starting after end -> everything in between merges
+        i = bisect_left(self._ends, start)
+        j = bisect_right(self._starts, end)
+        if i < j:
+            start = min(start, self._starts[i])
+            end = max(end, self._ends[j - 1])
+
+        self._starts[i:j] = [start]
+        self._ends[i:j] = [end]
+
+    def overlaps(self, start: date, end: date) -> bool:
+        """True if at least one night of [start, end) is already taken"""
+        # first interval that ends after the arrival day; departure day of other stays is free to arrive on
+        i = bisect_right(self._ends, start)
+        return i < len(self._starts) and self._starts[i] < end
+
+    def days(self, start: date = None, end: date = None):
+        """yields every taken night in order, optionally clipped to [start, end)"""
+        i = 0 if start is None else bisect_right(self._ends, start)
+        for interval_start, interval_end in zip(self._starts[i:], self._ends[i:]):
+            if start is not None and interval_start < start:
+                interval_start = start
+            if end is not None:
+                if interval_start >= end:
+                    return
+                interval_end = min(interval_end, end)
+
+            for day in range((interval_end - interval_start).days):
+                yield interval_start + timedelta(days=day)
+
+    def free_days(self, start: date, end: date):
+        """yields every night of [start, end) which is not taken"""
+        day = start
+        i = bisect_right(self._ends, start)
+        while day < end:
+            if i < len(self._starts) and self._starts[i] <= day:
+                # inside a taken interval -> jump to its departure day
+                day = self._ends[i]
+                i += 1
+                continue
+
+            next_taken = self._starts[i] if i < len(self._starts) else end
+            while day < min(next_taken, end):
+                yield day
+                day += timedelta(days=1)
@@ -0,0 +1,107 @@
+"""
+http load against gunicorn processes started by the benchmarks [benchmark_asgi, benchmark_connections]
+
+- gunicorn(env, port): gunicorn.conf.py with `env` on top of ours, throttles lifted -> yields the port once it answers
+- load(port, path, concurrency, requests): keep-alive clients in threads of this process -> req/s, p50/p99, statuses
+"""
+import http.client
+import itertools
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.urls import reverse
+
+UNTHROTTLED = "100000/second"
+
+
+def percentile(timings, p):
+    """nearest rank percentile of the measured timings"""
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, round(p / 100 * (len(ordered) - 1)))]
+
+
+@contextmanager
+def gunicorn(env, port):
+    env = {
+        **os.environ,
+        "GUNICORN_BIND": f"127.0.0.1:{port}",
+        **{f"THROTTLE_RATE_{scope}": UNTHROTTLED for scope in ("BURST", "SUSTAINED", "ANON", "OPINIONS")},
+        **env,
+    }
+    env.pop("PROMETHEUS_MULTIPROC_DIR", None)  # samples of the benchmark are not kept
+    env.pop("DJANGO_DEBUG", None)  # debug toolbar -> sync middleware
+
+    with tempfile.TemporaryFile() as log:
+        process = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "-c", str(settings.BASE_DIR / "gunicorn.conf.py")],
+            cwd=settings.BASE_DIR,
+            env=env,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+        )
+        try:
+            _wait_until_up(process, port, log)
+            yield port
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+
+
+def _wait_until_up(process, port, log):
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            log.seek(0)
+            raise CommandError(f"gunicorn exited [{process.returncode}]:\n{log.read().decode()[-2000:]}")
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            connection.request("GET", reverse("api_root"), headers={"Host": settings.ALLOWED_HOSTS[0]})
+            connection.getresponse().read()
+            connection.close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise CommandError(f"gunicorn did not answer on port {port} within 30s")
+
+
+def load(port, path, concurrency, requests):
+    """`requests` GETs of path shared by `concurrency` clients, each with a keep-alive connection"""
+    counter = itertools.count()
+    headers = {"Host": settings.ALLOWED_HOSTS[0]}
+
+    def client():
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+        timings, statuses = [], Counter()
+        try:
+            while next(counter) < requests:
+                started = time.perf_counter()
+                connection.request("GET", path, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                timings.append(time.perf_counter() - started)
+                statuses[response.status] += 1
+        finally:
+            connection.close()
+        return timings, statuses
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        finished = list(pool.map(lambda _: client(), range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    timings = [timing for client_timings, _ in finished for timing in client_timings]
+    statuses = sum((client_statuses for _, client_statuses in finished), Counter())
+    return {
+        "status": ",".join(f"{code}x{count}" for code, count in sorted(statuses.items())),
+        "p50_ms": round(percentile(timings, 50) * 1000, 3),
+        "p99_ms": round(percentile(timings, 99) * 1000, 3),
+        "rps": round(len(timings) / elapsed, 1),
+    }
@@ -0,0 +1,144 @@
+import random
+from datetime import date, timedelta
+from itertools import islice
+
+from accounts.models import MyCustomUser
+
+from bookings.models import ChalletHouse, CustomerProfile, Opinion, Reservation
+
+NAMES = ["Anna", "Piotr", "Maria", "Krzysztof", "Katarzyna", "Tomasz", "Agnieszka", "Pawel", "Ewa", "Michal"]
+SURNAMES = ["Nowak", "Kowalski", "Wisniewski", "Wojcik", "Kaminski", "Lewandowski", "Zielinski", "Szymanski"]
+CITIES = ["Krakow", "Warszawa", "Gdansk", "Wroclaw", "Poznan", "Katowice", None]
+
+
+def generate_reservations(
+    houses, profiles, count, start=date(2000, 1, 1), cancelled_ratio=0.05, completed_before=None, seed=42
+):
+    """
+    yields unsaved reservations spread over houses: back to back stays of 1-14 nights with random gaps per house
+    -> never overlapping [exclusion constraint], cancelled ones have no dates like after a status 9 update
+    profiles: list of (customer_profile_id, user_id)
+    completed_before: stays ending before that day are completed [as after run_updates], confirmed otherwise
+    """
+    rng = random.Random(seed)
+    next_start = {house.house_number: start for house in houses}
+
+    for i in range(count):
+        house = houses[i % len(houses)]
+        profile_id, user_id = profiles[rng.randrange(len(profiles))]
+        stay_start = next_start[house.house_number] + timedelta(days=rng.randint(0, 3))
+        nights = rng.randint(1, 14)
+        next_start[house.house_number] = stay_start + timedelta(days=nights)
+
+        if rng.random() < cancelled_ratio:
+            stay_start, stay_end, nights, status = None, None, 0, Reservation.CANCELLED
+        else:
+            stay_end, status = stay_start + timedelta(days=nights), Reservation.CONFIRMED
+            if completed_before and stay_end < completed_before:
+                status = Reservation.COMPLETED
+
+        yield Reservation(
+            customer_profile_id=profile_id,
+            reservation_owner_id=user_id,
+            house=house,
+            status=status,
+            start_date=stay_start,
+            end_date=stay_end,
+            nights=nights,
+            total_price=nights * house.price_night,
+        )
+
+
+def seed_reservations(count, profiles, houses=1000, first_house_number=1000, batch_size=10_000, **kwargs):
+    """
+    bulk inserts `count` reservations over `houses` new houses, batch by batch -> memory does not grow with count
+    signals are not sent [bulk_create]: no reservation numbers, emails or occupancy updates
+    """
+    new_houses = ChalletHouse.objects.bulk_create(
+        ChalletHouse(house_number=house_number, price_night=random.randint(200, 500))
+        for house_number in range(first_house_number, first_house_number + houses)
+    )
+    reservations = generate_reservations(new_houses, profiles, count, **kwargs)
+
+    created = 0
+    while batch := list(islice(reservations, batch_size)):
+        Reservation.objects.bulk_create(batch, batch_size=batch_size)
+        created += len(batch)
+    return created
+
+
+def seed_customers(count, owner_id, batch_size=10_000):
+    """
+    bulk inserts `count` customer profiles, returns [(customer_profile_id, owner_id)] for generate_reservations
+    -> profiles without users: statistics only need the profiles
+    """
+    profiles = []
+    for first in range(0, count, batch_size):
+        batch = CustomerProfile.objects.bulk_create(
+            CustomerProfile(first_name=f"customer{i}", surname="benchmark")
+            for i in range(first, min(first + batch_size, count))
+        )
+        profiles.extend((profile.id, owner_id) for profile in batch)
+    return profiles
+
+
+def seed_users(count, prefix="generated", since=date(2020, 1, 1), batch_size=10_000, seed=42):
+    """
+    bulk inserts `count` users with their customer profiles [joined between `since` and today], returns
+    [(customer_profile_id, user_id)] for generate_reservations
+    -> unusable passwords, no tokens or emails: bulk_create sends no signals
+    """
+    rng = random.Random(seed)
+    statuses = [CustomerProfile.NEW_CUSTOMER] * 6 + [CustomerProfile.REGULAR] * 3 + [CustomerProfile.SUPER]
+    days = max((date.today() - since).days, 1)
+    profiles = []
+    for first in range(0, count, batch_size):
+        users = MyCustomUser.objects.bulk_create(
+            MyCustomUser(
+                email=f"{prefix}{i}@example.com",
+                name=rng.choice(NAMES),
+                surname=rng.choice(SURNAMES),
+                date_of_birth=date(1950, 1, 1) + timedelta(days=rng.randrange(20_000)),
+                city=rng.choice(CITIES),
+                password="!",
+            )
+            for i in range(first, min(first + batch_size, count))
+        )
+        batch = CustomerProfile.objects.bulk_create(
+            CustomerProfile(
+                user_id=user.id,
+                first_name=user.name,
+                surname=user.surname,
+                status=rng.choice(statuses),
+                total_visits=rng.randint(0, 12),
+            )
+            for user in users
+        )
+        # joined is auto_now_add -> today on insert, spread afterwards
+        for profile in batch:
+            profile.joined = since + timedelta(days=rng.randrange(days))
+        CustomerProfile.objects.bulk_update(batch, ["joined"], batch_size=batch_size)
+        profiles.extend((profile.id, profile.user_id) for profile in batch)
+    return profiles
+
+
+def seed_communications(model, count, author_ids, since=date(2020, 1, 1), batch_size=10_000, seed=42):
+    """bulk inserts `count` opinions/suggestions of random authors, provided between `since` and today"""
+    rng = random.Random(seed)
+    days = max((date.today() - since).days, 1)
+    for first in range(0, count, batch_size):
+        batch = []
+        for i in range(first, min(first + batch_size, count)):
+            item = model(
+                title=f"{model.__name__} {i}",
+                main_text=" ".join(rng.choices(SURNAMES + NAMES, k=rng.randint(10, 80))),
+                author_id=rng.choice(author_ids),
+            )
+            if model is Opinion:
+                item.name, item.surname, item.rating = rng.choice(NAMES), rng.choice(SURNAMES), rng.randint(1, 5)
+            batch.append(item)
+        batch = model.objects.bulk_create(batch)
+        # provided_on is auto_now_add -> today on insert, spread afterwards
+        for item in batch:
+            item.provided_on = since + timedelta(days=rng.randrange(days))
+        model.objects.bulk_update(batch, ["provided_on"], batch_size=batch_size)
@@ -1,14 +1,14 @@
-from datetime import date
+from datetime import date, timedelta
 
 from accounts.models import MyCustomUser
 from django.contrib.auth.models import AnonymousUser
 from django.core.cache import cache
 from django.db import models
-from django.db.models import Avg, Case, Count, F, Max, Q, Sum, Value, When
-from django.db.models.functions import Cast, Concat, ExtractDay, ExtractMonth, Length, Round
-from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
+from django.db.models import Count, Prefetch, Q, Sum
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
 from django_filters import rest_framework as filters
+from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import (
     OpenApiExample,
     OpenApiParameter,
@@ -25,18 +25,32 @@ from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from bookings import auxiliary
+from bookings import auxiliary, statistics
+from bookings.response_cache import CachedResponseMixin
 from bookings.filters import HouseFilter, OpinionFilter, ReservationFilter, SuggestionFilter
-from bookings.paginators import MyCustomCursorPaginator, MyCustomListOffsetPagination, MyCustomPageNumberPagination
-from bookings.utils import my_date
-
-from .models import ChalletHouse, CustomerProfile, Opinion, Reservation, ReservationConfrimation, Suggestion
+from bookings.paginators import (
+    MyCustomCursorPaginator,
+    MyCustomKeysetPaginator,
+    MyCustomListOffsetPagination,
+    MyCustomPageNumberPagination,
+)
+from bookings.utils import export, my_date
+
+from .models import (
+    ChalletHouse,
+    CustomerProfile,
+    HouseOccupancy,
+    Opinion,
+    Reservation,
+    Suggestion,
+)
 from .permissions import IsAuthorOrAdmin, IsAuthorOtherwiseViewOnly, IsOwnerOrAdmin
 from .serializers import (
     BasicReservationSerializer,
     ChalletHouseSerializer,
     CustomerProfileSerializer,
     DetailViewReservationSerializer,
+    HouseAvailabilitySerializer,
     OpinionSerializer,
     ReservationSerializer,
     RunUpdatesSerializer,
@@ -114,15 +128,8 @@ def run_updates(request):
         if serializer.data.get("run_updates"):
             customer_hierarchy = CustomerProfile.hierarchy
             end_date = my_date.today()  # + timedelta(10)  #! optional, manual testing mostly
-            all_current_reservations = (
-                Reservation.objects.filter(end_date__lte=end_date)
-                .exclude(status__in=[9, 99])
-                .select_related("customer_profile")
-            )
 
-            auxiliary.update_reservation_customerprofile(
-                all_current_reservations, customer_hierarchy, end_date=end_date
-            )
+            auxiliary.complete_past_reservations(end_date, customer_hierarchy)
 
         return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -156,6 +163,32 @@ def figure_the_queryset_out(request, model: models.Model, limit_list_view=False)
     return queryset
 
 
+def challet_house_prefetches(request) -> list[Prefetch]:
+    """
+    helper used by challet house list and detail views; everything ChalletHouseSerializer shows is prefetched
+    -> reservations filtered per user in sql [admin - all, owner - his own, anonymous - none] + current occupancy
+    -> number of queries does not depend on the number of houses or reservations
+    """
+    user = request.user
+    prefetches = [
+        Prefetch(
+            "occupancy",
+            queryset=HouseOccupancy.objects.filter(year__gte=date.today().year),
+            to_attr="current_occupancy",
+        )
+    ]
+
+    if not user.is_authenticated:
+        return prefetches  # anonymous users do not see any reservations -> no need to query them
+
+    reservations = Reservation.objects.select_related("customer_profile__user")
+    if not user.is_admin:
+        reservations = reservations.filter(reservation_owner=user)
+    prefetches.append(Prefetch("house_reservations", queryset=reservations, to_attr="visible_reservations"))
+
+    return prefetches
+
+
 class SuggestionUserListCreateView(generics.ListCreateAPIView):
 
     # random people, passers by allowed to send suggestion
@@ -194,7 +227,9 @@ class SuggestionUserDetailView(generics.RetrieveUpdateAPIView):
     serializer_class = SuggestionSerializer
 
 
-class OpinionCreateListView(generics.ListCreateAPIView):
+class OpinionCreateListView(CachedResponseMixin, generics.ListCreateAPIView):
+    """GET -> response cache"""
+
     permission_classes = (AllowAny,)
     serializer_class = OpinionSerializer
     filter_backends = (filters.DjangoFilterBackend,)
@@ -203,6 +238,7 @@ class OpinionCreateListView(generics.ListCreateAPIView):
     ordering = ["edited_on"]
     pagination_class = MyCustomCursorPaginator
     throttle_classes = [auxiliary.CustomUseRateThrottle]
+    response_cache_models = ("accounts.MyCustomUser", "bookings.Opinion")  # author shown by full name
 
     def get_queryset(self):
 
@@ -254,7 +290,7 @@ class OpinionUserDetailView(generics.RetrieveUpdateAPIView):
         return queryset
 
 
-class ChalletHouseListView(generics.ListAPIView):
+class ChalletHouseListView(CachedResponseMixin, generics.ListAPIView):
     """
     limited overall number of houses - no creation possible.
     -> search by reservation_number enabled [res:house]
@@ -269,12 +305,19 @@ class ChalletHouseListView(generics.ListAPIView):
     search_fields = ["house_reservations__reservation_number"]
     pagination_class = MyCustomPageNumberPagination
     throttle_classes = [auxiliary.SustainedRateThrottle]
+    response_cache_models = (
+        "accounts.MyCustomUser",
+        "bookings.ChalletHouse",
+        "bookings.CustomerProfile",
+        "bookings.HouseOccupancy",
+        "bookings.Reservation",
+    )
 
     def get_queryset(self):
         # order by added due to pagination.
 
         queryset = (
-            ChalletHouse.objects.prefetch_related("house_reservations__customer_profile")
+            ChalletHouse.objects.prefetch_related(*challet_house_prefetches(self.request))
             .annotate(num_reservations=Count("house_reservations"), sum_nights=Sum("house_reservations__nights"))
             .order_by("house_number")
         )
@@ -288,13 +331,81 @@ class ChalletHouseDetailView(generics.RetrieveAPIView):
 
     def get_queryset(self):
 
-        queryset = ChalletHouse.objects.all()
+        queryset = ChalletHouse.objects.prefetch_related(*challet_house_prefetches(self.request))
 
         return queryset
 
 
-@method_decorator(cache_page(3), name="dispatch")
-class ReservationsListViewSet(viewsets.ModelViewSet):
+class HouseAvailabilityView(CachedResponseMixin, APIView):
+    """
+    free and reserved nights of a house in the range ?from=&to= [to = departure day -> not included]
+    -> answered from the occupancy bitmaps, each night is a single bit lookup; reservations are not loaded at all
+    """
+
+    permission_classes = (AllowAny,)
+    response_cache_models = ("bookings.ChalletHouse", "bookings.HouseOccupancy")
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(name="from", description="first night [default: today]", required=False, type=date),
+            OpenApiParameter(
+                name="to", description="departure day [default: from + 30 days]", required=False, type=date
+            ),
+        ],
+        responses={
+            200: inline_serializer(
+                "house_availability",
+                fields={
+                    "house_number": rest_serializers.IntegerField(),
+                    "from": rest_serializers.DateField(),
+                    "to": rest_serializers.DateField(),
+                    "free_nights": rest_serializers.ListField(child=rest_serializers.DateField()),
+                    "already_reserved_nights": rest_serializers.ListField(child=rest_serializers.DateField()),
+                },
+            )
+        },
+    )
+    def get(self, request, pk, format=None):
+        return self.cached_response(request, self._availability, pk=pk)
+
+    def _availability(self, request, pk):
+        # "from" cannot be a serializer field name -> renamed to start/end, empty params fall back to defaults
+        dates_range = {"start": request.query_params.get("from"), "end": request.query_params.get("to")}
+        range_serializer = HouseAvailabilitySerializer(data={key: value for key, value in dates_range.items() if value})
+        range_serializer.is_valid(raise_exception=True)
+        start = range_serializer.validated_data["start"]
+        end = range_serializer.validated_data["end"]
+
+        house = get_object_or_404(
+            ChalletHouse.objects.prefetch_related(
+                Prefetch("occupancy", queryset=HouseOccupancy.objects.filter(year__range=(start.year, end.year)))
+            ),
+            pk=pk,
+        )
+        bitmaps = {occupancy.year: occupancy.as_bitmap() for occupancy in house.occupancy.all()}
+
+        free_nights, reserved_nights = [], []
+        for day in range((end - start).days):
+            night = start + timedelta(days=day)
+            bitmap = bitmaps.get(night.year)
+            if bitmap is not None and bitmap.is_taken(night):
+                reserved_nights.append(night)
+            else:
+                free_nights.append(night)
+
+        return Response(
+            {
+                "house_number": house.house_number,
+                "from": start,
+                "to": end,
+                "free_nights": free_nights,
+                "already_reserved_nights": reserved_nights,
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
+class ReservationsListViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     """
     viewset limited to listing reservations:
     1. bookings:reservations lists all current + future reservations for admins; and the same but for specific user for non admins
@@ -308,6 +419,8 @@ class ReservationsListViewSet(viewsets.ModelViewSet):
     ordering_fields = ("reservation_number", "start_date")
     ordering = "start_date"
     pagination_class = MyCustomListOffsetPagination
+    # customer_profile shown as the name of the user
+    response_cache_models = ("accounts.MyCustomUser", "bookings.CustomerProfile", "bookings.Reservation")
 
     def get_queryset(self):
         # if getattr(self, "swagger_fake_view", False):  # drf-yasg comp
@@ -334,26 +447,83 @@ class ReservationsListViewSet(viewsets.ModelViewSet):
 
         return queryset
 
-    @action(detail=False)
+    @action(detail=False, pagination_class=MyCustomKeysetPaginator)
     def past_reservations(self, request, *args, **kwargs):
-        past_reservations = Reservation.objects.all().select_related("customer_profile__user", "reservation_owner")
-
-        if request.user.is_admin is True:
+        """
+        past and cancelled (no dates) reservations, most recent first
+        -> filtered in the db and paginated with a keyset cursor on (end_date, id) [see reservation indexes]
+        """
+        return self.cached_response(request, self._past_reservations)
 
-            past_reservations = [r for r in past_reservations if r.end_date is None or r.end_date < my_date.today()]
-            serializer = self.get_serializer(past_reservations, many=True)
+    def _past_reservations(self, request):
+        past_reservations = Reservation.objects.filter(
+            Q(end_date__lt=my_date.today()) | Q(end_date=None)
+        ).select_related("customer_profile__user")
 
         # if not admin then limit output to user's reservations only.
-        else:
+        if request.user.is_admin is not True:
+            past_reservations = past_reservations.filter(reservation_owner=request.user)
+
+        page = self.paginate_queryset(past_reservations)
+        serializer = self.get_serializer(page, many=True)
+
+        return self.get_paginated_response(serializer.data)
+
+
+class ReservationExportView(generics.GenericAPIView):
+    """
+    all reservations matching ReservationFilter as csv or json lines [?output=csv|jsonl], admins only
+    -> streamed straight from a server side cursor [keyset chunks behind pgbouncer]: rows are never loaded at once,
+       memory is flat for any export size
+    """
+
+    permission_classes = (IsAdminUser,)
+    filter_backends = (filters.DjangoFilterBackend,)
+    filterset_class = ReservationFilter
+    chunk_size = 2000
+    columns = {
+        "reservation_number": "reservation_number",
+        "house": "house",
+        "status": "status",
+        "start_date": "start_date",
+        "end_date": "end_date",
+        "nights": "nights",
+        "total_price": "total_price",
+        "first_name": "customer_profile__first_name",
+        "surname": "customer_profile__surname",
+        "email": "reservation_owner__email",
+        "created_at": "created_at",
+    }
+    outputs = {
+        "csv": (export.csv_lines, "text/csv", "csv"),
+        "jsonl": (export.jsonl_lines, "application/x-ndjson", "jsonl"),
+    }
+
+    def get_queryset(self):
+        return Reservation.objects.order_by("id")
+
+    def perform_content_negotiation(self, request, force=False):
+        # response is not rendered by drf -> Accept: text/csv must not end up with 406
+        return super().perform_content_negotiation(request, force=True)
+
+    @extend_schema(
+        parameters=[OpenApiParameter(name="output", description="csv [default] or jsonl", required=False, type=str)],
+        responses={(200, "text/csv"): OpenApiTypes.STR, (200, "application/x-ndjson"): OpenApiTypes.STR},
+    )
+    def get(self, request, format=None):
+        output = request.query_params.get("output", "csv")
+        if output not in self.outputs:
+            return Response({"output": f"Choose one of: {', '.join(self.outputs)}"}, status=status.HTTP_400_BAD_REQUEST)
+        lines, content_type, extension = self.outputs[output]
 
-            past_reservations = [
-                r
-                for r in past_reservations
-                if (r.end_date is None or r.end_date < my_date.today()) and r.reservation_owner.id == request.user.id
-            ]
-            serializer = self.get_serializer(past_reservations, many=True)
+        # values_list -> plain tuples, no model instances; fetched chunk by chunk
+        rows = export.rows(self.filter_queryset(self.get_queryset()), list(self.columns.values()), self.chunk_size)
 
-        return Response(serializer.data)
+        response = StreamingHttpResponse(
+            lines(list(self.columns), rows, batch_size=self.chunk_size), content_type=content_type
+        )
+        response["Content-Disposition"] = f'attachment; filename="reservations_{my_date.today()}.{extension}"'
+        return response
 
 
 class ReservationRetrieveUpdate(generics.RetrieveUpdateAPIView):
@@ -426,6 +596,9 @@ class ReservationCreateView(generics.CreateAPIView):
 
 
 class StatisticsView(APIView):
+    """
+    statistics are read from summary rows kept up to date by signals [bookings/statistics.py] -> no full scans
+    """
 
     permission_classes = (IsAdminUser,)
 
@@ -473,261 +646,17 @@ class StatisticsView(APIView):
         return Response(return_data, status=status.HTTP_200_OK)
 
     def _prepare_user_statistics(self, return_data):
-
-        # * get counts of user types: admin users and normal users
-        user_types = MyCustomUser.objects.aggregate(
-            admin=Count("pk", filter=Q(is_admin=True)), normal_user=Count("pk", filter=Q(is_admin=False))
-        )
-        return_data["user_types"] = user_types
-
-        # * get month on which users registered. Basic query and then rest done on the python level
-        customers = CustomerProfile.objects.all()
-        months = {}
-
-        for profile in customers:
-            # get month name for all profiles on the joined field (January ..etc) and add + 1
-            months[profile.joined.strftime("%B")] = months.get(profile.joined.strftime("%B"), 0) + 1
-        return_data["joined_on_month"] = months
-
-        # * calculate how many users belong to which category [New Customer, Regular, Super]
-        hierarchies_count = CustomerProfile.objects.aggregate(
-            new_customers=Count("status", filter=Q(status="N")),
-            regular_customers=Count("status", filter=Q(status="R")),
-            super=Count("status", filter=Q(status="S")),
-        )
-        return_data["customer_statuses"] = hierarchies_count
-
-        # * list users ordered by the revenue generated by them.
-        users = (
-            CustomerProfile.objects.select_related("user")
-            .annotate(generated_revenue=Sum(F("reservation__total_price")))
-            .filter(~Q(generated_revenue=None))
-            .order_by("-generated_revenue")
-        )
-
-        return_data["users_generated_revenue"] = {}
-        for u in users:
-            return_data["users_generated_revenue"].update({u.profile_user_repr: u.generated_revenue})
-
-            # * return number of visits of each user in each house.
-            customers_fav_houses = (
-                # filter only reservstions with status completed => meaning past dates
-                MyCustomUser.objects.filter(Q(reservations__status=99)).annotate(
-                    house=F("reservations__house"),
-                    # name + " " + surname + " [" + id + "]" -> Max Biaggi [1]
-                    customer=Concat(
-                        "name", Value(" "), "surname", Value(" ["), "pk", Value("]"), output_field=models.CharField()
-                    ),
-                )
-                # group by custom and house
-                .values_list("customer", "house")
-                # count visits for each house id
-                .annotate(total_visits=Count("reservations__house"))
-                # sort by customer id
-                .order_by("id")
-            )
-
-        return_data["favorite_houses"] = {}
-        for data in customers_fav_houses:
-            customer, house, total_visits = data
-
-            if return_data["favorite_houses"].get(customer) is None:
-                return_data["favorite_houses"][customer] = {}
-
-            return_data["favorite_houses"][customer].update({house: {"total_visits": total_visits}})
-
+        return_data.update(statistics.read("users"))
         return return_data
 
     def _prepare_reservations_statistics(self, return_data):
-
-        # * average lenght of the reservation / max_lenght of a reservation
-        reservation_lengths = Reservation.objects.aggregate(
-            stay_length=Avg(F("end_date") - F("start_date")), max_length=Max(F("end_date") - F("start_date"))
-        )
-        return_data["average_reservation_length"] = reservation_lengths["stay_length"].days
-        return_data["max_length"] = reservation_lengths["max_length"].days
-
-        # *return all users who has booked at least a night and provide count of their reservations [user : count of reservations]
-        qs_reservations = (
-            CustomerProfile.objects.annotate(reservations=Count("reservation"))
-            .filter(reservations__gt=0)
-            .select_related("user")
-            .order_by("-reservations")
-        )
-
-        return_data["users_reservations"] = {}
-
-        for i in qs_reservations:
-            return_data["users_reservations"].update({i.profile_user_repr: i.reservations})
-
-        # * users with their longest reservation
-        longest_res = (
-            CustomerProfile.objects.select_related("user")
-            .annotate(max_length=F("reservation__end_date") - F("reservation__start_date"))
-            .filter(~Q(max_length=None))
-            .order_by("max_length")
-            .distinct()
-        )
-
-        return_data["longest_reservation_per_user"] = {}
-
-        for i in longest_res:
-            return_data["longest_reservation_per_user"].update({i.profile_user_repr: i.max_length.days})
-
-        # * gives count of cancelled, valid and total reservations
-        users_reservations = CustomerProfile.objects.aggregate(
-            cancelled_count=Count("reservation", filter=(Q(reservation__start_date=None))),
-            not_cancelled_count=Count("reservation", filter=(~Q(reservation__start_date=None))),
-            total=Count("reservation"),
-        )
-
-        return_data["total_reservations"] = users_reservations
-        # * return count of the number of reservations with respective status
-        reservations_status_split = Reservation.objects.aggregate(
-            confirmed=Count("status", filter=Q(status=1)),
-            not_confirmed=Count("status", filter=Q(status=0)),
-            cancelled=Count("status", filter=Q(status=9)),
-            completed=Count("status", filter=Q(status=99)),
-        )
-        return_data["reservations_statuses"] = reservations_status_split
-
-        return_data["number_of_order_confirmations"] = ReservationConfrimation.objects.all().count()
-
-        reservations = (
-            Reservation.objects.filter(~Q(start_date=None))
-            .annotate(months=ExtractMonth("start_date"))
-            .values_list("months")
-            .annotate(
-                reservation_count=Count("id"),
-                total_price=Sum("total_price"),
-                average_stay=ExtractDay(Avg(F("end_date") - F("start_date"))),
-                unique_customers=Count("customer_profile", distinct=True),
-                max_length=Max("nights"),
-            )
-        ).order_by("months")
-
-        return_data["reservations_monthly"] = {}
-
-        for pair in reservations:
-            month_number, count, revenue, avg_stay, unique_users, max_length = pair
-            month = date(2020, month_number, 1).strftime("%B")
-            return_data["reservations_monthly"].update(
-                {
-                    month: {
-                        "count": count,
-                        "monthly_revenue": revenue,
-                        "average_stay_days": avg_stay,
-                        "longest_stay": max_length,
-                        "unique_customers": unique_users,
-                    }
-                }
-            )
-
+        return_data.update(statistics.read("reservations"))
         return return_data
 
     def _prepare_opinions(self, return_data):
-        # * computes basics stats: total number of opinions / frequency of images attached to opinions / longest_body
-
-        opinions_details = (
-            Opinion.objects.alias(img=Length("image"))
-            # null for images did not work, if not provided it is "" in db apparently
-            # if Length > 0 assign 1, if not, 0, and then aggregate average off of that.
-            .annotate(
-                img_binary=Case(
-                    When(img=0, then=Value(0)),
-                    When(img__gte=1, then=Value(1)),
-                ),
-                text_len=Length("main_text"),
-            ).aggregate(
-                number_of_opinions=Count("pk"),
-                img_per_opinion=Round(Avg("img_binary"), precision=2),
-                longest_body=Max("text_len"),
-                avg_rating=Round(Avg("rating", filter=~Q(rating=None)), precision=2),
-            )
-        )
-
-        return_data.update(opinions_details)
-
-        # * gives stats to opinions based on the month they were created in
-        opinions_per_month = (
-            Opinion.objects.defer("main_text")
-            .alias(img=Length("image"))
-            .annotate(
-                month=Cast(ExtractMonth("provided_on"), output_field=models.IntegerField()),
-                img_binary=Case(
-                    When(img=0, then=Value(0)),
-                    When(img__gte=1, then=Value(1)),
-                ),
-            )
-            .values_list("month")
-            .annotate(count_month=Count(F("month")), image_per_month=Round(Avg("img_binary"), precision=2))
-        )
-
-        return_data["opinions_per_month"] = {}
-
-        for data in opinions_per_month:
-            month, counter, image_per_month = data
-            month = date(2020, month, 1).strftime("%B")
-            return_data["opinions_per_month"].update({month: {"count": counter, "image_per_opinion": image_per_month}})
-
-        # * annotates pairs of  [concat(user.name,user.surname)]: number of opinions as "full_name" and groups results on that.
-        # * computes number of opinions per user / average rating given by user
-        user_opinions = (
-            Opinion.objects.defer("main_text")
-            .annotate(full_name=Concat("author__name", Value(" "), "author__surname"))
-            .values_list("full_name")
-            .annotate(nb_of_opinions=Count("pk"), avg_rating=Round(Avg("rating", filter=~Q(rating=None)), precision=2))
-        ).order_by("-nb_of_opinions")
-
-        return_data["user_opinions_count"] = {}
-        for user_count in user_opinions:
-            full_name, count, average_rating = user_count
-            return_data["user_opinions_count"].update({full_name: {"count": count, "average_rating": average_rating}})
-
+        return_data.update(statistics.read("opinions"))
         return return_data
 
     def _prepare_challet_houses_statistics(self, return_data):
-
-        # * return tuples of house_number, number of reservations
-        total_reservations_house = (
-            # group by house number
-            ChalletHouse.objects.values("house_number")
-            # to each house annotate count of reservations
-            .annotate(number_of_reservations=Count("house_reservations")).order_by("house_number")
-        )
-        return_data["total_reservations_house"] = total_reservations_house
-
-        # * return number of reservations per month for each of the houses
-        opinions = (
-            # "transform"/Extract from start_date month number-> month (number)
-            ChalletHouse.objects.annotate(month=ExtractMonth("house_reservations__start_date"))
-            # group by house number, month
-            # based on that grouping count annnotate "c" as count of repetitions on each house number in given group
-            .values_list("house_number", "month").annotate(c=Count("house_number"))
-        ).order_by("house_number")
-
-        return_data["reservations_per_house_monthly"] = {}
-
-        for data in opinions:
-            house_number, month, count = data
-            if month is not None:
-                month = date(2020, month, 1).strftime("%B")
-            else:
-                month = "Cancelled"
-
-            if return_data["reservations_per_house_monthly"].get(house_number) is None:
-                return_data["reservations_per_house_monthly"][house_number] = {}
-
-            return_data["reservations_per_house_monthly"][house_number].update({month: {"reservations": count}})
-
-        # * get total revenue generated by reservations of each house
-        total_revenue_house = (
-            # group by house number
-            ChalletHouse.objects.values("house_number")
-            # annotate to that the sum of reservations total_price
-            .annotate(total_revenue=Sum("house_reservations__total_price")).order_by("house_number")
-        )
-
-        return_data["total_revenue_house"] = total_revenue_house
-
+        return_data.update(statistics.read("challet_houses"))
         return return_data
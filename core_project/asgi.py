@@ -12,5 +12,8 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core_project.settings')
+# every request runs its sync code in a thread of its own -> a persistent connection would never be reused, just
+# left open until garbage collected; connections are pooled by pgbouncer instead [DB_PGBOUNCER]
+os.environ.setdefault('DB_CONN_MAX_AGE', '0')
 
 application = get_asgi_application()
@@ -0,0 +1,75 @@
+"""
+audit log -> status transitions and other events worth keeping, one json line per record
+
+records are only put on a queue by the calling thread [QueueHandler], a background thread [QueueListener] formats
+and writes them -> no file i/o in requests and tasks. Configured once by LOGGING [settings], switched off by
+AUDIT_LOG_ENABLED=False: nothing is collected or built then.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+from functools import partial
+from logging.handlers import QueueHandler, QueueListener
+
+from django.conf import settings
+from django.db import transaction
+
+logger = logging.getLogger("audit")
+
+
+class JSONFormatter(logging.Formatter):
+    """event = message of the record, everything passed as extra={"data": {...}} becomes a key of the line"""
+
+    def format(self, record):
+        line = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S%z"),
+            "logger": record.name,
+            "event": record.getMessage(),
+            **getattr(record, "data", {}),
+        }
+        return json.dumps(line, default=str)
+
+
+class QueueListenerHandler(QueueHandler):
+    """
+    handler for LOGGING: records are queued and handed over to `handlers` by a listener thread
+    -> "handlers": ["cfg://handlers.<name>"], those handlers must be named so that they are configured first [sorted]
+    """
+
+    def __init__(self, handlers, respect_handler_level=True):
+        super().__init__(None)  # queue created with the listener
+        # cfg:// references are resolved when accessed
+        self.target_handlers = [handlers[i] for i in range(len(handlers))]
+        self.respect_handler_level = respect_handler_level
+        self._start_listener()
+        # forked processes [celery/gunicorn workers] do not inherit the listener thread
+        os.register_at_fork(after_in_child=self._start_listener)
+        # whatever is still queued is written when the process exits
+        atexit.register(self._stop_listener)
+
+    def _start_listener(self):
+        self.queue = queue.SimpleQueue()
+        self.listener = QueueListener(
+            self.queue, *self.target_handlers, respect_handler_level=self.respect_handler_level
+        )
+        self.listener.start()
+
+    def _stop_listener(self):
+        self.listener.stop()
+
+
+def enabled():
+    return settings.AUDIT_LOG_ENABLED
+
+
+def log(event, **data):
+    if enabled():
+        logger.info(event, extra={"data": data})
+
+
+def log_on_commit(event, **data):
+    """for changes made in a transaction -> nothing is logged if it is rolled back"""
+    if enabled():
+        transaction.on_commit(partial(log, event, **data))
@@ -0,0 +1,44 @@
+"""
+redis cache backend of the project [settings.CACHES]
+
+- OPTIONS["parser"]: "hiredis" [C parser, falls back to the python one when hiredis is not installed] or "python"
+- connection pool sizing goes straight to the pool: max_connections, timeout [BlockingConnectionPool waits
+  that long for a free connection instead of opening more of them]
+- incr_many: several counters in one pipeline -> django's incr is EXISTS + INCRBY per key
+- client(): the redis client behind the cache, for scripts [throttling] and pipelines
+"""
+from django.core.cache.backends.redis import RedisCache as DjangoRedisCache
+from redis.utils import HIREDIS_AVAILABLE
+
+PARSERS = {
+    "hiredis": "redis.connection.HiredisParser",
+    "python": "redis.connection.PythonParser",
+}
+
+
+def parser_class(name):
+    if name == "hiredis" and not HIREDIS_AVAILABLE:
+        name = "python"
+    return PARSERS[name]
+
+
+class RedisCache(DjangoRedisCache):
+    def __init__(self, server, params):
+        options = dict(params.get("OPTIONS", {}))
+        parser = options.pop("parser", None)
+        if parser is not None:
+            options["parser_class"] = parser_class(parser)
+        super().__init__(server, {**params, "OPTIONS": options})
+
+    def client(self, write=True):
+        return self._cache.get_client(write=write)
+
+    def incr_many(self, keys, delta=1):
+        """
+        [key] -> [new value]; missing keys are created [0 + delta] without expiry
+        ints are stored raw by the redis backend -> readable with get/get_many afterwards
+        """
+        pipeline = self.client().pipeline(transaction=False)
+        for key in keys:
+            pipeline.incrby(self.make_and_validate_key(key), delta)
+        return pipeline.execute()
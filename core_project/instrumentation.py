@@ -0,0 +1,175 @@
+"""
+per request sql instrumentation [QueryInstrumentationMiddleware] -> usable in production, unlike debug_toolbar
+
+- query count and sql time of every connection [execute_wrapper]; the recorder of the request is a context variable
+  -> queries of an async request run in threads [sync_to_async] are counted too
+- queries grouped by fingerprint [statement without its parameters]: the same statement run again and again is an
+  N+1 -> repeated fingerprints are logged
+- render time of DRF/template responses [serialization to json/html], app = everything else of the request
+- Server-Timing header [db, render, app, total] -> shown by the browser devtools
+- per endpoint [url name] histograms of duration, sql time and query count -> prometheus [core_project.metrics]
+- QUERY_BUDGETS: {url name: queries or {method: queries}} -> a request over budget raises QueryBudgetExceeded
+  when QUERY_BUDGETS_RAISE [tests], logs a warning otherwise
+"""
+import asyncio
+import logging
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from core_project import metrics
+
+logger = logging.getLogger(__name__)
+
+# IN (%s, %s, ...) and VALUES rows of any length -> one fingerprint
+_PLACEHOLDER_LIST = re.compile(r"\(\s*%s(?:\s*,\s*%s)*\s*\)(?:\s*,\s*\(\s*%s(?:\s*,\s*%s)*\s*\))*")
+
+
+def fingerprint(sql):
+    return _PLACEHOLDER_LIST.sub("(%s, ...)", str(sql))
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryRecorder:
+    """execute_wrapper of one request -> count, time and fingerprints of its queries"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    def repeated(self):
+        """[(fingerprint, times run)] of statements run more than once, most frequent first"""
+        return [(sql, count) for sql, count in self.fingerprints.most_common() if count > 1]
+
+
+# recorder of the current request [None outside of requests]
+_recorder = ContextVar("query_recorder", default=None)
+
+
+def _record(execute, sql, params, many, context):
+    recorder = _recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+def install(connection):
+    """_record stays on the connection for good -> connections opened later by the threads of async requests"""
+    if _record not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record)
+
+
+@receiver(connection_created)
+def install_on_connect(sender, connection, **kwargs):
+    if settings.QUERY_INSTRUMENTATION:
+        install(connection)
+
+
+def query_budget(endpoint, method):
+    budget = settings.QUERY_BUDGETS.get(endpoint)
+    if isinstance(budget, dict):
+        budget = budget.get(method)
+    return budget
+
+
+class QueryInstrumentationMiddleware:
+    """first in MIDDLEWARE -> sessions and authentication are part of the request; sync and async"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.QUERY_INSTRUMENTATION:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(self.get_response):
+            # marks the instance as a coroutine function [same as django's MiddlewareMixin]
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self):
+            return self.__acall__(request)
+        for connection in connections.all():  # opened before this module was imported
+            install(connection)
+        recorder, token, started = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _recorder.reset(token)
+        return self.finish(request, response, recorder, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        recorder, token, started = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _recorder.reset(token)
+        return self.finish(request, response, recorder, time.perf_counter() - started)
+
+    def start(self, request):
+        recorder = QueryRecorder()
+        request._render_seconds = 0.0
+        return recorder, _recorder.set(recorder), time.perf_counter()
+
+    def finish(self, request, response, recorder, total):
+        # 404s and unnamed routes share one entry -> the number of endpoints stays bounded
+        endpoint = getattr(request.resolver_match, "view_name", None) or "unresolved"
+        repeated = recorder.repeated()
+        db, render = recorder.seconds * 1000, request._render_seconds * 1000
+        response["Server-Timing"] = ", ".join(
+            [
+                f'db;dur={db:.1f};desc="{recorder.count} queries, {sum(n for _, n in repeated)} repeated"',
+                f"render;dur={render:.1f}",
+                f"app;dur={max(total * 1000 - db - render, 0):.1f}",
+                f"total;dur={total * 1000:.1f}",
+            ]
+        )
+        metrics.observe_request(endpoint, request.method, response.status_code, total, recorder.seconds, recorder.count)
+
+        if repeated:
+            logger.info(
+                "repeated queries",
+                extra={"data": {"endpoint": endpoint, "method": request.method, "repeated": repeated[:5]}},
+            )
+        self.check_budget(endpoint, request.method, recorder, repeated)
+        return response
+
+    def process_template_response(self, request, response):
+        started = time.perf_counter()
+
+        def rendered(response):
+            request._render_seconds = time.perf_counter() - started
+
+        response.add_post_render_callback(rendered)
+        return response
+
+    def check_budget(self, endpoint, method, recorder, repeated):
+        budget = query_budget(endpoint, method)
+        if budget is None or recorder.count <= budget:
+            return
+        message = f"{method} {endpoint}: {recorder.count} queries, budget {budget}"
+        if repeated:
+            message += f" [most repeated, {repeated[0][1]}x: {repeated[0][0][:200]}]"
+        if settings.QUERY_BUDGETS_RAISE:
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
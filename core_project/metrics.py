@@ -0,0 +1,127 @@
+"""
+prometheus metrics of the web and celery processes -> GET /metrics [metrics_view]
+
+- PROMETHEUS_MULTIPROC_DIR set [before prometheus_client is imported]: every process [gunicorn workers, celery pool]
+  writes its samples to files there, /metrics adds up the files of all processes -> one directory [volume] shared
+  by the web and celery containers; not set: registry of this process only
+- requests per url name: latency, status, sql time and queries [instrumentation middleware]
+- response cache hits/misses and their latency per endpoint [bookings.response_cache]
+- throttle rejections per scope [bookings.throttling]
+- celery tasks of bookings/accounts: duration by state and queue lag [published or eta -> started]
+- pdf confirmations: render time [ReservationConfrimation.render]
+- /metrics needs "Authorization: Bearer <METRICS_TOKEN>"; no token set -> only served with DEBUG on, refused otherwise
+  [urls, query counts and task names are not for the public]
+"""
+import hmac
+import os
+import time
+from datetime import datetime
+
+from celery import signals
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+from prometheus_client.exposition import CONTENT_TYPE_LATEST
+
+MULTIPROCESS_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+if MULTIPROCESS_DIR:
+    os.makedirs(MULTIPROCESS_DIR, exist_ok=True)
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+TASK_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900)
+TRACKED_TASKS = ("bookings.tasks.", "accounts.tasks.")
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Time spent on a request", ["endpoint", "method"], buckets=SECONDS_BUCKETS
+)
+REQUESTS = Counter("http_requests", "Requests by response status", ["endpoint", "method", "status"])
+REQUEST_DB_DURATION = Histogram(
+    "http_request_db_duration_seconds", "SQL time of a request", ["endpoint"], buckets=SECONDS_BUCKETS
+)
+REQUEST_QUERIES = Histogram(
+    "http_request_queries", "Queries run by a request", ["endpoint"], buckets=(0, 1, 2, 5, 10, 20, 50, 100)
+)
+RESPONSE_CACHE = Histogram(
+    "response_cache_duration_seconds",
+    "Response cache lookups by outcome [hit: served from the cache, miss: built]",
+    ["endpoint", "outcome"],
+    buckets=(0.001, 0.0025, *SECONDS_BUCKETS),
+)
+THROTTLE_REJECTIONS = Counter("throttle_rejections", "Requests refused by a throttle", ["scope"])
+TASK_DURATION = Histogram(
+    "celery_task_duration_seconds", "Run time of a celery task", ["task", "state"], buckets=TASK_BUCKETS
+)
+TASK_QUEUE_LAG = Histogram(
+    "celery_task_queue_lag_seconds", "Time from publishing [or eta] to start", ["task"], buckets=TASK_BUCKETS
+)
+PDF_RENDER_DURATION = Histogram(
+    "pdf_render_duration_seconds", "Rendering of a reservation confirmation", buckets=SECONDS_BUCKETS
+)
+
+
+def observe_request(endpoint, method, status, seconds, db_seconds, queries):
+    REQUEST_DURATION.labels(endpoint, method).observe(seconds)
+    REQUESTS.labels(endpoint, method, status).inc()
+    REQUEST_DB_DURATION.labels(endpoint).observe(db_seconds)
+    REQUEST_QUERIES.labels(endpoint).observe(queries)
+
+
+def cache_outcomes(endpoint):
+    """{hit, miss} response cache lookups of the endpoint so far, this process only [benchmarks, tests]"""
+    return {
+        outcome: REGISTRY.get_sample_value(
+            "response_cache_duration_seconds_count", {"endpoint": endpoint, "outcome": outcome}
+        )
+        or 0
+        for outcome in ("hit", "miss")
+    }
+
+
+def registry():
+    if not MULTIPROCESS_DIR:
+        return REGISTRY
+    collected = CollectorRegistry()
+    multiprocess.MultiProcessCollector(collected)
+    return collected
+
+
+def metrics_view(request):
+    if not settings.METRICS_TOKEN:
+        if not settings.DEBUG:
+            return HttpResponseForbidden()
+    elif not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {settings.METRICS_TOKEN}"):
+        return HttpResponseForbidden()
+    return HttpResponse(generate_latest(registry()), content_type=CONTENT_TYPE_LATEST)
+
+
+# celery -> start times by task id, per worker process
+_task_started = {}
+
+
+@signals.before_task_publish.connect
+def stamp_published(headers=None, **kwargs):
+    # message header -> task.request.published_at in the worker [protocol 2]
+    if headers is not None:
+        headers["published_at"] = time.time()
+
+
+@signals.task_prerun.connect
+def task_started(task_id=None, task=None, **kwargs):
+    if not task.name.startswith(TRACKED_TASKS):
+        return
+    _task_started[task_id] = time.perf_counter()
+
+    published_at = getattr(task.request, "published_at", None)
+    if published_at is None:  # eager/direct calls are not published
+        return
+    eta = getattr(task.request, "eta", None)
+    if eta:  # countdown/retry delays are not lag
+        published_at = max(published_at, datetime.fromisoformat(eta).timestamp())
+    TASK_QUEUE_LAG.labels(task.name).observe(max(time.time() - published_at, 0))
+
+
+@signals.task_postrun.connect
+def task_finished(task_id=None, task=None, state=None, **kwargs):
+    started = _task_started.pop(task_id, None)
+    if started is not None:
+        TASK_DURATION.labels(task.name, state or "UNKNOWN").observe(time.perf_counter() - started)
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.0/ref/settings/
 """
 import os
+import sys
 from datetime import timedelta
 from pathlib import Path
 
@@ -44,6 +45,7 @@ INSTALLED_APPS = [
     "django.contrib.messages",
     "django.contrib.staticfiles",
     "django.contrib.sites",  # django-allauth
+    "django.contrib.postgres",
     # my_apps
     "accounts.apps.AccountsConfig",
     "bookings.apps.BookingsConfig",
@@ -70,19 +72,22 @@ ACCOUNT_EMAIL_VERIFICATION = "mandatory"
 
 
 MIDDLEWARE = [
+    "core_project.instrumentation.QueryInstrumentationMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
-    "debug_toolbar.middleware.DebugToolbarMiddleware",
+    # sync only -> dropped outside of DEBUG, under asgi every middleware around it would run in a thread
+    *(["debug_toolbar.middleware.DebugToolbarMiddleware"] if DEBUG else []),
     # "django.middleware.cache.UpdateCacheMiddleware", # used for a site cache - troublesome as there is no way to override this when using low level cache (time)
     "django.middleware.common.CommonMiddleware",
     # "django.middleware.cache.FetchFromCacheMiddleware", #  # used for a site cache - troublesome as there is no way to override this when using low level cache (time)
-    "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+SILENCED_SYSTEM_CHECKS = [] if DEBUG else ["debug_toolbar.W001"]  # toolbar middleware left out on purpose
+
 ROOT_URLCONF = "core_project.urls"
 
 TEMPLATES = [
@@ -108,14 +113,23 @@ WSGI_APPLICATION = "core_project.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/4.0/ref/settings/#databases
 
+# DB_CONN_MAX_AGE: seconds a connection is reused by the requests/celery tasks of a thread [0 -> one per request],
+# broken ones are dropped before reuse [CONN_HEALTH_CHECKS]; asgi app -> 0 [core_project/asgi.py]
+# DB_PGBOUNCER: POSTGRES_HOST/PORT point at pgbouncer in transaction pooling mode -> no server side cursors, they
+# cannot outlive a transaction there [exports read keyset chunks instead, bookings/utils/export.py]
+DB_PGBOUNCER = env.bool("DB_PGBOUNCER", False)
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.postgresql",
         "NAME": "postgres",
         "USER": os.environ.get("POSTGRES_USER"),
         "PASSWORD": os.environ.get("POSTGRES_PASSWORD"),
-        "HOST": "db",  # docker compose - service level
-        "POST": 5432,  # default postgres
+        "HOST": env.str("POSTGRES_HOST", "db"),  # docker compose - service level
+        "PORT": env.int("POSTGRES_PORT", 5432),  # default postgres
+        "CONN_MAX_AGE": env.int("DB_CONN_MAX_AGE", 60),
+        "CONN_HEALTH_CHECKS": env.bool("DB_CONN_HEALTH_CHECKS", True),
+        "DISABLE_SERVER_SIDE_CURSORS": DB_PGBOUNCER,
     }
 }
 
@@ -178,7 +192,7 @@ INTERNAL_IPS += [".".join(ip.split(".")[:-1] + ["1"]) for ip in ips]
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework.authentication.TokenAuthentication",
+        "accounts.authentication.CachedTokenAuthentication",
         "rest_framework.authentication.SessionAuthentication",
         "rest_framework.authentication.BasicAuthentication",
     ],
@@ -191,9 +205,15 @@ REST_FRAMEWORK = {
     "DEFAULT_THROTTLE_CLASSES": [
         "bookings.auxiliary.SustainedRateThrottle",
         "bookings.auxiliary.BurstRateThrottle",
-        "rest_framework.throttling.AnonRateThrottle",
+        "bookings.auxiliary.AnonRateThrottle",
     ],
-    "DEFAULT_THROTTLE_RATES": {"burst": "600/minute", "sustained": "1000/day", "anon": "60/minute"},
+    # env -> lifted for load tests [benchmark_asgi]
+    "DEFAULT_THROTTLE_RATES": {
+        "burst": env.str("THROTTLE_RATE_BURST", "600/minute"),
+        "sustained": env.str("THROTTLE_RATE_SUSTAINED", "1000/day"),
+        "anon": env.str("THROTTLE_RATE_ANON", "60/minute"),
+        "opinions": env.str("THROTTLE_RATE_OPINIONS", "100/day"),
+    },
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
 }
 
@@ -212,6 +232,11 @@ CELERY_BEAT_SCHEDULE = {
         "task": "bookings.tasks.run_profile_reservation_updates",
         "schedule": timedelta(minutes=30),
     },
+    # outbox of emails [bookings/outbox.py] -> sent in batches over one smtp connection
+    "flush_outgoing_emails": {
+        "task": "bookings.tasks.flush_outgoing_emails_task",
+        "schedule": timedelta(seconds=env.int("OUTGOING_EMAIL_FLUSH_SECONDS", 10)),
+    },
 }
 
 # for communication emails to new user's creation
@@ -226,6 +251,11 @@ EMAIL_HOST_PASSWORD = os.environ.get("PASSWORD_FROM_EMAIL")
 EMAIL_PORT = os.environ.get("EMAIL_PORT")  # ports are usually different than django's 25
 EMAIL_USE_TLS = True
 
+# audit log [core_project/audit.py] -> status transitions as json lines, written by a background thread
+AUDIT_LOG_ENABLED = env.bool("AUDIT_LOG_ENABLED", True)
+AUDIT_LOG_FILE = env("AUDIT_LOG_FILE", os.path.join(BASE_DIR, "audit.log"))
+USER_CREATION_LOG_FILE = env("USER_CREATION_LOG_FILE", os.path.join(BASE_DIR, "accounts", "user_creation.log"))
+
 # log sql queries in console
 LOGGING = {
     "version": 1,
@@ -234,34 +264,80 @@ LOGGING = {
             "()": "django.utils.log.RequireDebugTrue",
         }
     },
+    "formatters": {
+        "json": {"()": "core_project.audit.JSONFormatter"},
+    },
     "handlers": {
         "console": {
             "level": "DEBUG",
             "filters": ["require_debug_true"],
             "class": "logging.StreamHandler",
-        }
+        },
+        # file opened on the first record [delay] by the listener thread of audit_queue
+        "audit_file": {
+            "class": "logging.FileHandler",
+            "filename": AUDIT_LOG_FILE,
+            "formatter": "json",
+            "delay": True,
+        },
+        "audit_queue": {
+            "()": "core_project.audit.QueueListenerHandler",
+            "handlers": ["cfg://handlers.audit_file"],
+        },
+        # registrations [accounts/decorators.py] -> same pipeline, own file
+        "user_creation_file": {
+            "class": "logging.FileHandler",
+            "filename": USER_CREATION_LOG_FILE,
+            "formatter": "json",
+            "delay": True,
+        },
+        "user_creation_queue": {
+            "()": "core_project.audit.QueueListenerHandler",
+            "handlers": ["cfg://handlers.user_creation_file"],
+        },
     },
     "loggers": {
         "django.db.backends": {
             "level": "DEBUG",
             "handlers": ["console"],
-        }
+        },
+        "audit": {
+            "level": "INFO",
+            "handlers": ["audit_queue"],
+            "propagate": False,
+        },
+        "accounts.user_creation": {
+            "level": "INFO",
+            "handlers": ["user_creation_queue"],
+            "propagate": False,
+        },
     },
 }
 CACHES = {
     "default": {
-        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "BACKEND": "core_project.cache.RedisCache",
         # must be redis//redis as it points to the redis container's name
         # localhost in docker-compose means container's localhost.
         # * https://stackoverflow.com/questions/55410120/docker-celery-cannot-connect-to-redis
         "LOCATION": "redis://redis:6379/0",
         "OPTIONS": {
             "db": "10",
-            "parser_class": "redis.connection.PythonParser",
+            "parser": env.str("REDIS_PARSER", "hiredis"),  # hiredis [C] | python
             "pool_class": "redis.BlockingConnectionPool",
+            # per process: enough for every thread of a worker, waits for a free connection beyond that
+            "max_connections": env.int("REDIS_POOL_MAX_CONNECTIONS", 50),
+            "timeout": env.int("REDIS_POOL_TIMEOUT", 20),
         },
     }
 }
+# token -> user [accounts.authentication]: redis shared by all processes, local LRU in front of it
+TOKEN_CACHE_TTL = env.int("TOKEN_CACHE_TTL", 300)
+TOKEN_CACHE_LOCAL_TTL = env.int("TOKEN_CACHE_LOCAL_TTL", 5)
+TOKEN_CACHE_LOCAL_SIZE = env.int("TOKEN_CACHE_LOCAL_SIZE", 10_000)
+
+# versioned response cache of list endpoints [bookings.response_cache] -> invalidated by writes, not by the ttl
+RESPONSE_CACHE_TTL = env.int("RESPONSE_CACHE_TTL", 600)
+
 CACHE_MIDDLEWARE_SECONDS = 15  # cache on the site is remembered for 60 seconds by default
 CACHE_MIDDLEWARE_KEY_PREFIX = ""  #  empty string if dont care/irrelevant
 CACHE_MIDDLEWARE_ALIAS = "default"  # default option
@@ -273,3 +349,37 @@ SPECTACULAR_SETTINGS = {
     "DESCRIPTION": "A simplified version of booking.com for a summer house rental",
     "VERSION": "1.0.0",
 }
+
+# per request sql instrumentation [core_project.instrumentation]: Server-Timing header, histograms, query budgets
+QUERY_INSTRUMENTATION = env.bool("QUERY_INSTRUMENTATION", True)
+# url name -> most queries a request may run [int or {method: int}], over budget fails the tests
+# measured with session authentication [session + user: 2 queries], queries of streamed bodies are not counted
+QUERY_BUDGETS = {
+    "accounts:signup": {"GET": 2, "POST": 9},
+    "accounts:users_list": {"GET": 5, "POST": 7},
+    "accounts:admin_list": {"GET": 3, "POST": 10, "DELETE": 16},
+    "accounts:user_detail": {"GET": 11, "PUT": 10, "PATCH": 10, "DELETE": 19},
+    "accounts:api_token_auth": 3,
+    "bookings:customers": 5,
+    "bookings:single_customer": 4,
+    "bookings:suggestions": 5,
+    "bookings:suggestion_detail": 4,
+    "bookings:opinions": {"GET": 5, "POST": 7},
+    "bookings:opinion_detail": 5,
+    "bookings:challet_houses": 6,
+    "bookings:challet_house": 5,
+    "bookings:house_availability": 4,
+    "bookings:reservations": 4,
+    "bookings:past_reservations": 6,
+    "bookings:reservations_export": 4,
+    # cancellation moves the reservation to another statistics summary row [created on first use]
+    "bookings:reservation_detail": {"GET": 6, "PUT": 18, "PATCH": 18},
+    "bookings:reservation_create": 18,
+    "bookings:run_updates": {"GET": 4, "POST": 15},
+    # one read of the summary rows per section [bookings/statistics.py]
+    "bookings:stats": 17,
+}
+QUERY_BUDGETS_RAISE = env.bool("QUERY_BUDGETS_RAISE", sys.argv[1:2] == ["test"])
+
+# prometheus metrics [core_project.metrics] -> /metrics behind this bearer token; not set -> served with DEBUG only
+METRICS_TOKEN = env.str("METRICS_TOKEN", "")
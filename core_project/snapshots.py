@@ -0,0 +1,64 @@
+"""
+values of a row as loaded from the database -> signals compare them with what is being saved/deleted
+[occupancy bitmaps, statistics summaries in bookings.signals]
+
+- LoadedValues [first base of the model]: from_db keeps the loaded values on the instance, save()/refresh_from_db()
+  move them on -> no post_init receivers, no work for rows that are only read besides a dict per row
+- instances loaded with .only()/.defer() [or saved without being loaded] miss fields -> the missing ones are read
+  from the row right before the save/delete, one query for such instances only
+- as_loaded(instance) -> copy of the instance as its row was before the save, None for new rows
+"""
+from django.db.models.signals import pre_delete, pre_save
+from django.dispatch import receiver
+
+
+class LoadedValues:
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded = dict(zip(field_names, values))
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # receivers of post_save have seen the previous values by now
+        self._loaded = {**getattr(self, "_loaded", {}), **_current(self)}
+
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using, fields)
+        refreshed = None if fields is None else {self._meta.get_field(name).attname for name in fields}
+        current = _current(self)
+        self._loaded = {
+            **getattr(self, "_loaded", {}),
+            **{name: value for name, value in current.items() if refreshed is None or name in refreshed},
+        }
+
+
+def as_loaded(instance):
+    loaded = getattr(instance, "_loaded", None)
+    if not loaded:
+        return None
+    model = type(instance)
+    field_names = [field.attname for field in model._meta.concrete_fields if field.attname in loaded]
+    return model.from_db(instance._state.db, field_names, [loaded[name] for name in field_names])
+
+
+def _current(instance):
+    return {
+        field.attname: instance.__dict__[field.attname]
+        for field in instance._meta.concrete_fields
+        if field.attname in instance.__dict__
+    }
+
+
+@receiver(pre_save)
+@receiver(pre_delete)
+def complete_loaded_values(sender, instance, **kwargs):
+    """fields the instance was loaded without -> read from the row before it changes"""
+    if not isinstance(instance, LoadedValues) or kwargs.get("raw") or instance._state.adding or instance.pk is None:
+        return
+    loaded = getattr(instance, "_loaded", {})
+    missing = [field.attname for field in sender._meta.concrete_fields if field.attname not in loaded]
+    if missing:
+        stored = sender._base_manager.using(instance._state.db).filter(pk=instance.pk).values(*missing).first()
+        instance._loaded = {**loaded, **(stored or {})}
@@ -23,7 +23,7 @@ from django.urls import include, path, re_path
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
 from rest_framework.schemas import get_schema_view
 
-from . import main_api_view
+from . import main_api_view, metrics
 
 urlpatterns = [
     path("admin/", admin.site.urls),
@@ -49,6 +49,7 @@ urlpatterns = [
     # path("accounts/", include("django.contrib.auth.urls")),
     path("api/bookings/", include("bookings.urls")),
     path("__debug__/", include("debug_toolbar.urls")),
+    path("metrics", metrics.metrics_view, name="metrics"),  # scraped by prometheus
     # * dynamic schema -> yaml file
     path("api/schema/", SpectacularAPIView.as_view(), name="schema"),
     # path(
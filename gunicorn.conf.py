@@ -0,0 +1,27 @@
+"""
+production server: gunicorn -c gunicorn.conf.py [Dockerfile]
+
+- default: wsgi app [core_project.wsgi] in gthread workers -> persistent database connections per thread
+  [DB_CONN_MAX_AGE]; all views are sync
+- opt-in GUNICORN_APP=core_project.asgi:application GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker -> asgi app,
+  every view runs in a thread of the worker; connections are not reused there -> behind pgbouncer [DB_PGBOUNCER],
+  compare both with benchmark_asgi first
+"""
+import multiprocessing
+import os
+
+wsgi_app = os.environ.get("GUNICORN_APP", "core_project.wsgi:application")
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.environ.get("GUNICORN_THREADS", 4))  # gthread only
+keepalive = 5
+accesslog = os.environ.get("GUNICORN_ACCESS_LOG")  # "-" -> stdout
+
+
+def child_exit(server, worker):
+    # samples of a dead worker are kept in the totals, its live gauges dropped [core_project.metrics]
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)